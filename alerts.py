@@ -0,0 +1,421 @@
+import asyncio
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from crypto_api import crypto_api
+from user_state import Interner
+from sender import outbound_queue, PRIORITY_BULK
+from quota import PRIORITY_NOTIFICATION, upstream_priority
+from metrics import registry
+from coin_catalog import coin_catalog
+from config import TEXTS, ALERT_CHECK_SECONDS, ALERT_REARM_GAP, ALERTS_PER_USER
+
+# Флаги алерта
+FLAG_ACTIVE = 1
+FLAG_FALLING = 2  # срабатывает при падении цены до уровня (иначе - при росте)
+FLAG_REPEAT = 4   # после срабатывания взводится снова
+FLAG_WAITING = 8  # повторяющийся алерт сработал и ждет, пока цена отойдет от уровня на rearm_gap
+
+ALERTS_FIRED = registry.counter('cryptobot_alerts_fired_total', 'Price alerts fired', ['direction'])
+ALERT_UPDATE_LATENCY = registry.histogram(
+    'cryptobot_alert_update_seconds', 'Time to match one price snapshot against the alert index')
+
+def format_price(value: float) -> str:
+    """Цена с точностью, подходящей и для BTC, и для монет дешевле цента"""
+    if value >= 1:
+        return f"{value:,.2f}"
+    return f"{value:.6g}"
+
+def round_level(value: float) -> float:
+    """Уровень алерта, округленный до 4 значащих цифр"""
+    return float(f"{value:.4g}")
+
+def coin_name(coin_id: str) -> str:
+    return coin_catalog.label(coin_id)
+
+class Alert(NamedTuple):
+    alert_id: int
+    user_id: int
+    coin_id: str
+    level: float
+    falling: bool
+    repeat: bool
+    waiting: bool
+
+def describe_alert(alert: Alert) -> str:
+    """Короткое описание алерта для списков и кнопок"""
+    sign = '≤' if alert.falling else '≥'
+    return f"{coin_name(alert.coin_id)} {sign} ${format_price(alert.level)}" + (' 🔁' if alert.repeat else '')
+
+class LevelIndex:
+    """Уровни одной стороны монеты по возрастанию и id алертов (параллельные массивы)"""
+    __slots__ = ('levels', 'ids')
+
+    def __init__(self):
+        self.levels = array('d')
+        self.ids = array('q')
+
+    def add(self, level: float, alert_id: int):
+        index = bisect_right(self.levels, level)
+        self.levels.insert(index, level)
+        self.ids.insert(index, alert_id)
+
+    def remove(self, level: float, alert_id: int) -> bool:
+        index = bisect_left(self.levels, level)
+        while index < len(self.levels) and self.levels[index] == level:
+            if self.ids[index] == alert_id:
+                del self.levels[index]
+                del self.ids[index]
+                return True
+            index += 1
+        return False
+
+    def pop_range(self, lo: int, hi: int) -> array:
+        """Вынимает записи с позициями [lo, hi)"""
+        ids = self.ids[lo:hi]
+        del self.levels[lo:hi]
+        del self.ids[lo:hi]
+        return ids
+
+    def load(self, entries: List[Tuple[float, int]]):
+        """Массовая загрузка: одна сортировка вместо вставок по одной"""
+        entries.sort()
+        self.levels = array('d', (level for level, _ in entries))
+        self.ids = array('q', (alert_id for _, alert_id in entries))
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+class CoinAlerts:
+    """Алерты одной монеты: уровни, срабатывающие при росте и при падении, и последняя цена"""
+    __slots__ = ('rising', 'falling', 'price')
+
+    def __init__(self):
+        self.rising = LevelIndex()
+        self.falling = LevelIndex()
+        self.price: Optional[float] = None
+
+class AlertBook:
+    """Ценовые алерты: каждое обновление цены затрагивает только уровни, пересеченные с прошлой цены"""
+
+    def __init__(self, rearm_gap: float = ALERT_REARM_GAP):
+        self.rearm_gap = rearm_gap
+        self.coins = Interner()
+        # Записи алертов - параллельные массивы по alert_id; освобожденные id переиспользуются
+        self._users = array('q')
+        self._coin_codes = array('I')
+        self._levels = array('d')
+        self._flags = array('B')
+        self._free: List[int] = []
+        self._by_coin: Dict[int, CoinAlerts] = {}
+        self._by_user: Dict[int, array] = {}  # {user_id: array('q') id алертов}
+        self.active = 0
+
+    def _position(self, alert_id: int) -> Tuple[LevelIndex, float]:
+        """Сторона и уровень, на которых алерт сейчас стоит в индексе монеты"""
+        coin = self._by_coin[self._coin_codes[alert_id]]
+        flags = self._flags[alert_id]
+        level = self._levels[alert_id]
+        falling = bool(flags & FLAG_FALLING)
+        if flags & FLAG_WAITING:
+            # Сработавший повторяющийся алерт взводится, когда цена отойдет назад за уровень
+            if falling:
+                return coin.rising, level * (1 + self.rearm_gap)
+            return coin.falling, level * (1 - self.rearm_gap)
+        if falling:
+            return coin.falling, level
+        return coin.rising, level
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        self._users.append(0)
+        self._coin_codes.append(0)
+        self._levels.append(0.0)
+        self._flags.append(0)
+        return len(self._flags) - 1
+
+    def _store(self, alert_id: int, user_id: int, coin_id: str, level: float, flags: int):
+        code = self.coins.code(coin_id)
+        self._users[alert_id] = user_id
+        self._coin_codes[alert_id] = code
+        self._levels[alert_id] = level
+        self._flags[alert_id] = flags | FLAG_ACTIVE
+        if code not in self._by_coin:
+            self._by_coin[code] = CoinAlerts()
+        alerts = self._by_user.get(user_id)
+        if alerts is None:
+            alerts = self._by_user[user_id] = array('q')
+        alerts.append(alert_id)
+        self.active += 1
+
+    def add(self, user_id: int, coin_id: str, level: float, price: float, repeat: bool = False) -> int:
+        """Создает алерт; направление определяется положением уровня относительно цены price (цену монеты не меняет)"""
+        alert_id = self._allocate()
+        flags = (FLAG_FALLING if level < price else 0) | (FLAG_REPEAT if repeat else 0)
+        self._store(alert_id, user_id, coin_id, level, flags)
+        index, position = self._position(alert_id)
+        index.add(position, alert_id)
+        return alert_id
+
+    def load(self, rows: Iterable[Tuple[int, int, str, float, int]]):
+        """Массовая загрузка сохраненных алертов (alert_id, user_id, coin_id, уровень, флаги)"""
+        rows = list(rows)
+        grow = max((row[0] for row in rows), default=-1) + 1 - len(self._flags)
+        if grow > 0:
+            for column in (self._users, self._coin_codes, self._levels, self._flags):
+                column.frombytes(bytes(column.itemsize * grow))
+        entries: Dict[LevelIndex, List[Tuple[float, int]]] = {}
+        for alert_id, user_id, coin_id, level, flags in rows:
+            self._store(alert_id, user_id, coin_id, level, flags)
+            index, position = self._position(alert_id)
+            entries.setdefault(index, []).append((position, alert_id))
+        self._free = [alert_id for alert_id in range(len(self._flags)) if not self._flags[alert_id] & FLAG_ACTIVE]
+        for index, pairs in entries.items():
+            index.load(pairs + list(zip(index.levels, index.ids)))
+
+    def remove(self, alert_id: int) -> bool:
+        """Удаляет алерт"""
+        if not self.exists(alert_id):
+            return False
+        index, position = self._position(alert_id)
+        index.remove(position, alert_id)
+        self._release(alert_id)
+        return True
+
+    def _release(self, alert_id: int):
+        user_id = self._users[alert_id]
+        alerts = self._by_user.get(user_id)
+        if alerts is not None:
+            alerts.remove(alert_id)
+            if not alerts:
+                del self._by_user[user_id]
+        self._flags[alert_id] = 0
+        self._free.append(alert_id)
+        self.active -= 1
+
+    def set_repeat(self, alert_id: int, repeat: bool) -> bool:
+        """Включает или выключает повторное срабатывание"""
+        if not self.exists(alert_id):
+            return False
+        if repeat:
+            self._flags[alert_id] |= FLAG_REPEAT
+        else:
+            # Уже сработавший алерт удалится, когда цена отойдет от уровня
+            self._flags[alert_id] &= ~FLAG_REPEAT & 0xFF
+        return True
+
+    def exists(self, alert_id: int) -> bool:
+        return 0 <= alert_id < len(self._flags) and bool(self._flags[alert_id] & FLAG_ACTIVE)
+
+    def get(self, alert_id: int) -> Optional[Alert]:
+        """Возвращает алерт по id"""
+        if not self.exists(alert_id):
+            return None
+        flags = self._flags[alert_id]
+        return Alert(alert_id, self._users[alert_id], self.coins.value(self._coin_codes[alert_id]),
+                     self._levels[alert_id], bool(flags & FLAG_FALLING), bool(flags & FLAG_REPEAT),
+                     bool(flags & FLAG_WAITING))
+
+    def row(self, alert_id: int) -> Tuple[int, str, float, int]:
+        """Запись алерта для хранилища: (user_id, coin_id, уровень, флаги)"""
+        return (self._users[alert_id], self.coins.value(self._coin_codes[alert_id]),
+                self._levels[alert_id], self._flags[alert_id])
+
+    def user_alerts(self, user_id: int) -> List[Alert]:
+        """Алерты пользователя в порядке создания"""
+        return [self.get(alert_id) for alert_id in self._by_user.get(user_id, ())]
+
+    def user_alert_count(self, user_id: int) -> int:
+        return len(self._by_user.get(user_id, ()))
+
+    def coin_ids(self) -> List[str]:
+        """Монеты, по которым есть алерты"""
+        return [self.coins.value(code) for code, coin in self._by_coin.items() if coin.rising or coin.falling]
+
+    def seed_price(self, coin_id: str, price: float):
+        """Задает стартовую цену монеты, если с ней еще не сверялись (только для цен из снимков, не из кликов)"""
+        coin = self._by_coin.get(self.coins.code(coin_id))
+        if coin is None:
+            coin = self._by_coin[self.coins.code(coin_id)] = CoinAlerts()
+        if coin.price is None:
+            coin.price = price
+
+    def last_price(self, coin_id: str) -> Optional[float]:
+        """Последняя цена монеты, с которой сверялись алерты"""
+        coin = self._by_coin.get(self.coins.find(coin_id))
+        return coin.price if coin is not None else None
+
+    def update(self, coin_id: str, price: float) -> Tuple[List[Alert], List[int]]:
+        """Сверяет цену с уровнями, пересеченными с прошлой цены; возвращает (сработавшие, прочие измененные id)"""
+        coin = self._by_coin.get(self.coins.find(coin_id))
+        if coin is None or not price:
+            return [], []
+        previous, coin.price = coin.price, price
+        crossed = []
+        # Цена до первого обновления (например, после перезапуска) неизвестна - проверяются все уровни.
+        # Уровень, равный прошлой цене (алерт на текущую цену), срабатывает при первом же движении к нему
+        if previous is None or price > previous:
+            levels = coin.rising.levels
+            lo = 0 if previous is None else bisect_left(levels, previous)
+            hi = bisect_right(levels, price)
+            if hi > lo:
+                crossed.extend(coin.rising.pop_range(lo, hi))
+        if previous is None or price < previous:
+            levels = coin.falling.levels
+            lo = bisect_left(levels, price)
+            hi = len(levels) if previous is None else bisect_right(levels, previous)
+            if hi > lo:
+                crossed.extend(coin.falling.pop_range(lo, hi))
+        fired, rearmed = [], []
+        for alert_id in crossed:
+            flags = self._flags[alert_id]
+            if flags & FLAG_WAITING:
+                rearmed.append(alert_id)
+                if not flags & FLAG_REPEAT:
+                    # Повтор выключили, пока алерт ждал отката цены
+                    self._release(alert_id)
+                    continue
+                self._flags[alert_id] = flags & ~FLAG_WAITING
+            else:
+                fired.append(self.get(alert_id))
+                if not flags & FLAG_REPEAT:
+                    self._release(alert_id)
+                    continue
+                self._flags[alert_id] = flags | FLAG_WAITING
+            index, position = self._position(alert_id)
+            index.add(position, alert_id)
+        return fired, rearmed
+
+class AlertManager:
+    """Ценовые алерты пользователей: сверка с каждым снимком цен, отправка и сохранение"""
+
+    def __init__(self, bot, store, get_language: Callable[[int], str],
+                 check_interval: float = ALERT_CHECK_SECONDS):
+        self.bot = bot
+        self.store = store  # UserStore: алерты хранятся рядом с подписками
+        self.get_language = get_language
+        self.check_interval = check_interval
+        self.book = AlertBook()
+        self._task: Optional[asyncio.Task] = None
+        try:
+            self.book.load(self.store.load_alerts())
+        except Exception as e:
+            print(f"Error loading alerts: {e}")
+        # Любой ответ API с ценами (экраны, уведомления) тоже проверяет алерты
+        crypto_api.add_price_listener(self.on_prices)
+
+    def add_alert(self, user_id: str, coin_id: str, level: float, price: float,
+                  repeat: bool = False) -> Optional[int]:
+        """Создает алерт; None, если у пользователя уже максимум алертов"""
+        user_id = int(user_id)
+        if self.book.user_alert_count(user_id) >= ALERTS_PER_USER:
+            return None
+        # Цена из клика может быть старше последнего снимка (кэш, резервная копия), поэтому в индекс она не попадает
+        # и задает направление, только пока монета еще не сверялась ни с одним снимком
+        reference = self.book.last_price(coin_id) or price
+        alert_id = self.book.add(user_id, coin_id, level, reference, repeat)
+        self.store.set_alert(alert_id, *self.book.row(alert_id))
+        return alert_id
+
+    def remove_alert(self, user_id: str, alert_id: int) -> bool:
+        """Удаляет алерт пользователя"""
+        alert = self.book.get(alert_id)
+        if alert is None or alert.user_id != int(user_id):
+            return False
+        self.book.remove(alert_id)
+        self.store.delete_alert(alert_id)
+        return True
+
+    def set_repeat(self, user_id: str, alert_id: int, repeat: bool) -> Optional[Alert]:
+        """Включает или выключает повтор алерта пользователя"""
+        alert = self.book.get(alert_id)
+        if alert is None or alert.user_id != int(user_id):
+            return None
+        self.book.set_repeat(alert_id, repeat)
+        self._save(alert_id)
+        return self.book.get(alert_id)
+
+    def get_user_alerts(self, user_id: str) -> List[Alert]:
+        """Получает алерты пользователя"""
+        return self.book.user_alerts(int(user_id))
+
+    def get_alert(self, user_id: str, alert_id: int) -> Optional[Alert]:
+        """Алерт пользователя по id"""
+        alert = self.book.get(alert_id)
+        return alert if alert is not None and alert.user_id == int(user_id) else None
+
+    def on_prices(self, prices: Dict[str, Tuple[float, float, float]]):
+        """Сверяет снимок цен {coin_id: (цена, объем, капитализация)} с алертами"""
+        with ALERT_UPDATE_LATENCY.time():
+            results = [(coin_id, price) + self.book.update(coin_id, price)
+                       for coin_id, (price, _, _) in prices.items()]
+        for coin_id, price, fired, rearmed in results:
+            for alert in fired:
+                self._save(alert.alert_id)
+                self._notify(alert, price)
+            for alert_id in rearmed:
+                self._save(alert_id)
+
+    def _save(self, alert_id: int):
+        if self.book.exists(alert_id):
+            self.store.set_alert(alert_id, *self.book.row(alert_id))
+        else:
+            self.store.delete_alert(alert_id)
+
+    def _notify(self, alert: Alert, price: float):
+        """Ставит сообщение о сработавшем алерте в исходящую очередь"""
+        ALERTS_FIRED.inc('falling' if alert.falling else 'rising')
+        language = self.get_language(alert.user_id)
+        texts = TEXTS[language]
+        message = texts['alert_triggered'].format(
+            coin=coin_name(alert.coin_id),
+            direction=texts['alert_below'] if alert.falling else texts['alert_above'],
+            level=format_price(alert.level),
+            price=format_price(price)
+        )
+        future = outbound_queue.submit(
+            alert.user_id,
+            lambda: self.bot.send_message(chat_id=alert.user_id, text=message, parse_mode='HTML'),
+            PRIORITY_BULK
+        )
+        future.add_done_callback(lambda f: self._on_sent(alert.user_id, f))
+
+    @staticmethod
+    def _on_sent(user_id: int, future: asyncio.Future):
+        """Логирует ошибку отправки алерта"""
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error sending alert to {user_id}: {future.exception()}")
+
+    async def check_prices(self):
+        """Запрашивает свежие цены всех монет с алертами (один пакетный запрос)"""
+        coin_ids = self.book.coin_ids()
+        if not coin_ids:
+            return
+        try:
+            with upstream_priority(PRIORITY_NOTIFICATION):
+                # Цены приходят в on_prices через подписку на CryptoAPI
+                await crypto_api.get_coins_markets(coin_ids)
+        except Exception as e:
+            print(f"Error checking alert prices: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_prices()
+
+    async def start(self):
+        """Запускает периодическую проверку цен"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает периодическую проверку цен"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        """Возвращает число активных алертов и монет с алертами"""
+        return {'active': self.book.active, 'coins': len(self.book.coin_ids())}
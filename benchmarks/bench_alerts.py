@@ -0,0 +1,154 @@
+"""Сверка цены с ценовыми алертами: отсортированный индекс AlertBook против перебора всех алертов монеты.
+
+Запуск: python benchmarks/bench_alerts.py [--alerts 1000000] [--coins 100] [--updates 20000]
+
+Цены монет меняются случайным блужданием; оба варианта получают одну и ту же последовательность
+цен, и перед выводом бенчмарк проверяет, что они сработали на одних и тех же алертах.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerts import AlertBook
+
+
+def generate(alerts: int, coins: int, seed: int = 42):
+    """Синтетические алерты: уровни в пределах ±20% от стартовой цены монеты"""
+    rng = random.Random(seed)
+    prices = {f"coin-{index}": 10 ** rng.uniform(-3, 5) for index in range(coins)}
+    coin_ids = list(prices)
+    # В среднем по 10 алертов на пользователя (лимит - ALERTS_PER_USER)
+    user_ids = rng.sample(range(10_000_000, 7_000_000_000), max(1, alerts // 10))
+    rows = []
+    for alert_id in range(alerts):
+        coin_id = rng.choice(coin_ids)
+        level = prices[coin_id] * rng.uniform(0.8, 1.2)
+        rows.append((alert_id, rng.choice(user_ids), coin_id, level, rng.random() < 0.3))
+    return prices, rows
+
+
+def walk(prices, updates: int, seed: int = 7):
+    """Последовательность обновлений (монета, цена): шаги до ±1%"""
+    rng = random.Random(seed)
+    current = dict(prices)
+    coin_ids = list(prices)
+    steps = []
+    for _ in range(updates):
+        coin_id = rng.choice(coin_ids)
+        current[coin_id] *= 1 + rng.uniform(-0.01, 0.01)
+        steps.append((coin_id, current[coin_id]))
+    return steps
+
+
+def build_book(prices, rows):
+    book = AlertBook()
+    for coin_id, price in prices.items():
+        book.seed_price(coin_id, price)
+    for alert_id, user_id, coin_id, level, repeat in rows:
+        book.add(user_id, coin_id, level, prices[coin_id], repeat)
+    return book
+
+
+class NaiveAlerts:
+    """Прямой перебор: каждое обновление проверяет все алерты монеты"""
+
+    def __init__(self, prices, rows, rearm_gap: float = 0.01):
+        self.rearm_gap = rearm_gap
+        self.price = dict(prices)
+        # {coin_id: [[alert_id, уровень, падение, повтор, ожидание], ...]}
+        self.alerts = {}
+        for alert_id, _, coin_id, level, repeat in rows:
+            self.alerts.setdefault(coin_id, []).append(
+                [alert_id, level, level < prices[coin_id], repeat, False])
+
+    def update(self, coin_id, price):
+        previous, self.price[coin_id] = self.price[coin_id], price
+        fired = []
+        keep = []
+
+        def rose_to(level):
+            return previous < price and previous <= level <= price
+
+        def fell_to(level):
+            return price < previous and price <= level <= previous
+
+        for alert in self.alerts.get(coin_id, ()):
+            alert_id, level, falling, repeat, waiting = alert
+            if waiting:
+                level = level * (1 + self.rearm_gap) if falling else level * (1 - self.rearm_gap)
+                if (falling and rose_to(level)) or (not falling and fell_to(level)):
+                    alert[4] = False
+                keep.append(alert)
+            elif (not falling and rose_to(level)) or (falling and fell_to(level)):
+                fired.append(alert_id)
+                if repeat:
+                    alert[4] = True
+                    keep.append(alert)
+            else:
+                keep.append(alert)
+        self.alerts[coin_id] = keep
+        return fired
+
+
+def measure_build(builder, *args):
+    """Память (байты) и время построения структуры"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = builder(*args)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def run_updates(update, steps):
+    """Среднее время обновления (мкс) и сработавшие алерты"""
+    fired = []
+    started = time.perf_counter()
+    for coin_id, price in steps:
+        fired.append(update(coin_id, price))
+    return (time.perf_counter() - started) / len(steps) * 1e6, fired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--alerts', type=int, default=1_000_000)
+    parser.add_argument('--coins', type=int, default=100)
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--naive-updates', type=int, default=2000, help='обновлений для варианта с перебором')
+    args = parser.parse_args()
+
+    prices, rows = generate(args.alerts, args.coins)
+    book, book_bytes, book_seconds = measure_build(build_book, prices, rows)
+    stored = [(alert_id,) + book.row(alert_id) for alert_id in range(args.alerts)]
+    started = time.perf_counter()
+    AlertBook().load(stored)
+    load_seconds = time.perf_counter() - started
+    del stored
+    naive, naive_bytes, naive_seconds = measure_build(NaiveAlerts, prices, rows)
+
+    steps = walk(prices, args.updates)
+    book_us, book_fired = run_updates(lambda coin_id, price: book.update(coin_id, price)[0], steps)
+    naive_us, naive_fired = run_updates(naive.update, steps[:args.naive_updates])
+
+    for index, (indexed, scanned) in enumerate(zip(book_fired, naive_fired)):
+        assert sorted(alert.alert_id for alert in indexed) == sorted(scanned), f"mismatch at update {index}"
+
+    total_fired = sum(len(fired) for fired in book_fired)
+    print(f"alerts: {args.alerts:,} on {args.coins} coins, updates: {args.updates:,}, fired: {total_fired:,}")
+    print(f"{'':>12} | {'build s':>8} | {'memory MB':>9} | {'update us':>9}")
+    print(f"{'AlertBook':>12} | {book_seconds:8.2f} | {book_bytes / 2**20:9.1f} | {book_us:9.2f}")
+    print(f"{'naive scan':>12} | {naive_seconds:8.2f} | {naive_bytes / 2**20:9.1f} | {naive_us:9.2f}")
+    print(f"bulk load of saved alerts: {load_seconds:.2f} s, speedup per update: {naive_us / book_us:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
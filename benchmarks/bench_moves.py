@@ -0,0 +1,127 @@
+"""Сверка снимка цен с подписками на резкое движение: один проход NumPy (MoveBook) против цикла по подпискам.
+
+Запуск: python benchmarks/bench_moves.py [--subscriptions 1000000] [--snapshots 200]
+
+Цены монет меняются случайным блужданием раз в минуту; оба варианта получают одни и те же снимки
+и цены начала окон, и перед выводом бенчмарк проверяет, что они сработали на одних и тех же подписках.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from config import MOVE_THRESHOLDS, MOVE_WINDOWS, POPULAR_COINS
+from move_alerts import MoveBook
+
+START = 1_700_000_000
+STEP = 60
+
+
+def generate(subscriptions: int, seed: int = 42):
+    """Синтетические подписки (user_id, coin_id, окно, порог %), в среднем по 5 на пользователя"""
+    rng = random.Random(seed)
+    windows = list(MOVE_WINDOWS)
+    user_ids = rng.sample(range(10_000_000, 7_000_000_000), max(1, subscriptions // 5))
+    # У пользователя одна подписка на пару (монета, окно)
+    rows = {}
+    while len(rows) < subscriptions:
+        key = (rng.choice(user_ids), rng.choice(POPULAR_COINS), rng.choice(windows))
+        rows[key] = rng.choice(MOVE_THRESHOLDS)
+    return [key + (threshold,) for key, threshold in rows.items()]
+
+
+def walk(snapshots: int, seed: int = 7) -> np.ndarray:
+    """Цены монет по минутам (шаг до ±1%), начиная за сутки до первого снимка"""
+    rng = np.random.default_rng(seed)
+    warmup = max(MOVE_WINDOWS.values()) // STEP
+    steps = 1 + rng.uniform(-0.01, 0.01, size=(warmup + snapshots, len(POPULAR_COINS)))
+    return 10 ** rng.uniform(-3, 5, size=len(POPULAR_COINS)) * np.cumprod(steps, axis=0)
+
+
+def references(history: np.ndarray, minute: int) -> np.ndarray:
+    """Цены начала каждого окна [монета, окно] на заданной минуте"""
+    back = [minute - seconds // STEP for seconds in MOVE_WINDOWS.values()]
+    return history[back].T
+
+
+class NaiveMoves:
+    """Цикл по подпискам: для каждой вычисляется база и изменение цены"""
+
+    def __init__(self, rows, prices, now):
+        windows = dict(MOVE_WINDOWS)
+        coin_index = {coin_id: index for index, coin_id in enumerate(POPULAR_COINS)}
+        window_index = {window: index for index, window in enumerate(MOVE_WINDOWS)}
+        # [[монета, окно, секунды окна, порог, время базы, цена базы], ...]
+        self.subscriptions = [
+            [coin_index[coin_id], window_index[window], windows[window], threshold / 100,
+             now, prices[coin_index[coin_id]]]
+            for _, coin_id, window, threshold in rows
+        ]
+
+    def evaluate(self, prices, refs, now):
+        fired = []
+        for move_id, subscription in enumerate(self.subscriptions):
+            coin, window, seconds, threshold, base_at, base_price = subscription
+            base = refs[coin, window] if now - base_at >= seconds else base_price
+            if abs(prices[coin] / base - 1) >= threshold:
+                fired.append(move_id)
+                subscription[4] = now
+                subscription[5] = prices[coin]
+        return fired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=1_000_000)
+    parser.add_argument('--snapshots', type=int, default=200)
+    parser.add_argument('--naive-snapshots', type=int, default=10, help='снимков для варианта с циклом')
+    args = parser.parse_args()
+
+    rows = generate(args.subscriptions)
+    history = walk(args.snapshots)
+    first = len(history) - args.snapshots
+    now = START + first * STEP
+
+    started = time.perf_counter()
+    book = MoveBook()
+    book.load((move_id, user_id, coin_id, window, threshold, now, history[first - 1][POPULAR_COINS.index(coin_id)])
+              for move_id, (user_id, coin_id, window, threshold) in enumerate(rows))
+    build_seconds = time.perf_counter() - started
+    naive = NaiveMoves(rows, history[first - 1], now)
+
+    book_fired, naive_fired = [], []
+    book_seconds = naive_seconds = 0.0
+    for snapshot in range(args.snapshots):
+        minute = first + snapshot
+        timestamp = START + minute * STEP
+        prices, refs = history[minute], references(history, minute)
+        started = time.perf_counter()
+        fired, _ = book.evaluate(prices, refs, timestamp)
+        book_seconds += time.perf_counter() - started
+        book_fired.append(fired.tolist())
+        if snapshot < args.naive_snapshots:
+            started = time.perf_counter()
+            naive_fired.append(naive.evaluate(prices, refs, timestamp))
+            naive_seconds += time.perf_counter() - started
+
+    for index, (vectorized, looped) in enumerate(zip(book_fired, naive_fired)):
+        assert vectorized == looped, f"mismatch at snapshot {index}"
+
+    book_ms = book_seconds / args.snapshots * 1000
+    naive_ms = naive_seconds / max(1, min(args.snapshots, args.naive_snapshots)) * 1000
+    total_fired = sum(len(fired) for fired in book_fired)
+    print(f"subscriptions: {args.subscriptions:,} on {len(POPULAR_COINS)} coins, "
+          f"snapshots: {args.snapshots}, fired: {total_fired:,}")
+    print(f"{'':>12} | {'snapshot ms':>11}")
+    print(f"{'MoveBook':>12} | {book_ms:11.2f}")
+    print(f"{'loop':>12} | {naive_ms:11.2f}")
+    print(f"bulk load: {build_seconds:.2f} s, speedup per snapshot: {naive_ms / book_ms:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Стоимость одного рендера экрана и клавиатуры: скомпилированные шаблоны templates.py и
+закэшированные разметки keyboards.py против сборки разметки заново.
+
+Запуск: python benchmarks/bench_render.py [--iterations 20000]
+
+Перед замером бенчмарк сверяет тексты экранов с сохраненным выводом прежних форматтеров
+(bench_render_expected.json; обновить после намеренной правки текстов: --update-expected),
+а клавиатуры проверяет по структуре: кэш отдает тот же объект, совпадающий со свежей сборкой,
+у каждой кнопки есть текст и ровно одно действие, callback_data не длиннее 64 байт.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LANGUAGES
+from keyboards import keyboards
+from templates import view_templates
+
+EXPECTED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_render_expected.json')
+# Ограничение Telegram на callback_data (байты)
+CALLBACK_DATA_LIMIT = 64
+
+GLOBAL_METRICS = {
+    'total_market_cap_usd': 2.51e12, 'total_volume_24h_usd': 9.13e10,
+    'market_cap_percentage': {'btc': 51.23, 'eth': 17.31}, 'active_cryptocurrencies': 12345,
+    'markets': 987, 'market_cap_change_24h': 1.73
+}
+TOP_COINS = [{
+    'rank': rank, 'name': f'Coin {rank}', 'symbol': f'C{rank}', 'price': 1000.0 / rank,
+    'market_cap': 1e11 / rank, 'price_change_24h': (-1) ** rank * 2.5, 'volume_24h': 1e9 / rank
+} for rank in range(1, 11)]
+BINANCE_PAIRS = [{
+    'symbol': f'C{rank}USDT', 'price': 1000.0 / rank, 'price_change_24h': (-1) ** rank * 1.5,
+    'volume_24h': 1e8 / rank, 'high_24h': 1100.0 / rank, 'low_24h': 900.0 / rank
+} for rank in range(1, 11)]
+FEAR_GREED = {'value': 63, 'value_classification': 'Greed', 'status': 'Greed', 'emoji': '🤑', 'timestamp': '0'}
+TRENDS = [{'name': f'Trend {i}', 'symbol': f'T{i}', 'market_cap_rank': i * 7 if i % 3 else None, 'price_btc': 1e-5}
+          for i in range(1, 8)]
+DEFI = {
+    'defi_market_cap': 9.5e10, 'eth_market_cap': 4e11, 'defi_to_eth_ratio': 23.7,
+    'trading_volume_24h': 4.1e9, 'defi_dominance': 3.8, 'top_coin_name': 'Lido', 'top_coin_defi_dominance': 27.1
+}
+COIN = {
+    'name': 'Bitcoin', 'symbol': 'BTC', 'current_price': 67000.5, 'market_cap': 1.3e12,
+    'price_change_24h': -1.2, 'price_change_7d': 4.5, 'volume_24h': 3.1e10, 'market_cap_rank': 1
+}
+
+VIEWS = [
+    ('global_metrics', view_templates.global_metrics, GLOBAL_METRICS),
+    ('top_coins', view_templates.top_coins, TOP_COINS),
+    ('binance_pairs', view_templates.binance_pairs, BINANCE_PAIRS),
+    ('fear_greed', view_templates.fear_greed, FEAR_GREED),
+    ('trends', view_templates.trends, TRENDS),
+    ('defi_metrics', view_templates.defi_metrics, DEFI),
+    ('coin', view_templates.coin, COIN)
+]
+# (название, клавиатура из кэша, аргументы перед языком)
+KEYBOARDS = [
+    ('main_menu', keyboards.get_main_menu_keyboard, ()),
+    ('back', keyboards.get_back_keyboard, ()),
+    ('coins', keyboards.get_coins_keyboard, ()),
+    ('intervals', keyboards.get_intervals_keyboard, ('bitcoin',)),
+    ('alert_coins', keyboards.get_alert_coins_keyboard, ()),
+    ('alert_levels', keyboards.get_alert_levels_keyboard, ('bitcoin',)),
+    ('move_coins', keyboards.get_move_coins_keyboard, ()),
+    ('move_thresholds', keyboards.get_move_thresholds_keyboard, ('matic-network',)),
+    ('update', keyboards.get_update_keyboard, ())
+]
+
+
+def render_text(compiled, data, language: str) -> str:
+    """Текст экрана без метки времени (она зависит от момента рендера)"""
+    return compiled(data, language).strip().rsplit('⏰', 1)[0]
+
+
+def per_call_us(function, iterations: int) -> float:
+    """Среднее время одного вызова function() в микросекундах (по всем языкам)"""
+    languages = list(LANGUAGES)
+    started = time.perf_counter()
+    for i in range(iterations):
+        function(languages[i % len(languages)])
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def check_keyboard(name: str, cached, args, language: str):
+    """Структурная проверка клавиатуры, не зависящая от набора кнопок"""
+    markup = cached(*args, language)
+    if cached(*args, language) is not markup:
+        raise AssertionError(f"keyboard {name}/{language} is not cached")
+    if markup != cached.__wrapped__(*args, language):
+        raise AssertionError(f"keyboard {name}/{language} differs from a fresh build")
+    for row in markup.inline_keyboard:
+        for button in row:
+            if not button.text:
+                raise AssertionError(f"keyboard {name}/{language} has a button without text")
+            if (button.callback_data is None) == (button.url is None):
+                raise AssertionError(f"keyboard {name}/{language}: {button.text!r} needs exactly one action")
+            if button.callback_data is not None and len(button.callback_data.encode()) > CALLBACK_DATA_LIMIT:
+                raise AssertionError(f"keyboard {name}/{language}: {button.callback_data!r} is too long")
+
+
+def check_equivalence():
+    """Тексты экранов совпадают с сохраненными, клавиатуры корректны"""
+    with open(EXPECTED_PATH, encoding='utf-8') as f:
+        expected = json.load(f)
+    for language in LANGUAGES:
+        for name, compiled, data in VIEWS:
+            old = expected[name][language]
+            new = render_text(compiled, data, language)
+            if old != new:
+                raise AssertionError(f"{name}/{language} differs:\n{old!r}\n{new!r}")
+        for name, cached, args in KEYBOARDS:
+            check_keyboard(name, cached, args, language)
+
+
+def update_expected():
+    """Сохраняет текущие тексты экранов как эталон"""
+    expected = {name: {language: render_text(compiled, data, language) for language in LANGUAGES}
+                for name, compiled, data in VIEWS}
+    with open(EXPECTED_PATH, 'w', encoding='utf-8') as f:
+        json.dump(expected, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--update-expected', action='store_true', help='перезаписать эталонные тексты экранов')
+    args = parser.parse_args()
+
+    if args.update_expected:
+        update_expected()
+    check_equivalence()
+    print(f"{'view':>18} | {'render us':>9}")
+    for name, compiled, data in VIEWS:
+        print(f"{name:>18} | {per_call_us(lambda lang: compiled(data, lang), args.iterations):9.2f}")
+    print()
+    print(f"{'keyboard':>18} | {'build us':>9} | {'cached us':>9} | {'speedup':>7}")
+    for name, cached, extra in KEYBOARDS:
+        before = per_call_us(lambda lang: cached.__wrapped__(*extra, lang), args.iterations)
+        after = per_call_us(lambda lang: cached(*extra, lang), args.iterations)
+        print(f"{name:>18} | {before:9.2f} | {after:9.2f} | {before / after:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Бенчмарк колеса таймеров уведомлений в сравнении с задачами APScheduler.
+
+Запуск: python benchmarks/bench_scheduler.py [--sizes 1000,10000,100000]
+
+Вторая таблица - нагрузка по секундам после перезапуска, когда все подписки восстанавливаются разом:
+без разнесения фаз они попадают в один слот, с разнесением - распределены по интервалу.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from config import TIME_INTERVALS
+from scheduler import TimingWheel
+
+INTERVALS = list(TIME_INTERVALS)
+
+
+def bench_wheel(size: int) -> dict:
+    """Добавление, удаление и один час тактов колеса для size подписок"""
+    wheel = TimingWheel()
+    start_time = 1_700_000_000.0
+    wheel.advance(start_time)
+
+    started = time.perf_counter()
+    for i in range(size):
+        wheel.add((str(i), 'bitcoin'), INTERVALS[i % len(INTERVALS)], now=start_time + i % 3600)
+    add_seconds = time.perf_counter() - started
+
+    fired = 0
+    started = time.perf_counter()
+    for second in range(1, 3601):
+        fired += len(wheel.advance(start_time + second))
+    tick_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(0, size, 2):
+        wheel.remove((str(i), 'bitcoin'))
+    remove_seconds = time.perf_counter() - started
+
+    return {
+        'add_us': add_seconds / size * 1e6,
+        'remove_us': remove_seconds / (size // 2 or 1) * 1e6,
+        'tick_us': tick_seconds / 3600 * 1e6,
+        'fired_per_hour': fired
+    }
+
+
+def bench_load(size: int, spread: bool, jitter_seconds: int = 0) -> dict:
+    """Срабатывания в секунду за сутки после восстановления size подписок в одну секунду"""
+    wheel = TimingWheel(spread=spread, jitter_seconds=jitter_seconds)
+    start_time = 1_700_000_000.0
+    wheel.advance(start_time)
+    for i in range(size):
+        wheel.add((10_000_000 + i * 7919, 'bitcoin'), INTERVALS[i % len(INTERVALS)], now=start_time)
+    return wheel.load_stats()
+
+
+async def bench_apscheduler(size: int) -> dict:
+    """Прежняя схема: отдельная интервальная задача APScheduler на подписку"""
+    scheduler = AsyncIOScheduler()
+    scheduler.start(paused=True)
+
+    async def job(user_id, coin_id):
+        pass
+
+    started = time.perf_counter()
+    for i in range(size):
+        scheduler.add_job(job, trigger='interval', minutes=TIME_INTERVALS[INTERVALS[i % len(INTERVALS)]],
+                          args=[str(i), 'bitcoin'], id=f"{i}_bitcoin", replace_existing=True)
+    add_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(0, size, 2):
+        scheduler.remove_job(f"{i}_bitcoin")
+    remove_seconds = time.perf_counter() - started
+    scheduler.shutdown(wait=False)
+
+    return {
+        'add_us': add_seconds / size * 1e6,
+        'remove_us': remove_seconds / (size // 2 or 1) * 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--apscheduler-max', type=int, default=20000,
+                        help='максимальный размер для прогона APScheduler (он растет нелинейно)')
+    parser.add_argument('--jitter', type=int, default=0, help='дополнительно показать нагрузку со сдвигом до N секунд')
+    args = parser.parse_args()
+
+    print(f"{'subscriptions':>13} | {'wheel add us':>12} | {'wheel rm us':>11} | {'tick us':>9} | "
+          f"{'aps add us':>10} | {'aps rm us':>9}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        wheel = bench_wheel(size)
+        if size <= args.apscheduler_max:
+            aps = asyncio.run(bench_apscheduler(size))
+            aps_add, aps_remove = f"{aps['add_us']:10.2f}", f"{aps['remove_us']:9.2f}"
+        else:
+            aps_add, aps_remove = f"{'-':>10}", f"{'-':>9}"
+        print(f"{size:>13} | {wheel['add_us']:12.2f} | {wheel['remove_us']:11.2f} | "
+              f"{wheel['tick_us']:9.2f} | {aps_add} | {aps_remove}")
+
+    print()
+    print(f"{'subscriptions':>13} | {'phase':>10} | {'mean/s':>9} | {'peak/s':>9} | {'peak/mean':>9} | "
+          f"{'idle s':>6}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        variants = [('boot tick', False, 0), ('hash', True, 0)]
+        if args.jitter:
+            variants.append((f"hash+{args.jitter}s", True, args.jitter))
+        for name, spread, jitter in variants:
+            load = bench_load(size, spread, jitter)
+            print(f"{size:>13} | {name:>10} | {load['mean']:9.2f} | {load['peak']:9} | "
+                  f"{load['peak_to_mean']:9.1f} | {load['idle_ticks']:6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Сравнение памяти: словари со строковыми ключами против CompactUserState.
+
+Запуск: python benchmarks/bench_user_state.py [--users 1000000] [--subscribers 0.1]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LANGUAGES, POPULAR_COINS, TIME_INTERVALS
+from user_state import CompactUserState
+
+
+def generate(users: int, subscribers: float):
+    """Синтетические пользователи с реалистичными Telegram id"""
+    rng = random.Random(42)
+    languages = list(LANGUAGES)
+    intervals = list(TIME_INTERVALS)
+    user_ids = rng.sample(range(10_000_000, 7_000_000_000), users)
+    rows = []
+    for user_id in user_ids:
+        coins = {}
+        if rng.random() < subscribers:
+            for coin_id in rng.sample(POPULAR_COINS, rng.randint(1, 3)):
+                coins[coin_id] = rng.choice(intervals)
+        rows.append((user_id, rng.choice(languages), coins))
+    return rows
+
+
+def build_dicts(rows):
+    """Прежнее представление NotificationManager"""
+    user_languages = {}
+    user_notifications = {}
+    for user_id, language, coins in rows:
+        key = str(user_id)
+        user_languages[key] = language
+        if coins:
+            user_notifications[key] = {coin_id: interval for coin_id, interval in coins.items()}
+    return user_languages, user_notifications
+
+
+def build_compact(rows):
+    state = CompactUserState()
+    state.load_languages({user_id: language for user_id, language, _ in rows})
+    state.load_notifications({user_id: coins for user_id, _, coins in rows if coins})
+    return state
+
+
+def measure(builder, rows):
+    """Память (байты) и время построения структуры"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = builder(rows)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--subscribers', type=float, default=0.1)
+    args = parser.parse_args()
+
+    rows = generate(args.users, args.subscribers)
+    (languages, _), dict_bytes, dict_seconds = measure(build_dicts, rows)
+    state, compact_bytes, compact_seconds = measure(build_compact, rows)
+
+    sample = [user_id for user_id, _, _ in random.Random(1).sample(rows, min(100_000, len(rows)))]
+    started = time.perf_counter()
+    for user_id in sample:
+        languages.get(str(user_id), 'ru')
+    dict_lookup = (time.perf_counter() - started) / len(sample) * 1e9
+    started = time.perf_counter()
+    for user_id in sample:
+        state.get_language(user_id)
+    compact_lookup = (time.perf_counter() - started) / len(sample) * 1e9
+
+    print(f"users: {args.users:,}, subscriptions: {state.subscription_count:,}")
+    print(f"{'structure':>10} | {'memory MB':>10} | {'bytes/user':>10} | {'build s':>8} | {'lookup ns':>9}")
+    for name, size, seconds, lookup in (('dicts', dict_bytes, dict_seconds, dict_lookup),
+                                        ('compact', compact_bytes, compact_seconds, compact_lookup)):
+        print(f"{name:>10} | {size / 1e6:10.1f} | {size / args.users:10.1f} | {seconds:8.2f} | {lookup:9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Проверка BinanceTickerFeed на локальных заглушках REST /ticker/24hr и WebSocket !miniTicker@arr.
+
+Запуск: python benchmarks/check_binance_feed.py [--coins 50] [--timeout 10]
+
+Сценарий: снимок из REST -> события потока -> обрыв соединения, во время которого меняется рынок
+и теряется пакет событий -> переподключение с пересинхронизацией. После каждого шага таблица пар
+и индекс по объему сверяются с тем, что отдает заглушка.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest import FakeBinanceStream, FakeService, MarketData
+
+
+async def wait_until(predicate, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError(f"timed out waiting for {what}")
+        await asyncio.sleep(0.01)
+
+
+def check_table(feed, tickers, step: str):
+    """Сверяет таблицу пар и индекс ленты с тикерами заглушки"""
+    expected = {ticker['symbol']: ticker for ticker in tickers if ticker['symbol'].endswith(feed.quote)}
+    if set(feed.pairs) != set(expected):
+        raise AssertionError(f"{step}: symbols differ: {sorted(set(feed.pairs) ^ set(expected))}")
+    for symbol, ticker in expected.items():
+        pair = feed.pairs[symbol]
+        if pair['price'] != float(ticker['lastPrice']) or pair['volume_24h'] != float(ticker['quoteVolume']):
+            raise AssertionError(f"{step}: {symbol} is {pair}, expected {ticker}")
+        if abs(pair['price_change_24h'] - float(ticker['priceChangePercent'])) > 1e-6:
+            raise AssertionError(f"{step}: {symbol} change is {pair['price_change_24h']}, expected {ticker}")
+    ranked = sorted(expected, key=lambda symbol: (-float(expected[symbol]['quoteVolume']), symbol))
+    if [pair['symbol'] for pair in feed.top(len(ranked))] != ranked:
+        raise AssertionError(f"{step}: volume index is out of order")
+    print(f"{step}: {len(expected)} pairs match, version {feed.version}, reconnects {feed.reconnects}")
+
+
+def move_market(market: MarketData, rng: random.Random, count: int):
+    """Меняет цену и объем случайных тикеров; возвращает измененные тикеры"""
+    changed = rng.sample(market.tickers, count)
+    for ticker in changed:
+        price = float(ticker['lastPrice']) * rng.uniform(0.9, 1.1)
+        ticker.update({
+            'lastPrice': str(price), 'priceChangePercent': str(rng.uniform(-10, 10)),
+            'quoteVolume': str(float(ticker['quoteVolume']) * rng.uniform(0.5, 2)),
+            'highPrice': str(price * 1.05), 'lowPrice': str(price * 0.95)
+        })
+    return changed
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    market = MarketData(rng)
+    # Тикер - первые 4 символа id, поэтому номер монеты идет в начало
+    market.populate([f"c{index:03d}-coin" for index in range(args.coins)])
+    stream = FakeBinanceStream()
+    rest = FakeService('binance', market.binance_routes(), 0, 0, rng)
+    ws = FakeService('binance-stream', stream.routes(), 0, 0, rng)
+    await rest.start()
+    await ws.start()
+
+    from binance_feed import BinanceTickerFeed
+    from crypto_api import crypto_api
+
+    feed = BinanceTickerFeed(ws_url=ws.base_url.replace('http', 'ws', 1) + FakeBinanceStream.PATH,
+                             rest_url=rest.base_url + '/api/v3/ticker/24hr', stale_seconds=args.timeout)
+    await feed.start()
+    try:
+        await wait_until(lambda: feed.ready and stream.connections, args.timeout, 'the first connection')
+        check_table(feed, market.tickers, 'snapshot')
+
+        version = feed.version
+        await stream.push(move_market(market, rng, args.coins // 5))
+        await wait_until(lambda: feed.version > version, args.timeout, 'stream updates')
+        check_table(feed, market.tickers, 'updates')
+
+        # Обрыв: пока клиента нет, рынок меняется, а пакет событий уходит в пустоту
+        await stream.drop()
+        await wait_until(lambda: not feed.ready, args.timeout, 'the disconnect')
+        await stream.push(move_market(market, rng, args.coins // 5))
+        if feed.reconnects != 1:
+            raise AssertionError(f"reconnects is {feed.reconnects}, expected 1")
+        await wait_until(lambda: feed.ready and stream.connections > 1, args.timeout, 'the reconnect')
+        if stream.connections != 2:
+            raise AssertionError(f"stream saw {stream.connections} connections, expected 2")
+        check_table(feed, market.tickers, 'resync')
+
+        version = feed.version
+        await stream.push(move_market(market, rng, args.coins // 5))
+        await wait_until(lambda: feed.version > version, args.timeout, 'updates after the reconnect')
+        check_table(feed, market.tickers, 'updates after resync')
+    finally:
+        await feed.stop()
+        await crypto_api.close()
+        await ws.stop()
+        await rest.stop()
+    print(f"REST requests: {rest.get_stats()['requests']}, stream connections: {stream.connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--coins', type=int, default=50, help='монет в синтетическом рынке (до 1000)')
+    parser.add_argument('--timeout', type=float, default=10, help='секунд на каждый шаг сценария')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,497 @@
+"""Нагрузочный тест бота на локальных заглушках Telegram, CoinGecko, Binance и alternative.me.
+
+Запуск: python benchmarks/loadtest.py [--users 10000] [--clicks 5000] [--subscriptions 20000]
+        [--latency-ms 20] [--error-rate 0.01] [--telegram-error-rate 0.001] [--output result.json]
+
+Сеть не нужна: все внешние API подменяются локальными HTTP-серверами с настраиваемой задержкой
+и долей ошибок. Результат печатается в JSON, чтобы сравнивать версии между собой.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiohttp import web
+
+BOT_TOKEN = '123456:LOADTEST'
+CLICK_MIX = (
+    ('global_metrics', 3), ('top_10_coins', 3), ('binance_pairs', 2), ('fear_greed', 1),
+    ('trends', 1), ('defi_metrics', 1), ('back_to_menu', 2), ('notifications', 1), ('coin', 1)
+)
+
+
+class FakeService:
+    """Локальный HTTP-сервер-заглушка с задержкой и инъекцией ошибок"""
+
+    def __init__(self, name: str, routes, latency: float, error_rate: float, rng: random.Random,
+                 error_response=None):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = rng
+        self.error_response = error_response or (lambda: web.json_response({'error': 'injected'}, status=500))
+        self.requests = 0
+        self.errors = 0
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.add_routes(routes)
+        self._runner = None
+        self.base_url = None
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            # Задержка с разбросом +-50%, чтобы ответы не приходили строго синхронно
+            await asyncio.sleep(self.latency * (0.5 + self.rng.random()))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return self.error_response()
+        return await handler(request)
+
+    async def start(self) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', 0).start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def get_stats(self) -> dict:
+        return {'requests': self.requests, 'errors': self.errors}
+
+
+class MarketData:
+    """Синтетические рыночные данные в форматах ответов CoinGecko, Binance и alternative.me"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.coins = {}
+        self.tickers = []
+
+    def populate(self, coin_ids):
+        """Генерирует монеты и тикеры (серверы уже могут быть запущены)"""
+        rng = self.rng
+        for rank, coin_id in enumerate(coin_ids, 1):
+            price = rng.uniform(0.01, 50000)
+            self.coins[coin_id] = {
+                'id': coin_id,
+                'symbol': coin_id[:4],
+                'name': coin_id.replace('-', ' ').title(),
+                'current_price': price,
+                'market_cap': price * rng.uniform(1e6, 1e9),
+                'market_cap_rank': rank,
+                'total_volume': price * rng.uniform(1e5, 1e8),
+                'price_change_percentage_24h': rng.uniform(-10, 10),
+                'price_change_percentage_7d_in_currency': rng.uniform(-20, 20)
+            }
+        self.tickers = [{
+            'symbol': f"{coin['symbol'].upper()}{quote}",
+            'lastPrice': str(coin['current_price']),
+            'priceChangePercent': str(coin['price_change_percentage_24h']),
+            'quoteVolume': str(coin['total_volume']),
+            'highPrice': str(coin['current_price'] * 1.05),
+            'lowPrice': str(coin['current_price'] * 0.95)
+        } for coin in self.coins.values() for quote in ('USDT', 'BTC')]
+
+    def coingecko_routes(self):
+        async def global_metrics(request):
+            return web.json_response({'data': {
+                'total_market_cap': {'usd': 2.5e12}, 'total_volume': {'usd': 9.1e10},
+                'market_cap_percentage': {'btc': 51.2, 'eth': 17.3},
+                'active_cryptocurrencies': 12000, 'markets': 900,
+                'market_cap_change_percentage_24h_usd': 1.7
+            }})
+
+        async def markets(request):
+            ids = request.query.get('ids')
+            if ids:
+                coins = [self.coins[coin_id] for coin_id in ids.split(',') if coin_id in self.coins]
+            else:
+                coins = list(self.coins.values())[:int(request.query.get('per_page', 100))]
+            return web.json_response(coins)
+
+        async def coin(request):
+            coin = self.coins.get(request.match_info['coin_id'])
+            if coin is None:
+                return web.json_response({'error': 'coin not found'}, status=404)
+            return web.json_response({'id': coin['id'], 'name': coin['name'], 'symbol': coin['symbol'], 'market_data': {
+                'current_price': {'usd': coin['current_price']},
+                'market_cap': {'usd': coin['market_cap']},
+                'total_volume': {'usd': coin['total_volume']},
+                'price_change_percentage_24h': coin['price_change_percentage_24h'],
+                'price_change_percentage_7d': coin['price_change_percentage_7d_in_currency'],
+                'market_cap_rank': coin['market_cap_rank']
+            }})
+
+        async def coins_list(request):
+            return web.json_response([
+                {'id': coin['id'], 'symbol': coin['symbol'], 'name': coin['name']} for coin in self.coins.values()
+            ])
+
+        async def trending(request):
+            return web.json_response({'coins': [{'item': {
+                'name': coin['name'], 'symbol': coin['symbol'].upper(),
+                'market_cap_rank': coin['market_cap_rank'], 'price_btc': coin['current_price'] / 50000
+            }} for coin in list(self.coins.values())[:7]]})
+
+        async def defi(request):
+            return web.json_response({'data': {
+                'defi_market_cap': '95000000000', 'eth_market_cap': '400000000000',
+                'defi_to_eth_ratio': '23.7', 'trading_volume_24h': '4100000000',
+                'defi_dominance': '3.8', 'top_coin_name': 'Lido Staked Ether',
+                'top_coin_defi_dominance': 27.1
+            }})
+
+        return [
+            web.get('/api/v3/global', global_metrics),
+            web.get('/api/v3/global/decentralized_finance_defi', defi),
+            web.get('/api/v3/coins/markets', markets),
+            web.get('/api/v3/coins/list', coins_list),
+            web.get('/api/v3/coins/{coin_id}', coin),
+            web.get('/api/v3/search/trending', trending)
+        ]
+
+    def binance_routes(self):
+        async def ticker(request):
+            return web.json_response(self.tickers)
+
+        return [web.get('/api/v3/ticker/24hr', ticker)]
+
+    def fear_greed_routes(self):
+        async def index(request):
+            return web.json_response({'data': [
+                {'value': '63', 'value_classification': 'Greed', 'timestamp': str(int(time.time()))}
+            ]})
+
+        return [web.get('/fng/', index)]
+
+
+class FakeBinanceStream:
+    """Заглушка WebSocket-потока Binance !miniTicker@arr: рассылает пакеты событий и умеет рвать соединения"""
+
+    PATH = '/ws/!miniTicker@arr'
+
+    def __init__(self):
+        self.clients = set()
+        self.connections = 0
+
+    def routes(self):
+        return [web.get(self.PATH, self.handle)]
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self.clients.add(ws)
+        try:
+            # Клиент ничего не присылает - ждем, пока соединение не закроется
+            async for _ in ws:
+                pass
+        finally:
+            self.clients.discard(ws)
+        return ws
+
+    @staticmethod
+    def mini_ticker(ticker: dict) -> dict:
+        """Событие miniTicker из тикера в формате REST /ticker/24hr"""
+        price = float(ticker['lastPrice'])
+        return {
+            'e': '24hrMiniTicker', 'E': int(time.time() * 1000), 's': ticker['symbol'],
+            'c': ticker['lastPrice'], 'o': str(price / (1 + float(ticker['priceChangePercent']) / 100)),
+            'h': ticker['highPrice'], 'l': ticker['lowPrice'], 'q': ticker['quoteVolume']
+        }
+
+    async def push(self, tickers):
+        """Отправляет всем подключенным клиентам пакет событий по тикерам в формате REST"""
+        data = json.dumps([self.mini_ticker(ticker) for ticker in tickers])
+        for ws in list(self.clients):
+            await ws.send_str(data)
+
+    async def drop(self):
+        """Закрывает все соединения, как при обрыве потока на стороне биржи"""
+        for ws in list(self.clients):
+            await ws.close()
+
+
+class FakeTelegram:
+    """Заглушка Bot API: отвечает на методы, которые вызывает бот, и считает их"""
+
+    def __init__(self):
+        self.methods = {}
+        self._message_id = 0
+
+    def routes(self):
+        return [web.post('/bot{token}/{method}', self.handle)]
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.methods[method] = self.methods.get(method, 0) + 1
+        # PTB передает параметры формой, сложные значения - в виде JSON
+        params = {}
+        for key, value in (await request.post()).items():
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                params[key] = value
+        if method == 'getMe':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'loadtest_bot'}
+        elif method in ('sendMessage', 'editMessageText'):
+            self._message_id += 1
+            result = {
+                'message_id': params.get('message_id', self._message_id), 'date': int(time.time()),
+                'chat': {'id': params.get('chat_id', 0), 'type': 'private'}, 'text': params.get('text', '')
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def error_response(flood_share: float, rng: random.Random):
+        """Ошибка Bot API: часть ответов - 429 с retry_after, остальные - 500"""
+        def response():
+            if rng.random() < flood_share:
+                return web.json_response({'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                                          'parameters': {'retry_after': 1}}, status=429)
+            return web.json_response({'ok': False, 'error_code': 500, 'description': 'Internal Server Error'},
+                                     status=500)
+        return response
+
+
+def click_update(update_id: int, user_id: int, data: str) -> dict:
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'chat_instance': str(user_id), 'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'},
+        'message': {'message_id': update_id, 'date': int(time.time()), 'text': 'menu',
+                    'chat': {'id': user_id, 'type': 'private'}}
+    }}
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+async def run_clicks(bot, args, rng: random.Random, user_ids, coin_ids) -> dict:
+    """Синтетические нажатия кнопок с ограниченным числом одновременных обновлений"""
+    from telegram import Update
+    import main
+
+    views = [view for view, _ in CLICK_MIX]
+    weights = [weight for _, weight in CLICK_MIX]
+    latencies = []
+    counter = iter(range(1, args.clicks + 1))
+    errors_before = sum(main.HANDLER_ERRORS._values.values())
+
+    async def clicker():
+        for update_id in counter:
+            data = rng.choices(views, weights)[0]
+            if data == 'coin':
+                data = f"coin_{rng.choice(coin_ids)}"
+            update = Update.de_json(click_update(update_id, rng.choice(user_ids), data), bot.app.bot)
+            started = time.perf_counter()
+            await bot.app.process_update(update)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(clicker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'count': len(latencies),
+        'errors': sum(main.HANDLER_ERRORS._values.values()) - errors_before,
+        'seconds': elapsed,
+        'updates_per_sec': len(latencies) / elapsed,
+        'latency_p50_ms': percentile(latencies, 0.5) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+        'latency_max_ms': max(latencies, default=0.0) * 1000
+    }
+
+
+async def run_notifications(bot, args, rng: random.Random, user_ids, coin_ids) -> dict:
+    """Подписки синтетических пользователей и одна рассылка по всем сразу через колесо таймеров"""
+    from config import TIME_INTERVALS
+    from sender import outbound_queue
+
+    manager = bot.notification_manager
+    intervals = list(TIME_INTERVALS)
+    for _ in range(args.subscriptions):
+        manager.add_notification(rng.choice(user_ids), rng.choice(coin_ids), rng.choice(intervals))
+    subscriptions = sum(1 for _ in manager.state.iter_notifications())
+
+    # Колесо проворачивается на самый длинный период за один шаг: каждая подписка попадает
+    # в пакет ровно один раз, сколько бы раз ее слот ни встретился за период
+    wheel = manager.wheel
+    now = time.time()
+    await manager.advance_wheel(now)
+    await manager.advance_wheel(now + max(wheel.periods.values()) * wheel.tick_seconds)
+    due = len(manager._pending)
+    if due != subscriptions:
+        raise AssertionError(f"timing wheel returned {due} of {subscriptions} subscriptions")
+
+    before = outbound_queue.get_stats()
+    started = time.perf_counter()
+    await manager.flush_pending()
+    enqueued = time.perf_counter() - started
+    # Ждем, пока исходящая очередь доставит (или окончательно отклонит) все сообщения
+    while True:
+        stats = outbound_queue.get_stats()
+        done = stats['sent'] + stats['failed'] - before['sent'] - before['failed']
+        if done >= due:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    return {
+        'count': due,
+        'sent': stats['sent'] - before['sent'],
+        'failed': stats['failed'] - before['failed'],
+        'retry_after': stats['retry_after'] - before['retry_after'],
+        'enqueue_seconds': enqueued,
+        'seconds': elapsed,
+        'notifications_per_sec': due / elapsed if elapsed else 0.0,
+        'send_latency_p99_ms': stats['latency_p99'] * 1000
+    }
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    telegram = FakeTelegram()
+    market = MarketData(rng)
+    services = {}
+    services['coingecko'] = FakeService('coingecko', market.coingecko_routes(), args.latency_ms / 1000,
+                                        args.error_rate, rng)
+    services['binance'] = FakeService('binance', market.binance_routes(), args.latency_ms / 1000,
+                                      args.error_rate, rng)
+    services['alternative.me'] = FakeService('alternative.me', market.fear_greed_routes(),
+                                             args.latency_ms / 1000, args.error_rate, rng)
+    services['telegram'] = FakeService('telegram', telegram.routes(), args.telegram_latency_ms / 1000,
+                                       args.telegram_error_rate, rng,
+                                       FakeTelegram.error_response(args.flood_share, rng))
+    for service in services.values():
+        await service.start()
+
+    # Конфигурация читается при импорте, поэтому окружение задается до импорта модулей бота
+    os.environ.update({
+        'BOT_TOKEN': BOT_TOKEN,
+        'COINGECKO_BASE_URL': services['coingecko'].base_url + '/api/v3',
+        'BINANCE_BASE_URL': services['binance'].base_url + '/api/v3',
+        'FEAR_GREED_URL': services['alternative.me'].base_url + '/fng/',
+        'TELEGRAM_API_URL': services['telegram'].base_url + '/bot',
+        'TELEGRAM_GLOBAL_RATE': str(args.telegram_rate),
+        # Заглушки не ограничивают частоту, а лимит реального CoinGecko исказил бы пропускную способность
+        'UPSTREAM_QUOTA_COINGECKO': '0',
+        'UPSTREAM_QUOTA_BINANCE': '0',
+        'UPSTREAM_QUOTA_FEAR_GREED': '0',
+        'PREFETCH_ENABLED': 'true' if args.prefetch else 'false',
+        'BINANCE_WS_ENABLED': 'false',
+        'METRICS_PORT': '0',
+        'NOTIFICATION_WORKERS': '0',
+        'USER_DB_PATH': os.path.join(os.getcwd(), 'user_data.db'),
+        'PRICE_HISTORY_PATH': os.path.join(os.getcwd(), 'price_history.bin'),
+        'COIN_CATALOG_PATH': os.path.join(os.getcwd(), 'coin_catalog.bin')
+    })
+    import main
+    from config import POPULAR_COINS
+    from crypto_api import crypto_api
+
+    coin_ids = list(POPULAR_COINS) + [f"coin-{index}" for index in range(args.coins - len(POPULAR_COINS))]
+    market.populate(coin_ids)
+    bot = main.CryptoVektorProBot()
+    app = bot.build_application()
+    await app.initialize()
+    await bot.post_init(app)
+    # Живой планировщик рассылал бы подписки посреди замера: колесо таймеров тест крутит сам
+    bot.notification_manager.stop_scheduler()
+    try:
+        user_ids = rng.sample(range(10_000_000, 7_000_000_000), args.users)
+        languages = ['ru', 'en', 'de']
+        for user_id in user_ids:
+            bot.notification_manager.set_user_language(user_id, rng.choice(languages))
+
+        clicks = await run_clicks(bot, args, rng, user_ids, coin_ids)
+        notifications = await run_notifications(bot, args, rng, user_ids, coin_ids)
+        cache = crypto_api.get_cache_stats()
+        requests = crypto_api.get_request_stats()
+    finally:
+        await app.shutdown()
+        await bot.post_shutdown(app)
+        for service in services.values():
+            await service.stop()
+
+    return {
+        'version': git_version(),
+        'python': platform.python_version(),
+        'timestamp': int(time.time()),
+        'config': vars(args),
+        'clicks': clicks,
+        'notifications': notifications,
+        'services': {name: service.get_stats() for name, service in services.items()},
+        'telegram_methods': telegram.methods,
+        'cache': cache,
+        'requests': requests
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--clicks', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50, help='одновременно обрабатываемых нажатий')
+    parser.add_argument('--subscriptions', type=int, default=20000)
+    parser.add_argument('--coins', type=int, default=250, help='монет в синтетическом рынке')
+    parser.add_argument('--latency-ms', type=float, default=20, help='задержка заглушек внешних API')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 500 от внешних API')
+    parser.add_argument('--telegram-latency-ms', type=float, default=10)
+    parser.add_argument('--telegram-error-rate', type=float, default=0.0)
+    parser.add_argument('--flood-share', type=float, default=0.5,
+                        help='доля 429 (retry_after) среди ошибок Telegram')
+    parser.add_argument('--telegram-rate', type=float, default=1000,
+                        help='глобальный лимит отправки; 30 - реальный лимит Telegram')
+    parser.add_argument('--prefetch', action='store_true', help='включить фоновое обновление экранов')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='файл для JSON-результата (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory() as workdir:
+        # Бот пишет user_data.* в текущий каталог - держим их во временной папке
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            # Диагностика бота печатается в stdout - уводим ее в stderr, чтобы не портить JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                result = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+from crypto_api import crypto_api
+from config import BINANCE_WS_URL, BINANCE_WS_STALE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class BinanceTickerFeed:
+    """Live-таблица USDT-пар Binance с индексом по объему, который обновляется инкрементально"""
+
+    def __init__(self, ws_url: str = BINANCE_WS_URL, rest_url: Optional[str] = None,
+                 quote: str = 'USDT', stale_seconds: float = BINANCE_WS_STALE_SECONDS):
+        self.ws_url = ws_url
+        self.rest_url = rest_url or f"{crypto_api.binance_base_url}/ticker/24hr"
+        self.quote = quote
+        self.stale_seconds = stale_seconds
+        self.pairs: Dict[str, Dict] = {}  # {symbol: данные пары}
+        self._index: List[Tuple[float, str]] = []  # отсортирован по (-объем, символ)
+        self.ready = False
+        self.version = 0
+        self.reconnects = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Запускает подписку на поток"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает подписку"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.ready = False
+
+    def top(self, limit: int = 10) -> List[Dict]:
+        """Топ пар по объему в квотируемой валюте - без запросов к API"""
+        return [self.pairs[symbol] for _, symbol in self._index[:limit]]
+
+    def _upsert(self, symbol: str, pair: Dict):
+        """Обновляет пару и ее позицию в индексе"""
+        old = self.pairs.get(symbol)
+        if old is not None:
+            position = bisect_left(self._index, (-old['volume_24h'], symbol))
+            if position < len(self._index) and self._index[position][1] == symbol:
+                del self._index[position]
+        self.pairs[symbol] = pair
+        insort(self._index, (-pair['volume_24h'], symbol))
+
+    def apply_snapshot(self, tickers: List[Dict]):
+        """Полная пересинхронизация из REST /ticker/24hr"""
+        self.pairs = {}
+        self._index = []
+        for ticker in tickers:
+            symbol = ticker['symbol']
+            if not symbol.endswith(self.quote):
+                continue
+            self._upsert(symbol, {
+                'symbol': symbol,
+                'price': float(ticker['lastPrice']),
+                'price_change_24h': float(ticker['priceChangePercent']),
+                'volume_24h': float(ticker['quoteVolume']),
+                'high_24h': float(ticker['highPrice']),
+                'low_24h': float(ticker['lowPrice'])
+            })
+        self.version += 1
+
+    def apply_updates(self, tickers: List[Dict]):
+        """Применяет пакет событий miniTicker (только изменившиеся пары)"""
+        for ticker in tickers:
+            symbol = ticker['s']
+            if not symbol.endswith(self.quote):
+                continue
+            close_price = float(ticker['c'])
+            open_price = float(ticker['o'])
+            self._upsert(symbol, {
+                'symbol': symbol,
+                'price': close_price,
+                'price_change_24h': (close_price - open_price) / open_price * 100 if open_price else 0.0,
+                'volume_24h': float(ticker['q']),
+                'high_24h': float(ticker['h']),
+                'low_24h': float(ticker['l'])
+            })
+        self.version += 1
+
+    async def _run(self):
+        backoff = 1
+        while True:
+            try:
+                await self._resync()
+                await self._listen()
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Binance ticker stream error: {e}")
+            # Пока нет потока, запросы обслуживает REST
+            self.ready = False
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    async def _resync(self):
+        """Загружает полный снимок, чтобы не зависеть от пропущенных событий"""
+        tickers = await crypto_api._make_request(self.rest_url)
+        if not tickers:
+            raise ConnectionError("REST snapshot unavailable")
+        self.apply_snapshot(tickers)
+
+    async def _listen(self):
+        session = await crypto_api.get_session()
+        async with session.ws_connect(self.ws_url, heartbeat=self.stale_seconds / 2) as ws:
+            self.ready = True
+            logger.info(f"Binance ticker stream connected: {len(self.pairs)} pairs")
+            while True:
+                message = await ws.receive(timeout=self.stale_seconds)
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self.apply_updates(json.loads(message.data))
+                elif message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED,
+                                      aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.ERROR):
+                    return
@@ -0,0 +1,84 @@
+import random
+import time
+from typing import Dict, Optional
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX
+)
+
+def backoff_delay(attempt: int, base: float = UPSTREAM_BACKOFF_BASE, cap: float = UPSTREAM_BACKOFF_MAX) -> float:
+    """Экспоненциальная задержка перед повтором с полным случайным разбросом (full jitter)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Секунды из заголовка Retry-After (формат с датой не используется нашими источниками)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+class CircuitBreaker:
+    """Автомат отключения внешнего API: после серии ошибок запросы не отправляются, пока источник не оживет"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probe_in_flight = False
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас; после паузы пропускается один пробный запрос"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() >= self.opened_until:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.stats['rejected'] += 1
+        return False
+
+    def release_probe(self):
+        """Пробный запрос не был отправлен или его результат потерян - пробу может взять другой запрос"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        """Источник ответил - цепь замыкается"""
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        """Ошибка источника; Retry-After сразу размыкает цепь на указанное время"""
+        self.failures += 1
+        if retry_after:
+            pause = retry_after
+        elif self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            pause = self.reset_seconds
+        else:
+            return
+        if self.state != self.OPEN:
+            self.stats['opened'] += 1
+        self.state = self.OPEN
+        self.opened_until = max(self.opened_until, time.monotonic() + pause)
+        self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        """Через сколько секунд будет разрешен пробный запрос"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_until - time.monotonic())
+
+    def get_stats(self) -> Dict:
+        """Возвращает состояние автомата"""
+        return dict(self.stats, state=self.state, failures=self.failures, retry_in=self.retry_in())
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import os
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from crypto_api import crypto_api
+from quota import PRIORITY_PREFETCH, upstream_priority
+from metrics import registry
+from config import (
+    COIN_CATALOG_PATH, COIN_CATALOG_REFRESH_SECONDS, COIN_NAMES, COIN_ID_ALIASES, POPULAR_COINS
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CVCC'
+FORMAT_VERSION = 1
+# Заголовок снимка: сигнатура, версия, число монет, время загрузки списка
+HEADER = struct.Struct('<4sIId')
+# Повтор после неудачного обновления (секунды)
+RETRY_SECONDS = 900
+# Место монеты без известного ранга - после всех ранжированных
+NO_RANK = 1 << 30
+
+CATALOG_COINS = registry.gauge('cryptobot_coin_catalog_coins', 'Coins in the local CoinGecko catalog')
+CATALOG_AGE = registry.gauge('cryptobot_coin_catalog_age_seconds', 'Age of the coin catalog snapshot')
+
+def parse_label(label: str) -> Tuple[str, str]:
+    """Название и тикер из подписи вида "Bitcoin (BTC)" """
+    name, _, symbol = label.rpartition(' (')
+    return (name, symbol.rstrip(')')) if name else (label, '')
+
+class CoinCatalog:
+    """Каталог монет CoinGecko: id -> (тикер, название) и тикер -> id в словарях, снимок списка в файле"""
+
+    def __init__(self, path: str = COIN_CATALOG_PATH, refresh_interval: float = COIN_CATALOG_REFRESH_SECONDS):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.fetched_at = 0.0
+        self._coins: Dict[str, Tuple[str, str]] = {}  # {coin_id: (тикер, название)}
+        self._by_symbol: Dict[str, str] = {}  # {тикер в нижнем регистре: coin_id}
+        self._ranks: Dict[str, int] = {}  # места по капитализации из ответов API
+        # Подписчики на обновления каталога: listener({coin_id: (название, тикер, место)})
+        self._listeners: List[Callable[[Dict[str, Tuple[str, str, Optional[int]]]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'refreshes': 0, 'errors': 0, 'load_ms': 0.0}
+        self._replace({})
+        self.load()
+        crypto_api.add_coin_listener(self.on_coins)
+
+    def _replace(self, coins: Dict[str, Tuple[str, str]], ordered: bool = False):
+        """Заменяет каталог; монеты из COIN_NAMES есть в нем всегда"""
+        for coin_id, label in COIN_NAMES.items():
+            name, symbol = parse_label(label)
+            coins.setdefault(coin_id, (symbol.lower(), name))
+        # Каталог (и снимок на диске) хранится в порядке предпочтения: тикер достается первой монете с ним,
+        # а загрузка снимка (ordered=True) порядок не пересчитывает
+        if not ordered:
+            order = sorted(coins, key=lambda coin_id: self._preference(coin_id, coins[coin_id][1]))
+            coins = {coin_id: coins[coin_id] for coin_id in order}
+        self._coins = coins
+        self._by_symbol = {}
+        for coin_id, (symbol, _) in coins.items():
+            self._by_symbol.setdefault(symbol, coin_id)
+
+    def _preference(self, coin_id: str, name: str) -> Tuple:
+        """Порядок выбора среди монет с одним тикером: популярные, по капитализации, с id из названия, короткие"""
+        return (coin_id not in POPULAR_COINS, self._ranks.get(coin_id, NO_RANK),
+                coin_id != name.lower().replace(' ', '-'), len(coin_id), coin_id)
+
+    def _index_symbol(self, coin_id: str, symbol: str):
+        current = self._by_symbol.get(symbol)
+        if current is None:
+            self._by_symbol[symbol] = coin_id
+        elif self._preference(coin_id, self._coins[coin_id][1]) < self._preference(current, self._coins[current][1]):
+            self._by_symbol[symbol] = coin_id
+
+    def load(self) -> bool:
+        """Загружает снимок каталога с диска (миллисекунды даже для полного списка CoinGecko)"""
+        started = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        if len(data) < HEADER.size:
+            return False
+        magic, version, count, fetched_at = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            logger.warning(f"Coin catalog {self.path} has another format, waiting for a refresh")
+            return False
+        coins = {}
+        try:
+            # Строки "id\tтикер\tназвание"
+            for line in data[HEADER.size:].decode().split('\n'):
+                coin_id, symbol, name = line.split('\t', 2)
+                coins[coin_id] = (symbol, name)
+        except ValueError:
+            coins = {}
+        if len(coins) != count:
+            logger.warning(f"Coin catalog {self.path} is truncated, waiting for a refresh")
+            return False
+        self._replace(coins, ordered=True)
+        self.fetched_at = fetched_at
+        self.stats['load_ms'] = (time.perf_counter() - started) * 1000
+        return True
+
+    def snapshot(self) -> bytes:
+        """Снимок каталога в формате файла (собирается в цикле событий, пока on_coins не меняет словарь)"""
+        body = '\n'.join(f"{coin_id}\t{symbol}\t{name}" for coin_id, (symbol, name) in self._coins.items())
+        return HEADER.pack(MAGIC, FORMAT_VERSION, len(self._coins), self.fetched_at) + body.encode()
+
+    def save(self, data: Optional[bytes] = None):
+        """Атомарно записывает снимок каталога (временный файл и os.replace)"""
+        if data is None:
+            data = self.snapshot()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    async def refresh(self) -> bool:
+        """Загружает /coins/list, заменяет каталог и снимок на диске"""
+        with upstream_priority(PRIORITY_PREFETCH):
+            data = await crypto_api.get_coins_list()
+        if not data:
+            self.stats['errors'] += 1
+            return False
+        coins = {}
+        for coin in data:
+            coin_id, symbol, name = coin.get('id'), coin.get('symbol') or '', coin.get('name') or ''
+            # Разделители формата снимка в данных не встречаются, но проверяем
+            if coin_id and not any(c in value for value in (coin_id, symbol, name) for c in '\t\n'):
+                coins[coin_id] = (symbol.lower(), name)
+        self._replace(coins)
+        self.fetched_at = time.time()
+        self.stats['refreshes'] += 1
+        try:
+            # В поток уходят только готовые байты: словарь каталога меняется в цикле событий (on_coins)
+            await asyncio.to_thread(self.save, self.snapshot())
+        except OSError as e:
+            logger.error(f"Error saving coin catalog: {e}")
+        self._publish()
+        return True
+
+    def _listing(self) -> Dict[str, Tuple[str, str, Optional[int]]]:
+        """Весь каталог в формате подписчиков {coin_id: (название, тикер, место)}"""
+        return {coin_id: (name, symbol.upper(), self._ranks.get(coin_id))
+                for coin_id, (symbol, name) in self._coins.items()}
+
+    def _publish(self):
+        """Передает подписчикам весь каталог"""
+        coins = self._listing()
+        for listener in self._listeners:
+            try:
+                listener(coins)
+            except Exception as e:
+                logger.error(f"Coin catalog listener error: {e}")
+
+    def add_listener(self, listener: Callable[[Dict[str, Tuple[str, str, Optional[int]]]], None]):
+        """Подписывает обработчик на каталог: сразу получает текущие монеты, затем каждое обновление"""
+        self._listeners.append(listener)
+        listener(self._listing())
+
+    def on_coins(self, coins: Dict[str, Tuple[str, str, Optional[int]]]):
+        """Уточняет названия и места монет по ответам API"""
+        for coin_id, (name, symbol, rank) in coins.items():
+            if rank:
+                self._ranks[coin_id] = rank
+            self._coins[coin_id] = (symbol.lower(), name)
+            self._index_symbol(coin_id, symbol.lower())
+
+    def resolve(self, query: str) -> Optional[str]:
+        """id монеты по id, прежнему id или тикеру (без запросов к API)"""
+        query = query.strip().lower()
+        query = COIN_ID_ALIASES.get(query, query)
+        if query in self._coins:
+            return query
+        return self._by_symbol.get(query)
+
+    def name(self, coin_id: str) -> Optional[str]:
+        """Название монеты"""
+        coin = self._coins.get(coin_id)
+        return coin[1] if coin is not None else None
+
+    def symbol(self, coin_id: str) -> Optional[str]:
+        """Тикер монеты в верхнем регистре"""
+        coin = self._coins.get(coin_id)
+        return coin[0].upper() if coin is not None else None
+
+    def label(self, coin_id: str) -> str:
+        """Подпись монеты вида "Bitcoin (BTC)" """
+        label = COIN_NAMES.get(coin_id)
+        if label is not None:
+            return label
+        coin = self._coins.get(coin_id)
+        if coin is None:
+            return coin_id.capitalize()
+        symbol, name = coin
+        return f"{name} ({symbol.upper()})" if symbol else name
+
+    async def _run(self):
+        while True:
+            delay = self.fetched_at + self.refresh_interval - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                refreshed = await self.refresh()
+            except Exception as e:
+                logger.error(f"Coin catalog refresh failed: {e}")
+                refreshed = False
+            if not refreshed:
+                await asyncio.sleep(RETRY_SECONDS)
+
+    async def start(self):
+        """Запускает фоновое обновление (сразу, если снимка нет или он устарел)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает фоновое обновление"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        """Возвращает размер каталога и возраст снимка"""
+        age = time.time() - self.fetched_at if self.fetched_at else None
+        return dict(self.stats, coins=len(self._coins), symbols=len(self._by_symbol), age=age)
+
+# Создаем глобальный каталог монет
+coin_catalog = CoinCatalog()
+
+CATALOG_COINS.set_function(lambda: len(coin_catalog._coins))
+CATALOG_AGE.set_function(lambda: time.time() - coin_catalog.fetched_at if coin_catalog.fetched_at else 0)
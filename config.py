@@ -1,4 +1,5 @@
 import os
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,11 +8,169 @@ load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
+# Режим получения обновлений: 'polling' или 'webhook'
+RUN_MODE = os.getenv('RUN_MODE', 'polling').lower()
+
+# Webhook: публичный адрес бота, встроенный HTTP-сервер и секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8080')))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
 # API Keys
 COINGECKO_API_KEY = os.getenv('COINGECKO_API_KEY', '')
 BINANCE_API_KEY = os.getenv('BINANCE_API_KEY', '')
 BINANCE_SECRET_KEY = os.getenv('BINANCE_SECRET_KEY', '')
 
+# Адреса внешних API (переопределяются, например, для нагрузочного теста с локальными заглушками)
+COINGECKO_BASE_URL = os.getenv('COINGECKO_BASE_URL', 'https://api.coingecko.com/api/v3')
+BINANCE_BASE_URL = os.getenv('BINANCE_BASE_URL', 'https://api.binance.com/api/v3')
+FEAR_GREED_URL = os.getenv('FEAR_GREED_URL', 'https://api.alternative.me/fng/')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+
+# HTTP client pool (общая сессия aiohttp для всех запросов к API)
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', '100'))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '20'))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '60'))
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+
+# Повторы запросов к API: число повторов, экспоненциальная задержка (секунды) и общий лимит времени на запрос
+UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', '2'))
+UPSTREAM_BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', '0.5'))
+UPSTREAM_BACKOFF_MAX = float(os.getenv('UPSTREAM_BACKOFF_MAX', '5'))
+UPSTREAM_RETRY_BUDGET = float(os.getenv('UPSTREAM_RETRY_BUDGET', '6'))
+# Автомат отключения: после стольких ошибок подряд источник не опрашивается CIRCUIT_RESET_SECONDS секунд
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', '30'))
+
+# Бюджет запросов к API (запросов в минуту на хост), переопределяется через UPSTREAM_QUOTA_<SOURCE>; 0 - без ограничения
+UPSTREAM_QUOTA = {
+    urlsplit(url).netloc: int(os.getenv(f'UPSTREAM_QUOTA_{source.upper()}', default))
+    for source, (url, default) in {
+        'coingecko': (COINGECKO_BASE_URL, 30),
+        'binance': (BINANCE_BASE_URL, 1200),
+        'fear_greed': (FEAR_GREED_URL, 60)
+    }.items()
+}
+# Доля минутного бюджета, которую можно израсходовать разом (остальное пополняется равномерно)
+UPSTREAM_QUOTA_BURST = float(os.getenv('UPSTREAM_QUOTA_BURST', '0.25'))
+# Доля запаса, которую классы ниже по приоритету оставляют более важным запросам
+UPSTREAM_QUOTA_RESERVES = {
+    'notification': float(os.getenv('UPSTREAM_QUOTA_RESERVE_NOTIFICATION', '0.2')),
+    'prefetch': float(os.getenv('UPSTREAM_QUOTA_RESERVE_PREFETCH', '0.5'))
+}
+# Сколько секунд запрос класса может ждать бюджет, прежде чем получить отказ (и ответ из кэша)
+UPSTREAM_QUOTA_MAX_WAIT = {
+    'interactive': float(os.getenv('UPSTREAM_QUOTA_WAIT_INTERACTIVE', '2')),
+    'notification': float(os.getenv('UPSTREAM_QUOTA_WAIT_NOTIFICATION', '30')),
+    'prefetch': float(os.getenv('UPSTREAM_QUOTA_WAIT_PREFETCH', '0'))
+}
+# Доля бюджета, отдаваемая процессам-воркерам уведомлений (делится между ними поровну)
+UPSTREAM_QUOTA_WORKER_SHARE = float(os.getenv('UPSTREAM_QUOTA_WORKER_SHARE', '0.3'))
+
+# Response cache: TTL (секунды) для каждого эндпоинта, переопределяется через CACHE_TTL_<ENDPOINT>
+CACHE_TTL = {
+    endpoint: int(os.getenv(f'CACHE_TTL_{endpoint.upper()}', default))
+    for endpoint, default in {
+        'global_metrics': 60,
+        'top_coins': 30,
+        'binance_pairs': 15,
+        'fear_greed': 600,
+        'trending': 300,
+        'defi_metrics': 120,
+        'coin_info': 60
+    }.items()
+}
+# Сколько секунд после истечения TTL можно отдавать устаревшее значение, пока идет фоновое обновление
+CACHE_STALE_SECONDS = int(os.getenv('CACHE_STALE_SECONDS', '120'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+
+# Live-таблица пар Binance из WebSocket-потока !miniTicker@arr (по умолчанию выключена)
+BINANCE_WS_ENABLED = os.getenv('BINANCE_WS_ENABLED', 'False').lower() == 'true'
+BINANCE_WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443/ws/!miniTicker@arr')
+# Если поток молчит дольше этого времени (секунды), соединение пересоздается
+BINANCE_WS_STALE_SECONDS = float(os.getenv('BINANCE_WS_STALE_SECONDS', '30'))
+
+# Фоновое обновление данных главного меню
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'True').lower() == 'true'
+# Экран считается "горячим" от этой частоты запросов (в секунду) и обновляется раньше истечения TTL
+PREFETCH_HOT_RATE = float(os.getenv('PREFETCH_HOT_RATE', '0.05'))
+# Максимальный период обновления редко открываемых экранов (секунды)
+PREFETCH_MAX_INTERVAL = float(os.getenv('PREFETCH_MAX_INTERVAL', '900'))
+
+# Экраны с данными: сколько секунд ждать данные, прежде чем показать "Загрузка..." отдельной правкой
+LOADING_EDIT_DEADLINE = float(os.getenv('LOADING_EDIT_DEADLINE', '0.7'))
+
+# Уведомления: длительность такта колеса таймеров (секунды)
+SCHEDULER_TICK_SECONDS = int(os.getenv('SCHEDULER_TICK_SECONDS', '1'))
+# Уведомления: как часто (секунды) собирать накопившиеся задачи в один пакет
+NOTIFICATION_BATCH_SECONDS = int(os.getenv('NOTIFICATION_BATCH_SECONDS', '5'))
+# Уведомления: разносить подписки по фазе интервала (хэш user_id), чтобы они не срабатывали в одну секунду
+SCHEDULER_PHASE_SPREAD = os.getenv('SCHEDULER_PHASE_SPREAD', 'True').lower() == 'true'
+# Уведомления: сдвиг фазы подписки по хэшу (user_id, монета) - до N секунд, 0 - без сдвига
+SCHEDULER_JITTER_SECONDS = int(os.getenv('SCHEDULER_JITTER_SECONDS', '0'))
+
+# Исходящая очередь Telegram: глобальный лимит (сообщений/с), лимит на чат и пул воркеров
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_CHAT_BURST = float(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+TELEGRAM_SEND_WORKERS = int(os.getenv('TELEGRAM_SEND_WORKERS', '8'))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))
+
+# Хранилище пользователей (SQLite) и период фоновой записи изменений (секунды)
+USER_DB_PATH = os.getenv('USER_DB_PATH', 'user_data.db')
+USER_DB_FLUSH_SECONDS = float(os.getenv('USER_DB_FLUSH_SECONDS', '1'))
+
+# История цен монет (файл, отображенный в память) для расчета изменений без запросов к API
+PRICE_HISTORY_ENABLED = os.getenv('PRICE_HISTORY_ENABLED', 'True').lower() == 'true'
+PRICE_HISTORY_PATH = os.getenv('PRICE_HISTORY_PATH', 'price_history.bin')
+PRICE_HISTORY_MAX_COINS = int(os.getenv('PRICE_HISTORY_MAX_COINS', '512'))
+# Уровни истории: шаг (секунды) и число точек в кольцевом буфере, переопределяется через PRICE_HISTORY_POINTS_<TIER>
+PRICE_HISTORY_TIERS = {
+    tier: (step, int(os.getenv(f'PRICE_HISTORY_POINTS_{tier.upper()}', points)))
+    for tier, (step, points) in {
+        '1m': (60, 1440),
+        '1h': (3600, 720),
+        '1d': (86400, 730)
+    }.items()
+}
+
+# Ценовые алерты: период проверки цен (секунды), лимит на пользователя и предлагаемые уровни (% от цены)
+ALERT_CHECK_SECONDS = float(os.getenv('ALERT_CHECK_SECONDS', '60'))
+ALERTS_PER_USER = int(os.getenv('ALERTS_PER_USER', '20'))
+ALERT_OFFSETS = (1, 2, 5, 10)
+# Повторяющийся алерт взводится снова, когда цена отойдет от уровня на эту долю
+ALERT_REARM_GAP = float(os.getenv('ALERT_REARM_GAP', '0.01'))
+
+# Алерты на резкое движение цены: окна (секунды), пороги изменения (%) и лимит на пользователя
+MOVE_WINDOWS = {'15m': 900, '1h': 3600, '6h': 21600, '24h': 86400}
+MOVE_THRESHOLDS = (2, 5, 10, 20)
+MOVE_ALERTS_PER_USER = int(os.getenv('MOVE_ALERTS_PER_USER', '10'))
+
+# Inline-режим (@bot eth): сколько секунд Telegram кэширует ответ на запрос и сколько монет в ответе (не больше 50)
+INLINE_CACHE_SECONDS = int(os.getenv('INLINE_CACHE_SECONDS', '30'))
+INLINE_RESULTS_LIMIT = int(os.getenv('INLINE_RESULTS_LIMIT', '10'))
+
+# Каталог монет CoinGecko (/coins/list): файл снимка и период фонового обновления (секунды)
+COIN_CATALOG_PATH = os.getenv('COIN_CATALOG_PATH', 'coin_catalog.bin')
+COIN_CATALOG_REFRESH_SECONDS = float(os.getenv('COIN_CATALOG_REFRESH_SECONDS', '86400'))
+
+# Шардирование уведомлений: 0 - уведомления рассылает сам бот, N - отдельные процессы worker.py
+NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', '0'))
+NOTIFICATION_SHARDS = int(os.getenv('NOTIFICATION_SHARDS', '64'))
+SHARD_LEASE_SECONDS = float(os.getenv('SHARD_LEASE_SECONDS', '30'))
+# Как часто воркеры подтягивают изменения подписок из общего хранилища (секунды)
+WORKER_SYNC_SECONDS = float(os.getenv('WORKER_SYNC_SECONDS', '10'))
+# Сколько хранится журнал измененных пользователей, по которому воркеры подтягивают изменения (секунды)
+USER_CHANGE_LOG_SECONDS = float(os.getenv('USER_CHANGE_LOG_SECONDS', '86400'))
+
+# Метрики в формате Prometheus (локальный HTTP-эндпоинт /metrics; порт 0 - выключено)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
 # Telegram Channel
 TELEGRAM_CHANNEL = "https://t.me/cryptovektorpro"
 
@@ -25,10 +184,35 @@ LANGUAGES = {
 # Popular cryptocurrencies for notifications
 POPULAR_COINS = [
     'bitcoin', 'ethereum', 'binancecoin', 'cardano', 'solana',
-    'xrp', 'polkadot', 'dogecoin', 'avalanche-2', 'polygon',
+    'ripple', 'polkadot', 'dogecoin', 'avalanche-2', 'matic-network',
     'shiba-inu', 'chainlink', 'litecoin', 'uniswap', 'cosmos'
 ]
 
+# Прежние id монет, которых нет на CoinGecko: сохраненные подписки и алерты переносятся на верные id
+COIN_ID_ALIASES = {
+    'xrp': 'ripple',
+    'polygon': 'matic-network'
+}
+
+# Названия монет на кнопках
+COIN_NAMES = {
+    'bitcoin': 'Bitcoin (BTC)',
+    'ethereum': 'Ethereum (ETH)',
+    'binancecoin': 'Binance Coin (BNB)',
+    'cardano': 'Cardano (ADA)',
+    'solana': 'Solana (SOL)',
+    'ripple': 'XRP (XRP)',
+    'polkadot': 'Polkadot (DOT)',
+    'dogecoin': 'Dogecoin (DOGE)',
+    'avalanche-2': 'Avalanche (AVAX)',
+    'matic-network': 'Polygon (MATIC)',
+    'shiba-inu': 'Shiba Inu (SHIB)',
+    'chainlink': 'Chainlink (LINK)',
+    'litecoin': 'Litecoin (LTC)',
+    'uniswap': 'Uniswap (UNI)',
+    'cosmos': 'Cosmos (ATOM)'
+}
+
 # Time intervals for notifications
 TIME_INTERVALS = {
     '15m': 15,
@@ -40,6 +224,37 @@ TIME_INTERVALS = {
     '24h': 1440
 }
 
+# Названия интервалов по языкам
+INTERVAL_NAMES = {
+    'ru': {
+        '15m': '15 минут',
+        '30m': '30 минут',
+        '1h': '1 час',
+        '3h': '3 часа',
+        '6h': '6 часов',
+        '12h': '12 часов',
+        '24h': '24 часа'
+    },
+    'en': {
+        '15m': '15 minutes',
+        '30m': '30 minutes',
+        '1h': '1 hour',
+        '3h': '3 hours',
+        '6h': '6 hours',
+        '12h': '12 hours',
+        '24h': '24 hours'
+    },
+    'de': {
+        '15m': '15 Minuten',
+        '30m': '30 Minuten',
+        '1h': '1 Stunde',
+        '3h': '3 Stunden',
+        '6h': '6 Stunden',
+        '12h': '12 Stunden',
+        '24h': '24 Stunden'
+    }
+}
+
 # Multilingual text
 TEXTS = {
     'ru': {
@@ -56,6 +271,8 @@ TEXTS = {
 • Тренды рынка
 • DeFi метрики
 • Настройка уведомлений
+• Ценовые алерты
+• Резкие движения цены
 
 📢 <b>Наш канал:</b> {TELEGRAM_CHANNEL}
 
@@ -79,7 +296,30 @@ TEXTS = {
         'notification_set': 'Уведомления настроены для {coin} каждые {interval}',
         'loading': 'Загрузка данных...',
         'error': 'Произошла ошибка при получении данных',
-        'no_data': 'Данные недоступны'
+        'no_data': 'Данные недоступны',
+        'stale_data': '⚠️ <i>Источник данных недоступен, показаны данные {minutes} мин. назад</i>',
+        'price_alerts': '🎯 Ценовые алерты',
+        'alerts_menu': '🎯 <b>Ценовые алерты</b>\n\nВыберите монету, чтобы создать алерт:',
+        'alerts_list': '🎯 <b>Ваши алерты:</b>',
+        'choose_alert_level': '<b>{coin}</b>: текущая цена ${price}\n\nУведомить, когда цена достигнет:',
+        'alert_set': '✅ Алерт создан: <b>{coin}</b> {direction} ${level}',
+        'alert_above': 'выше',
+        'alert_below': 'ниже',
+        'alert_repeat_on': '🔁 Повторять: вкл',
+        'alert_repeat_off': '🔁 Повторять: выкл',
+        'alert_delete': '🗑 Удалить',
+        'alert_deleted': 'Алерт удален',
+        'alert_limit': 'Достигнут лимит алертов ({limit}). Удалите ненужные в меню алертов.',
+        'alert_triggered': '🎯 <b>{coin}</b>: цена {direction} ${level}\n💰 Сейчас: ${price}',
+        'alert_usage': 'Использование: /alert <монета> <цена> [repeat]\nНапример: /alert bitcoin 70000',
+        'move_alerts': '⚡ Резкие движения',
+        'moves_menu': '⚡ <b>Резкие движения цены</b>\n\nУведомление, когда цена монеты изменится больше чем на заданный процент за выбранное время. Выберите монету:',
+        'moves_list': '⚡ <b>Ваши подписки:</b>',
+        'choose_move': '<b>{coin}</b>: уведомить, когда цена изменится больше чем на:',
+        'move_set': '✅ Подписка создана: <b>{coin}</b> ±{threshold}% за {window}',
+        'move_deleted': 'Подписка удалена',
+        'move_limit': 'Достигнут лимит подписок ({limit}). Удалите ненужные в меню.',
+        'move_triggered': '⚡ <b>{coin}</b>: {change}% за {window}\n💰 Сейчас: ${price}'
     },
     'en': {
         'welcome': f"""
@@ -95,6 +335,8 @@ This bot will help you track the cryptocurrency market in real time.
 • Market trends
 • DeFi metrics
 • Notification setup
+• Price alerts
+• Sharp price moves
 
 📢 <b>Our channel:</b> {TELEGRAM_CHANNEL}
 
@@ -118,7 +360,30 @@ Choose an action from the menu below 👇
         'notification_set': 'Notifications set for {coin} every {interval}',
         'loading': 'Loading data...',
         'error': 'Error occurred while fetching data',
-        'no_data': 'Data unavailable'
+        'no_data': 'Data unavailable',
+        'stale_data': '⚠️ <i>Data source unavailable, showing data from {minutes} min ago</i>',
+        'price_alerts': '🎯 Price alerts',
+        'alerts_menu': '🎯 <b>Price alerts</b>\n\nChoose a coin to create an alert:',
+        'alerts_list': '🎯 <b>Your alerts:</b>',
+        'choose_alert_level': '<b>{coin}</b>: current price ${price}\n\nNotify me when the price reaches:',
+        'alert_set': '✅ Alert created: <b>{coin}</b> {direction} ${level}',
+        'alert_above': 'above',
+        'alert_below': 'below',
+        'alert_repeat_on': '🔁 Repeat: on',
+        'alert_repeat_off': '🔁 Repeat: off',
+        'alert_delete': '🗑 Delete',
+        'alert_deleted': 'Alert deleted',
+        'alert_limit': 'Alert limit reached ({limit}). Delete some in the alerts menu.',
+        'alert_triggered': '🎯 <b>{coin}</b>: price {direction} ${level}\n💰 Now: ${price}',
+        'alert_usage': 'Usage: /alert <coin> <price> [repeat]\nExample: /alert bitcoin 70000',
+        'move_alerts': '⚡ Sharp moves',
+        'moves_menu': '⚡ <b>Sharp price moves</b>\n\nGet notified when a coin moves more than the chosen percentage within the chosen time. Choose a coin:',
+        'moves_list': '⚡ <b>Your subscriptions:</b>',
+        'choose_move': '<b>{coin}</b>: notify me when the price moves more than:',
+        'move_set': '✅ Subscription created: <b>{coin}</b> ±{threshold}% within {window}',
+        'move_deleted': 'Subscription deleted',
+        'move_limit': 'Subscription limit reached ({limit}). Delete some in the menu.',
+        'move_triggered': '⚡ <b>{coin}</b>: {change}% within {window}\n💰 Now: ${price}'
     },
     'de': {
         'welcome': f"""
@@ -134,6 +399,8 @@ Dieser Bot hilft Ihnen, den Kryptowährungsmarkt in Echtzeit zu verfolgen.
 • Markttrends
 • DeFi-Metriken
 • Benachrichtigungseinstellungen
+• Preisalarme
+• Starke Kursbewegungen
 
 📢 <b>Unser Kanal:</b> {TELEGRAM_CHANNEL}
 
@@ -157,6 +424,29 @@ Wählen Sie eine Aktion aus dem Menü unten 👇
         'notification_set': 'Benachrichtigungen für {coin} alle {interval} eingestellt',
         'loading': 'Daten werden geladen...',
         'error': 'Fehler beim Abrufen der Daten',
-        'no_data': 'Daten nicht verfügbar'
+        'no_data': 'Daten nicht verfügbar',
+        'stale_data': '⚠️ <i>Datenquelle nicht erreichbar, Daten von vor {minutes} Min.</i>',
+        'price_alerts': '🎯 Preisalarme',
+        'alerts_menu': '🎯 <b>Preisalarme</b>\n\nWählen Sie eine Münze für einen neuen Alarm:',
+        'alerts_list': '🎯 <b>Ihre Alarme:</b>',
+        'choose_alert_level': '<b>{coin}</b>: aktueller Preis ${price}\n\nBenachrichtigen, wenn der Preis erreicht:',
+        'alert_set': '✅ Alarm erstellt: <b>{coin}</b> {direction} ${level}',
+        'alert_above': 'über',
+        'alert_below': 'unter',
+        'alert_repeat_on': '🔁 Wiederholen: an',
+        'alert_repeat_off': '🔁 Wiederholen: aus',
+        'alert_delete': '🗑 Löschen',
+        'alert_deleted': 'Alarm gelöscht',
+        'alert_limit': 'Alarmlimit erreicht ({limit}). Löschen Sie alte Alarme im Alarmmenü.',
+        'alert_triggered': '🎯 <b>{coin}</b>: Preis {direction} ${level}\n💰 Jetzt: ${price}',
+        'alert_usage': 'Verwendung: /alert <Münze> <Preis> [repeat]\nBeispiel: /alert bitcoin 70000',
+        'move_alerts': '⚡ Starke Bewegungen',
+        'moves_menu': '⚡ <b>Starke Kursbewegungen</b>\n\nBenachrichtigung, wenn sich der Preis einer Münze in der gewählten Zeit um mehr als den gewählten Prozentsatz ändert. Wählen Sie eine Münze:',
+        'moves_list': '⚡ <b>Ihre Abonnements:</b>',
+        'choose_move': '<b>{coin}</b>: benachrichtigen, wenn sich der Preis ändert um mehr als:',
+        'move_set': '✅ Abonnement erstellt: <b>{coin}</b> ±{threshold}% in {window}',
+        'move_deleted': 'Abonnement gelöscht',
+        'move_limit': 'Abonnementlimit erreicht ({limit}). Löschen Sie alte im Menü.',
+        'move_triggered': '⚡ <b>{coin}</b>: {change}% in {window}\n💰 Jetzt: ${price}'
     }
 }
\ No newline at end of file
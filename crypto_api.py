@@ -1,30 +1,431 @@
 import aiohttp
 import asyncio
 import json
-from typing import Dict, List, Optional
-from config import COINGECKO_API_KEY, BINANCE_API_KEY, BINANCE_SECRET_KEY
+import time
+import yarl
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from config import (
+    COINGECKO_API_KEY, BINANCE_API_KEY, BINANCE_SECRET_KEY,
+    COINGECKO_BASE_URL, BINANCE_BASE_URL, FEAR_GREED_URL,
+    HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_DNS_CACHE_TTL, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    CACHE_TTL, CACHE_STALE_SECONDS, CACHE_MAX_ENTRIES, UPSTREAM_MAX_RETRIES, UPSTREAM_RETRY_BUDGET,
+    UPSTREAM_QUOTA
+)
+from circuit import CircuitBreaker, backoff_delay, parse_retry_after
+from quota import (
+    QuotaBudget, QUOTA_REMAINING, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, current_priority, upstream_priority
+)
+from metrics import registry
+
+UPSTREAM_LATENCY = registry.histogram(
+    'cryptobot_upstream_request_seconds', 'Upstream API request latency', ['endpoint'])
+UPSTREAM_RESPONSES = registry.counter(
+    'cryptobot_upstream_responses_total', 'Upstream API responses by HTTP status (or "error")',
+    ['endpoint', 'status'])
+CIRCUIT_STATE = registry.gauge(
+    'cryptobot_circuit_open', 'Whether the circuit breaker of an upstream host is open (1) or closed (0)', ['host'])
+
+# Окно изменения цены, которое показывают уведомления
+WEEK_SECONDS = 7 * 24 * 3600
+
+class CacheEntry:
+    """Запись кэша: значение, время загрузки и версия снимка"""
+    __slots__ = ('value', 'fetched_at', 'expires_at', 'version')
+    
+    def __init__(self, value: Any, fetched_at: float, expires_at: float, version: int):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+        self.version = version
+
+class ResponseCache:
+    """Ограниченный по размеру LRU-кэш ответов API с TTL"""
+    
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._version = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """Возвращает запись (в том числе просроченную) и отмечает ее как недавно использованную"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+    
+    def set(self, key: Hashable, value: Any, ttl: float) -> CacheEntry:
+        """Сохраняет значение и вытесняет самые старые записи при переполнении"""
+        now = time.monotonic()
+        self._version += 1
+        entry = CacheEntry(value, now, now + ttl, self._version)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+    
+    def invalidate(self, key: Hashable):
+        """Удаляет запись из кэша"""
+        self._entries.pop(key, None)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
 
 class CryptoAPI:
     def __init__(self):
-        self.coingecko_base_url = "https://api.coingecko.com/api/v3"
-        self.binance_base_url = "https://api.binance.com/api/v3"
-        self.fear_greed_url = "https://api.alternative.me/fng/"
+        self.coingecko_base_url = COINGECKO_BASE_URL
+        self.binance_base_url = BINANCE_BASE_URL
+        self.fear_greed_url = FEAR_GREED_URL
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.ticker_feed = None  # необязательный live-источник пар Binance (BinanceTickerFeed)
+        self.price_history = None  # необязательная локальная история цен (PriceHistory)
+        # Подписчики на свежие цены: listener({coin_id: (цена, объем, капитализация)})
+        self._price_listeners: List[Callable[[Dict[str, Tuple[float, float, float]]], None]] = []
+        # Подписчики на описания монет: listener({coin_id: (название, тикер, место по капитализации)})
+        self._coin_listeners: List[Callable[[Dict[str, Tuple[str, str, Optional[int]]]], None]] = []
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._request_stats = {'upstream': 0, 'coalesced': 0}
+        self.cache = ResponseCache()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self._cache_stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_errors': 0,
+                             'fallbacks': 0}
+        self._breakers: Dict[str, CircuitBreaker] = {}  # {хост: автомат отключения}
+        self._budgets: Dict[str, Optional[QuotaBudget]] = {}  # {хост: бюджет запросов}
+        self._quota_share = 1.0
+        # {эндпоинт кэша: функция загрузки} - для принудительного обновления снимков
+        self._loaders = {
+            'global_metrics': self._fetch_global_metrics,
+            'top_coins': self._fetch_top_coins,
+            'binance_pairs': self._fetch_binance_top_pairs,
+            'fear_greed': self._fetch_fear_greed_index,
+            'trending': self._fetch_trending_coins,
+            'defi_metrics': self._fetch_defi_metrics,
+            'coin_info': self._fetch_coin_info
+        }
+    
+    async def start(self):
+        """Создает общую HTTP-сессию с пулом соединений"""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=HTTP_CONNECT_TIMEOUT,
+            sock_read=HTTP_READ_TIMEOUT
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    
+    async def close(self):
+        """Закрывает HTTP-сессию и все соединения пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию (создается лениво, если API используется вне жизненного цикла бота)"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    def get_pool_stats(self) -> Dict:
+        """Возвращает статистику использования пула соединений"""
+        if self._session is None or self._session.closed:
+            return {'open': False, 'requests_total': self._request_stats['upstream']}
+        connector = self._session.connector
+        in_use_per_host = {
+            f"{key.host}:{key.port}": len(conns)
+            for key, conns in getattr(connector, '_acquired_per_host', {}).items()
+            if conns
+        }
+        idle = sum(len(conns) for conns in getattr(connector, '_conns', {}).values())
+        return {
+            'open': True,
+            'limit': connector.limit,
+            'limit_per_host': connector.limit_per_host,
+            'in_use': len(getattr(connector, '_acquired', ())),
+            'in_use_per_host': in_use_per_host,
+            'idle': idle,
+            'requests_total': self._request_stats['upstream']
+        }
         
+    @staticmethod
+    def _normalize_params(params: Optional[Dict]) -> Dict[str, str]:
+        """Приводит параметры запроса к строкам (aiohttp не принимает bool)"""
+        if not params:
+            return {}
+        return {
+            key: ('true' if value else 'false') if isinstance(value, bool) else str(value)
+            for key, value in params.items()
+        }
+    
     async def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
-        """Выполняет HTTP запрос и возвращает JSON данные"""
+        """Выполняет HTTP запрос; одинаковые одновременные запросы объединяются в один"""
+        params = self._normalize_params(params)
+        request = (url, tuple(sorted(params.items())))
+        priority = current_priority()
+        
+        # Присоединяемся только к запросу не ниже своего приоритета: задача берет бюджет по классу того,
+        # кто ее запустил, и нажатие, ждущее фоновое обновление, получило бы отказ как фоновое
+        task = None
+        for joined in range(PRIORITY_INTERACTIVE, priority + 1):
+            task = self._inflight.get(request + (joined,))
+            if task is not None:
+                break
+        if task is not None:
+            self._request_stats['coalesced'] += 1
+        else:
+            # Запрос выполняется в отдельной задаче: отмена одного ожидающего не отменяет остальных
+            key = request + (priority,)
+            task = asyncio.create_task(self._fetch_json(url, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+    
+    @staticmethod
+    def _endpoint_label(url: str) -> str:
+        """Метка эндпоинта для метрик: хост и путь без идентификаторов монет"""
+        parsed = yarl.URL(url)
+        path = parsed.path
+        if path.startswith('/api/v3/coins/') and path not in ('/api/v3/coins/markets', '/api/v3/coins/list'):
+            path = '/api/v3/coins/{id}'
+        return f"{parsed.host}{path}"
+    
+    def _breaker_for(self, url: str) -> CircuitBreaker:
+        """Автомат отключения хоста (создается при первом запросе)"""
+        host = yarl.URL(url).host
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(host)
+            CIRCUIT_STATE.set_function(lambda: int(breaker.state != CircuitBreaker.CLOSED), host)
+        return breaker
+    
+    def set_quota_share(self, share: float):
+        """Задает долю бюджета запросов этого процесса (бюджет хоста общий для бота и воркеров)"""
+        self._quota_share = share
+        self._budgets.clear()
+    
+    def _budget_for(self, url: str) -> Optional[QuotaBudget]:
+        """Бюджет запросов хоста (None, если для хоста лимит не задан)"""
+        netloc = yarl.URL(url).raw_authority
+        if netloc not in self._budgets:
+            per_minute = UPSTREAM_QUOTA.get(netloc, 0) * self._quota_share
+            budget = self._budgets[netloc] = QuotaBudget(netloc, per_minute) if per_minute > 0 else None
+            if budget is not None:
+                QUOTA_REMAINING.set_function(budget.remaining, netloc)
+        return self._budgets[netloc]
+    
+    async def _fetch_json(self, url: str, params: Dict[str, str]) -> Optional[Dict]:
+        """Выполняет HTTP запрос с повторами; при разомкнутой цепи или исчерпанном бюджете возвращает None"""
+        session = await self.get_session()
+        breaker = self._breaker_for(url)
+        budget = self._budget_for(url)
+        deadline = time.monotonic() + UPSTREAM_RETRY_BUDGET
+        for attempt in range(UPSTREAM_MAX_RETRIES + 1):
+            # Сначала цепь: при разомкнутой цепи запрос не отправится и бюджет тратить не на что
+            if not breaker.allow():
+                UPSTREAM_RESPONSES.inc(self._endpoint_label(url), 'circuit_open')
+                return None
+            try:
+                if budget is not None and not await budget.acquire():
+                    # Бюджет нужен более важным запросам - вызывающий получит данные из кэша
+                    breaker.release_probe()
+                    UPSTREAM_RESPONSES.inc(self._endpoint_label(url), 'quota_denied')
+                    return None
+                status, data, retry_after = await self._request_once(session, url, params)
+            except asyncio.CancelledError:
+                # Отмененная задача не узнает ответа - пробный запрос достается следующей
+                breaker.release_probe()
+                raise
+            if status == 200:
+                breaker.record_success()
+                return data
+            if status is not None and status < 500 and status != 429:
+                # Источник жив, но запрос неверный - повтор не поможет
+                breaker.record_success()
+                return None
+            breaker.record_failure(retry_after)
+            delay = max(retry_after or 0, backoff_delay(attempt))
+            if attempt == UPSTREAM_MAX_RETRIES or time.monotonic() + delay > deadline:
+                break
+            await asyncio.sleep(delay)
+        return None
+    
+    async def _request_once(self, session: aiohttp.ClientSession, url: str,
+                            params: Dict[str, str]) -> Tuple[Optional[int], Optional[Dict], Optional[float]]:
+        """Одна попытка запроса: (HTTP-статус или None при сетевой ошибке, JSON, Retry-After)"""
+        self._request_stats['upstream'] += 1
+        endpoint = self._endpoint_label(url)
+        status = 'error'
+        started = time.perf_counter()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        print(f"Error: {response.status} for URL: {url}")
-                        return None
+            async with session.get(url, params=params) as response:
+                status = str(response.status)
+                if response.status == 200:
+                    return response.status, await response.json(), None
+                else:
+                    print(f"Error: {response.status} for URL: {url}")
+                    return response.status, None, parse_retry_after(response.headers.get('Retry-After'))
         except Exception as e:
             print(f"Request error: {e}")
+            return None, None, None
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, endpoint)
+            UPSTREAM_RESPONSES.inc(endpoint, status)
+    
+    def get_request_stats(self) -> Dict:
+        """Возвращает число запросов к API и число объединенных дублей"""
+        return dict(self._request_stats, in_flight=len(self._inflight))
+    
+    async def _cached(self, endpoint: str, args: tuple,
+                      loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Возвращает значение из кэша; устаревшее значение отдается сразу, а обновление идет в фоне"""
+        key = (endpoint,) + args
+        entry = self.cache.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.expires_at:
+                self._cache_stats['hits'] += 1
+                return entry.value
+            if now < entry.expires_at + CACHE_STALE_SECONDS:
+                self._cache_stats['stale_hits'] += 1
+                self._schedule_refresh(endpoint, key, loader)
+                return entry.value
+        
+        self._cache_stats['misses'] += 1
+        value = await self._load(endpoint, key, loader)
+        if value is None and entry is not None:
+            # Источник недоступен - отдаем последний удачный снимок (экран покажет его возраст)
+            self._cache_stats['fallbacks'] += 1
+            return entry.value
+        return value
+    
+    async def _load(self, endpoint: str, key: Hashable,
+                    loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Загружает значение и сохраняет его в кэш (пустые ответы не кэшируются)"""
+        value = await loader()
+        if value is not None:
+            self.cache.set(key, value, CACHE_TTL.get(endpoint, 0))
+        return value
+    
+    def _schedule_refresh(self, endpoint: str, key: Hashable,
+                          loader: Callable[[], Awaitable[Any]]):
+        """Запускает фоновое обновление записи, если оно еще не идет"""
+        if key in self._refreshing:
+            return
+        self._cache_stats['refreshes'] += 1
+        task = asyncio.create_task(self._background_load(endpoint, key, loader))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda done: self._on_refresh_done(key, done))
+    
+    def _on_refresh_done(self, key: Hashable, task: asyncio.Task):
+        """Снимает отметку фонового обновления и забирает его исключение"""
+        self._refreshing.pop(key, None)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self._cache_stats['refresh_errors'] += 1
+            print(f"Error refreshing {key}: {error}")
+    
+    async def _background_load(self, endpoint: str, key: Hashable,
+                               loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Фоновое обновление расходует бюджет запросов с наименьшим приоритетом"""
+        with upstream_priority(PRIORITY_PREFETCH):
+            return await self._load(endpoint, key, loader)
+    
+    async def refresh(self, endpoint: str, *args) -> Any:
+        """Принудительно загружает свежий снимок эндпоинта в кэш"""
+        loader = self._loaders[endpoint]
+        return await self._load(endpoint, (endpoint,) + args, lambda: loader(*args))
+    
+    def snapshot_version(self, endpoint: str, *args) -> Hashable:
+        """Версия текущего снимка данных эндпоинта (меняется при каждой загрузке)"""
+        if endpoint == 'binance_pairs' and self.ticker_feed is not None and self.ticker_feed.ready:
+            return ('ws', self.ticker_feed.version)
+        entry = self.cache.get((endpoint,) + args)
+        return entry.version if entry is not None else 0
+    
+    def snapshot_age(self, endpoint: str, *args) -> Optional[float]:
+        """Возраст снимка в секундах, если он старше окна устаревания (то есть отдан вместо недоступного источника)"""
+        if endpoint == 'binance_pairs' and self.ticker_feed is not None and self.ticker_feed.ready:
+            return None
+        entry = self.cache.get((endpoint,) + args)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now < entry.expires_at + CACHE_STALE_SECONDS:
+            return None
+        return now - entry.fetched_at
+    
+    def add_price_listener(self, listener: Callable[[Dict[str, Tuple[float, float, float]]], None]):
+        """Подписывает обработчик на каждый полученный от API снимок цен"""
+        self._price_listeners.append(listener)
+    
+    def _publish_prices(self, prices: Dict[str, Tuple[float, float, float]]):
+        """Передает снимок цен в историю и подписчикам"""
+        if not prices:
+            return
+        if self.price_history is not None:
+            self.price_history.record_many(prices)
+        for listener in self._price_listeners:
+            try:
+                listener(prices)
+            except Exception as e:
+                print(f"Price listener error: {e}")
+    
+    def add_coin_listener(self, listener: Callable[[Dict[str, Tuple[str, str, Optional[int]]]], None]):
+        """Подписывает обработчик на названия и тикеры монет из ответов API"""
+        self._coin_listeners.append(listener)
+    
+    def _publish_coins(self, coins: Dict[str, Tuple[str, str, Optional[int]]]):
+        """Передает описания монет подписчикам"""
+        if not coins:
+            return
+        for listener in self._coin_listeners:
+            try:
+                listener(coins)
+            except Exception as e:
+                print(f"Coin listener error: {e}")
+    
+    def peek_coin(self, coin_id: str) -> Optional[Dict]:
+        """Последние известные данные монеты из кэша, даже устаревшие (без запроса к API)"""
+        entry = self.cache.get(('coin_info', coin_id))
+        return entry.value if entry is not None else None
+    
+    def get_price_change(self, coin_id: str, seconds: float) -> Optional[float]:
+        """Изменение цены монеты за последние seconds секунд по локальной истории (None, если истории нет)"""
+        if self.price_history is None:
             return None
+        return self.price_history.change(coin_id, seconds)
+    
+    def get_breaker_stats(self) -> Dict:
+        """Возвращает состояние автоматов отключения по хостам"""
+        return {host: breaker.get_stats() for host, breaker in self._breakers.items()}
+    
+    def get_quota_stats(self) -> Dict:
+        """Возвращает остаток бюджета запросов и решения по классам приоритета для каждого хоста"""
+        return {host: budget.get_stats() for host, budget in self._budgets.items() if budget is not None}
+    
+    def get_cache_stats(self) -> Dict:
+        """Возвращает статистику кэша ответов"""
+        return dict(self._cache_stats, entries=len(self.cache),
+                    evictions=self.cache.evictions, refreshing=len(self._refreshing))
     
     async def get_global_metrics(self) -> Optional[Dict]:
+        """Получает глобальную метрику (с кэшем)"""
+        return await self._cached('global_metrics', (), self._fetch_global_metrics)
+    
+    async def _fetch_global_metrics(self) -> Optional[Dict]:
         """Получает глобальную метрику криптовалютного рынка"""
         url = f"{self.coingecko_base_url}/global"
         data = await self._make_request(url)
@@ -41,6 +442,10 @@ class CryptoAPI:
         return None
     
     async def get_top_coins(self, limit: int = 10) -> Optional[List[Dict]]:
+        """Получает топ монет (с кэшем)"""
+        return await self._cached('top_coins', (limit,), lambda: self._fetch_top_coins(limit))
+    
+    async def _fetch_top_coins(self, limit: int = 10) -> Optional[List[Dict]]:
         """Получает топ монет по рыночной капитализации"""
         url = f"{self.coingecko_base_url}/coins/markets"
         params = {
@@ -53,6 +458,13 @@ class CryptoAPI:
         }
         data = await self._make_request(url, params)
         if data:
+            self._publish_prices({
+                coin['id']: (coin['current_price'], coin['total_volume'], coin['market_cap'])
+                for coin in data if coin.get('current_price')
+            })
+            self._publish_coins({
+                coin['id']: (coin['name'], coin['symbol'].upper(), coin['market_cap_rank']) for coin in data
+            })
             return [{
                 'rank': coin['market_cap_rank'],
                 'name': coin['name'],
@@ -60,12 +472,80 @@ class CryptoAPI:
                 'price': coin['current_price'],
                 'market_cap': coin['market_cap'],
                 'price_change_24h': coin['price_change_percentage_24h'],
-                'volume_24h': coin['total_volume_24h']
+                'volume_24h': coin['total_volume']
             } for coin in data]
         return None
     
+    async def get_coins_markets(self, coin_ids: List[str]) -> Dict[str, Dict]:
+        """Получает данные сразу по нескольким монетам одним запросом /coins/markets"""
+        url = f"{self.coingecko_base_url}/coins/markets"
+        ids = sorted(set(coin_ids))
+        result = {}
+        # CoinGecko отдает не более 250 монет на страницу
+        for start in range(0, len(ids), 250):
+            chunk = ids[start:start + 250]
+            # Цены недельной давности по всем монетам уже есть в истории - изменение за 7д считаем сами
+            week_ago = time.time() - WEEK_SECONDS
+            prices_7d = {}
+            if self.price_history is not None:
+                prices_7d = {coin_id: self.price_history.price_at(coin_id, week_ago) for coin_id in chunk}
+            local_7d = bool(prices_7d) and all(prices_7d.values())
+            params = {
+                'vs_currency': 'usd',
+                'ids': ','.join(chunk),
+                'per_page': len(chunk),
+                'page': 1,
+                'sparkline': False,
+                'price_change_percentage': '24h' if local_7d else '24h,7d'
+            }
+            data = await self._make_request(url, params)
+            if not data:
+                continue
+            for coin in data:
+                price_7d = prices_7d.get(coin['id'])
+                if price_7d and coin['current_price']:
+                    change_7d = (coin['current_price'] - price_7d) / price_7d * 100
+                else:
+                    change_7d = coin.get('price_change_percentage_7d_in_currency') or 0
+                coin_data = {
+                    'name': coin['name'],
+                    'symbol': coin['symbol'].upper(),
+                    'current_price': coin['current_price'],
+                    'market_cap': coin['market_cap'],
+                    'price_change_24h': coin['price_change_percentage_24h'] or 0,
+                    'price_change_7d': change_7d,
+                    'volume_24h': coin['total_volume'],
+                    'market_cap_rank': coin['market_cap_rank']
+                }
+                result[coin['id']] = coin_data
+                # Прогреваем кэш get_coin_info тем же снимком
+                self.cache.set(('coin_info', coin['id']), coin_data, CACHE_TTL['coin_info'])
+            self._publish_prices({
+                coin['id']: (coin['current_price'], coin['total_volume'], coin['market_cap'])
+                for coin in data if coin.get('current_price')
+            })
+            self._publish_coins({
+                coin['id']: (coin['name'], coin['symbol'].upper(), coin['market_cap_rank']) for coin in data
+            })
+        # Если источник не ответил, используем последние известные данные монет
+        for coin_id in ids:
+            if coin_id not in result:
+                entry = self.cache.get(('coin_info', coin_id))
+                if entry is not None:
+                    self._cache_stats['fallbacks'] += 1
+                    result[coin_id] = entry.value
+        return result
+    
     async def get_binance_top_pairs(self, limit: int = 10) -> Optional[List[Dict]]:
+        """Получает топ пар Binance (из WebSocket-потока, если он подключен, иначе с кэшем)"""
+        if self.ticker_feed is not None and self.ticker_feed.ready:
+            return self.ticker_feed.top(limit)
+        return await self._cached('binance_pairs', (limit,), lambda: self._fetch_binance_top_pairs(limit))
+    
+    async def _fetch_binance_top_pairs(self, limit: int = 10) -> Optional[List[Dict]]:
         """Получает топ торговых пар Binance по объему"""
+        if self.ticker_feed is not None and self.ticker_feed.ready:
+            return self.ticker_feed.top(limit)
         url = f"{self.binance_base_url}/ticker/24hr"
         data = await self._make_request(url)
         if data:
@@ -84,6 +564,10 @@ class CryptoAPI:
         return None
     
     async def get_fear_greed_index(self) -> Optional[Dict]:
+        """Получает индекс страха и жадности (с кэшем)"""
+        return await self._cached('fear_greed', (), self._fetch_fear_greed_index)
+    
+    async def _fetch_fear_greed_index(self) -> Optional[Dict]:
         """Получает индекс страха и жадности"""
         data = await self._make_request(self.fear_greed_url)
         if data and 'data' in data and len(data['data']) > 0:
@@ -117,6 +601,10 @@ class CryptoAPI:
         return None
     
     async def get_trending_coins(self) -> Optional[List[Dict]]:
+        """Получает трендовые монеты (с кэшем)"""
+        return await self._cached('trending', (), self._fetch_trending_coins)
+    
+    async def _fetch_trending_coins(self) -> Optional[List[Dict]]:
         """Получает трендовые монеты"""
         url = f"{self.coingecko_base_url}/search/trending"
         data = await self._make_request(url)
@@ -130,23 +618,37 @@ class CryptoAPI:
         return None
     
     async def get_defi_metrics(self) -> Optional[Dict]:
+        """Получает DeFi метрики (с кэшем)"""
+        return await self._cached('defi_metrics', (), self._fetch_defi_metrics)
+    
+    async def _fetch_defi_metrics(self) -> Optional[Dict]:
         """Получает DeFi метрики"""
         url = f"{self.coingecko_base_url}/global/decentralized_finance_defi"
         data = await self._make_request(url)
         if data and 'data' in data:
             defi_data = data['data']
+            # CoinGecko отдает большинство чисел этого эндпоинта строками
             return {
-                'defi_market_cap': defi_data.get('defi_market_cap', 0),
-                'eth_market_cap': defi_data.get('eth_market_cap', 0),
-                'defi_to_eth_ratio': defi_data.get('defi_to_eth_ratio', 0),
-                'trading_volume_24h': defi_data.get('trading_volume_24h', 0),
-                'defi_dominance': defi_data.get('defi_dominance', 0),
+                'defi_market_cap': float(defi_data.get('defi_market_cap') or 0),
+                'eth_market_cap': float(defi_data.get('eth_market_cap') or 0),
+                'defi_to_eth_ratio': float(defi_data.get('defi_to_eth_ratio') or 0),
+                'trading_volume_24h': float(defi_data.get('trading_volume_24h') or 0),
+                'defi_dominance': float(defi_data.get('defi_dominance') or 0),
                 'top_coin_name': defi_data.get('top_coin_name', ''),
-                'top_coin_defi_dominance': defi_data.get('top_coin_defi_dominance', 0)
+                'top_coin_defi_dominance': float(defi_data.get('top_coin_defi_dominance') or 0)
             }
         return None
     
+    async def get_coins_list(self) -> Optional[List[Dict]]:
+        """Получает список всех монет CoinGecko (id, тикер, название) без кэша - его хранит каталог монет"""
+        url = f"{self.coingecko_base_url}/coins/list"
+        return await self._make_request(url)
+    
     async def get_coin_info(self, coin_id: str) -> Optional[Dict]:
+        """Получает информацию о монете (с кэшем)"""
+        return await self._cached('coin_info', (coin_id,), lambda: self._fetch_coin_info(coin_id))
+    
+    async def _fetch_coin_info(self, coin_id: str) -> Optional[Dict]:
         """Получает информацию о конкретной монете"""
         url = f"{self.coingecko_base_url}/coins/{coin_id}"
         params = {
@@ -160,6 +662,11 @@ class CryptoAPI:
         data = await self._make_request(url, params)
         if data and 'market_data' in data:
             market_data = data['market_data']
+            price = market_data['current_price'].get('usd')
+            if price:
+                self._publish_prices({coin_id: (price, market_data['total_volume'].get('usd'),
+                                                market_data['market_cap'].get('usd'))})
+            self._publish_coins({coin_id: (data['name'], data['symbol'].upper(), market_data['market_cap_rank'])})
             return {
                 'name': data['name'],
                 'symbol': data['symbol'].upper(),
@@ -173,4 +680,12 @@ class CryptoAPI:
         return None
 
 # Создаем глобальный экземпляр API
-crypto_api = CryptoAPI()
\ No newline at end of file
+crypto_api = CryptoAPI()
+
+# Статистика кэша и объединения запросов в метриках
+_cache_gauge = registry.gauge('cryptobot_cache_events', 'Response cache events since start', ['event'])
+for _event in ('hits', 'stale_hits', 'misses', 'refreshes', 'refresh_errors', 'fallbacks'):
+    _cache_gauge.set_function(lambda event=_event: crypto_api._cache_stats[event], _event)
+_requests_gauge = registry.gauge('cryptobot_upstream_calls', 'Upstream calls made vs coalesced since start', ['kind'])
+for _kind in ('upstream', 'coalesced'):
+    _requests_gauge.set_function(lambda kind=_kind: crypto_api._request_stats[kind], _kind)
\ No newline at end of file
@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from crypto_api import crypto_api
+from user_state import Interner
+from alerts import format_price
+from templates import view_templates
+from coin_catalog import coin_catalog, NO_RANK
+from config import POPULAR_COINS, INLINE_RESULTS_LIMIT
+
+# Сообщение о монете, для которой в памяти есть только цена (без полного снимка get_coin_info)
+PRICE_MESSAGE = '🪙 <b>{coin}</b>\n💰 {description}'
+# Сколько лучших совпадений на один результат отбирается до рендера (остальные не сортируются и не рендерятся)
+CANDIDATES_PER_RESULT = 3
+
+class PrefixIndex:
+    """Отсортированные ключи поиска и коды монет (параллельные массивы); префикс ищется бинарным поиском"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.codes = array('I')
+
+    def build(self, entries: Iterable[Tuple[str, int]]):
+        """Пересобирает индекс из пар (ключ, код монеты)"""
+        pairs = sorted(set(entries))
+        self.keys = [key for key, _ in pairs]
+        self.codes = array('I', (code for _, code in pairs))
+
+    def search(self, prefix: str) -> List[int]:
+        """Коды монет, у которых есть ключ с этим префиксом (без повторов, в порядке ключей)"""
+        seen = set()
+        result = []
+        index = bisect_left(self.keys, prefix)
+        while index < len(self.keys) and self.keys[index].startswith(prefix):
+            code = self.codes[index]
+            if code not in seen:
+                seen.add(code)
+                result.append(code)
+            index += 1
+        return result
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+def search_keys(coin_id: str, name: str, symbol: str) -> List[str]:
+    """Ключи поиска монеты: тикер, id, название и отдельные слова названия"""
+    name = name.lower()
+    keys = {symbol.lower(), coin_id.lower(), name}
+    keys.update(word for word in name.replace('-', ' ').split() if len(word) > 1)
+    return [key for key in keys if key]
+
+def build_index(entries: List[Tuple[str, int, str, str]]) -> PrefixIndex:
+    """Собирает индекс из (coin_id, код, название, тикер) - выполняется в потоке"""
+    index = PrefixIndex()
+    index.build((key, code) for coin_id, code, name, symbol in entries for key in search_keys(coin_id, name, symbol))
+    return index
+
+class CoinSearch:
+    """Поиск монет для inline-режима: индекс префиксов в памяти и цены из уже полученных снимков"""
+
+    def __init__(self):
+        self.coins = Interner()
+        self._meta: Dict[int, Tuple[str, str]] = {}  # {код монеты: (название, тикер)}
+        self._ranks: Dict[int, int] = {}  # {код монеты: место по капитализации}
+        self._prices: Dict[int, float] = {}  # последняя цена из ответов API
+        self.index = PrefixIndex()
+        self._dirty = False
+        self._rebuilding: Optional[asyncio.Task] = None
+        self.stats = {'queries': 0, 'rebuilds': 0}
+        # Все монеты каталога CoinGecko известны до первого ответа API
+        coin_catalog.add_listener(self.on_coins)
+        crypto_api.add_coin_listener(self.on_coins)
+        crypto_api.add_price_listener(self.on_prices)
+
+    def on_coins(self, coins: Dict[str, Tuple[str, str, Optional[int]]]):
+        """Запоминает названия, тикеры и ранги монет {coin_id: (название, тикер, место)}"""
+        for coin_id, (name, symbol, rank) in coins.items():
+            code = self.coins.code(coin_id)
+            if rank:
+                self._ranks[code] = rank
+            meta = (name, symbol.upper())
+            # Индекс зависит только от названий и тикеров - смена мест его не пересобирает
+            if self._meta.get(code) != meta:
+                self._meta[code] = meta
+                self._dirty = True
+        if self._dirty:
+            self._schedule_rebuild()
+
+    def on_prices(self, prices: Dict[str, Tuple[float, float, float]]):
+        """Запоминает последние цены монет"""
+        for coin_id, (price, _, _) in prices.items():
+            self._prices[self.coins.code(coin_id)] = price
+
+    def _schedule_rebuild(self):
+        """Запускает фоновую пересборку индекса (без цикла событий она начнется в start())"""
+        if self._rebuilding is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._rebuilding = loop.create_task(self._rebuild())
+
+    async def _rebuild(self):
+        """Пересобирает индекс в потоке по снимку названий; до замены запросы отвечаются прежним индексом"""
+        try:
+            while self._dirty:
+                self._dirty = False
+                entries = [(self.coins.value(code), code, name, symbol) for code, (name, symbol) in self._meta.items()]
+                self.index = await asyncio.to_thread(build_index, entries)
+                self.stats['rebuilds'] += 1
+        except Exception as e:
+            print(f"Error rebuilding inline search index: {e}")
+        finally:
+            self._rebuilding = None
+
+    async def start(self):
+        """Собирает индекс по монетам, известным до запуска цикла событий"""
+        if self._dirty:
+            self._schedule_rebuild()
+
+    async def stop(self):
+        """Останавливает пересборку индекса"""
+        if self._rebuilding is not None:
+            self._rebuilding.cancel()
+            await asyncio.gather(self._rebuilding, return_exceptions=True)
+            self._rebuilding = None
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """id монет по запросу: точное совпадение тикера, затем монеты с ценой, затем по капитализации"""
+        query = query.strip().lower()
+        if not query:
+            return list(POPULAR_COINS)
+        codes = self.index.search(query)
+        # Монета, которую каталог выбирает для такого id или тикера, идет первой
+        best = self.coins.find(coin_catalog.resolve(query) or '')
+        prices, ranks, meta = self._prices, self._ranks, self._meta
+
+        def order(code):
+            return code != best, meta[code][1].lower() != query, code not in prices, ranks.get(code, NO_RANK)
+
+        if limit is not None and len(codes) > limit:
+            codes = heapq.nsmallest(limit, codes, key=order)
+        else:
+            codes.sort(key=order)
+        return [self.coins.value(code) for code in codes]
+
+    def render(self, coin_id: str, language: str) -> Optional[Tuple[str, str, str]]:
+        """Заголовок, описание и HTML сообщения о монете из снимков в памяти; None, если цена неизвестна"""
+        code = self.coins.find(coin_id)
+        name, symbol = self._meta.get(code, (coin_id.capitalize(), coin_id.upper()))
+        title = f"{name} ({symbol})" if symbol else name
+        cached = crypto_api.peek_coin(coin_id)
+        if cached is not None and cached.get('current_price'):
+            price, change = cached['current_price'], cached.get('price_change_24h')
+        else:
+            cached = None
+            price = self._prices.get(code)
+            if price is None and crypto_api.price_history is not None:
+                point = crypto_api.price_history.latest(coin_id)
+                price = point[1] if point is not None else None
+            change = crypto_api.get_price_change(coin_id, 86400)
+        if not price:
+            return None
+        description = f"${format_price(price)}"
+        if change is not None:
+            description += f" · 24h {change:+.2f}%"
+        if cached is not None and change is not None:
+            message = view_templates.coin(cached, language)
+        else:
+            message = PRICE_MESSAGE.format(coin=title, description=description)
+        return title, description, message
+
+    def answer(self, query: str, language: str,
+               limit: int = INLINE_RESULTS_LIMIT) -> List[Tuple[str, str, str, str]]:
+        """Результаты inline-запроса (coin_id, заголовок, описание, сообщение); монеты без цены пропускаются"""
+        self.stats['queries'] += 1
+        results = []
+        for coin_id in self.search(query, limit * CANDIDATES_PER_RESULT):
+            rendered = self.render(coin_id, language)
+            if rendered is not None:
+                results.append((coin_id,) + rendered)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def get_stats(self) -> Dict:
+        """Возвращает число монет и ключей индекса"""
+        return dict(self.stats, coins=len(self._meta), keys=len(self.index))
+
+# Создаем глобальный поиск монет
+coin_search = CoinSearch()
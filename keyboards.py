@@ -1,8 +1,14 @@
+from functools import lru_cache
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from config import LANGUAGES, POPULAR_COINS, TIME_INTERVALS, TELEGRAM_CHANNEL, TEXTS
+from config import (
+    LANGUAGES, POPULAR_COINS, TIME_INTERVALS, TELEGRAM_CHANNEL, TEXTS, COIN_NAMES, INTERVAL_NAMES, ALERT_OFFSETS,
+    MOVE_WINDOWS, MOVE_THRESHOLDS
+)
 
+# Разметки неизменяемы, поэтому каждая клавиатура собирается один раз на язык (и монету) и переиспользуется
 class BotKeyboards:
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_language_keyboard():
         """Клавиатура выбора языка"""
         keyboard = []
@@ -11,6 +17,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_main_menu_keyboard(lang='ru'):
         """Главное меню"""
         texts = TEXTS[lang]
@@ -22,12 +29,15 @@ class BotKeyboards:
             [InlineKeyboardButton(texts['trends'], callback_data='trends')],
             [InlineKeyboardButton(texts['defi_metrics'], callback_data='defi_metrics')],
             [InlineKeyboardButton(texts['notifications'], callback_data='notifications')],
+            [InlineKeyboardButton(texts['price_alerts'], callback_data='price_alerts')],
+            [InlineKeyboardButton(texts['move_alerts'], callback_data='price_moves')],
             [InlineKeyboardButton(texts['update_info'], callback_data='update_info')],
             [InlineKeyboardButton(texts['channel_link'], url=TELEGRAM_CHANNEL)]
         ]
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_back_keyboard(lang='ru'):
         """Кнопка "Назад" """
         texts = TEXTS[lang]
@@ -35,37 +45,19 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_coins_keyboard(lang='ru'):
         """Клавиатура выбора монет для уведомлений"""
         texts = TEXTS[lang]
         keyboard = []
         
-        # Названия монет для отображения
-        coin_names = {
-            'bitcoin': 'Bitcoin (BTC)',
-            'ethereum': 'Ethereum (ETH)',
-            'binancecoin': 'Binance Coin (BNB)',
-            'cardano': 'Cardano (ADA)',
-            'solana': 'Solana (SOL)',
-            'xrp': 'XRP (XRP)',
-            'polkadot': 'Polkadot (DOT)',
-            'dogecoin': 'Dogecoin (DOGE)',
-            'avalanche-2': 'Avalanche (AVAX)',
-            'polygon': 'Polygon (MATIC)',
-            'shiba-inu': 'Shiba Inu (SHIB)',
-            'chainlink': 'Chainlink (LINK)',
-            'litecoin': 'Litecoin (LTC)',
-            'uniswap': 'Uniswap (UNI)',
-            'cosmos': 'Cosmos (ATOM)'
-        }
-        
         # Создаем кнопки по 2 в ряд
         for i in range(0, len(POPULAR_COINS), 2):
             row = []
             for j in range(2):
                 if i + j < len(POPULAR_COINS):
                     coin_id = POPULAR_COINS[i + j]
-                    coin_name = coin_names.get(coin_id, coin_id.capitalize())
+                    coin_name = COIN_NAMES.get(coin_id, coin_id.capitalize())
                     row.append(InlineKeyboardButton(coin_name, callback_data=f"coin_{coin_id}"))
             keyboard.append(row)
         
@@ -74,43 +66,13 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=1024)
     def get_intervals_keyboard(coin_id, lang='ru'):
         """Клавиатура выбора интервалов уведомлений"""
         texts = TEXTS[lang]
+        interval_names = INTERVAL_NAMES[lang]
         keyboard = []
         
-        # Названия интервалов
-        interval_names = {
-            '15m': '15 минут',
-            '30m': '30 минут',
-            '1h': '1 час',
-            '3h': '3 часа',
-            '6h': '6 часов',
-            '12h': '12 часов',
-            '24h': '24 часа'
-        }
-        
-        if lang == 'en':
-            interval_names = {
-                '15m': '15 minutes',
-                '30m': '30 minutes',
-                '1h': '1 hour',
-                '3h': '3 hours',
-                '6h': '6 hours',
-                '12h': '12 hours',
-                '24h': '24 hours'
-            }
-        elif lang == 'de':
-            interval_names = {
-                '15m': '15 Minuten',
-                '30m': '30 Minuten',
-                '1h': '1 Stunde',
-                '3h': '3 Stunden',
-                '6h': '6 Stunden',
-                '12h': '12 Stunden',
-                '24h': '24 Stunden'
-            }
-        
         # Создаем кнопки по 2 в ряд
         intervals = list(TIME_INTERVALS.keys())
         for i in range(0, len(intervals), 2):
@@ -126,7 +88,105 @@ class BotKeyboards:
         keyboard.append([InlineKeyboardButton(texts['back'], callback_data='notifications')])
         return InlineKeyboardMarkup(keyboard)
     
-    @staticmethod 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_alert_coins_keyboard(lang='ru'):
+        """Клавиатура выбора монеты для ценового алерта"""
+        texts = TEXTS[lang]
+        keyboard = []
+        
+        # Создаем кнопки по 2 в ряд
+        for i in range(0, len(POPULAR_COINS), 2):
+            row = []
+            for coin_id in POPULAR_COINS[i:i + 2]:
+                coin_name = COIN_NAMES.get(coin_id, coin_id.capitalize())
+                row.append(InlineKeyboardButton(coin_name, callback_data=f"alertcoin_{coin_id}"))
+            keyboard.append(row)
+        
+        keyboard.append([InlineKeyboardButton(texts['back'], callback_data='back_to_menu')])
+        return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    def get_alerts_menu_keyboard(alerts, lang='ru'):
+        """Меню алертов: выбор монеты и кнопки удаления алертов пользователя [(alert_id, подпись), ...]"""
+        texts = TEXTS[lang]
+        keyboard = list(BotKeyboards.get_alert_coins_keyboard(lang).inline_keyboard[:-1])
+        for alert_id, label in alerts:
+            keyboard.append([InlineKeyboardButton(f"🗑 {label}", callback_data=f"alertdel_{alert_id}")])
+        keyboard.append([InlineKeyboardButton(texts['back'], callback_data='back_to_menu')])
+        return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get_alert_levels_keyboard(coin_id, lang='ru'):
+        """Клавиатура выбора уровня алерта в процентах от текущей цены"""
+        texts = TEXTS[lang]
+        keyboard = []
+        for offset in ALERT_OFFSETS:
+            keyboard.append([
+                InlineKeyboardButton(f"📉 -{offset}%", callback_data=f"alert_{coin_id}_-{offset}"),
+                InlineKeyboardButton(f"📈 +{offset}%", callback_data=f"alert_{coin_id}_{offset}")
+            ])
+        keyboard.append([InlineKeyboardButton(texts['back'], callback_data='price_alerts')])
+        return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get_alert_keyboard(alert_id, repeat, lang='ru'):
+        """Клавиатура созданного алерта: повтор и удаление"""
+        texts = TEXTS[lang]
+        keyboard = [
+            [InlineKeyboardButton(texts['alert_repeat_on' if repeat else 'alert_repeat_off'],
+                                  callback_data=f"alertrepeat_{alert_id}")],
+            [InlineKeyboardButton(texts['alert_delete'], callback_data=f"alertdel_{alert_id}")],
+            [InlineKeyboardButton(texts['back'], callback_data='price_alerts')]
+        ]
+        return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_move_coins_keyboard(lang='ru'):
+        """Клавиатура выбора монеты для алерта движения цены"""
+        texts = TEXTS[lang]
+        keyboard = []
+        
+        # Создаем кнопки по 2 в ряд
+        for i in range(0, len(POPULAR_COINS), 2):
+            row = []
+            for coin_id in POPULAR_COINS[i:i + 2]:
+                coin_name = COIN_NAMES.get(coin_id, coin_id.capitalize())
+                row.append(InlineKeyboardButton(coin_name, callback_data=f"movecoin_{coin_id}"))
+            keyboard.append(row)
+        
+        keyboard.append([InlineKeyboardButton(texts['back'], callback_data='back_to_menu')])
+        return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    def get_moves_menu_keyboard(moves, lang='ru'):
+        """Меню алертов движения: выбор монеты и кнопки удаления подписок пользователя [(move_id, подпись), ...]"""
+        texts = TEXTS[lang]
+        keyboard = list(BotKeyboards.get_move_coins_keyboard(lang).inline_keyboard[:-1])
+        for move_id, label in moves:
+            keyboard.append([InlineKeyboardButton(f"🗑 {label}", callback_data=f"movedel_{move_id}")])
+        keyboard.append([InlineKeyboardButton(texts['back'], callback_data='back_to_menu')])
+        return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get_move_thresholds_keyboard(coin_id, lang='ru'):
+        """Клавиатура выбора порога и окна: ряд кнопок на каждое окно"""
+        texts = TEXTS[lang]
+        keyboard = []
+        for window in MOVE_WINDOWS:
+            keyboard.append([
+                InlineKeyboardButton(f"±{threshold}% / {window}", callback_data=f"move_{coin_id}_{window}_{threshold}")
+                for threshold in MOVE_THRESHOLDS
+            ])
+        keyboard.append([InlineKeyboardButton(texts['back'], callback_data='price_moves')])
+        return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    @lru_cache(maxsize=None)
     def get_update_keyboard(lang='ru'):
         """Клавиатура с кнопкой обновления"""
         texts = TEXTS[lang]
@@ -1,15 +1,34 @@
 import asyncio
 import logging
-from datetime import datetime
-from telegram import Update, Bot
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+import signal
+from collections import OrderedDict
+from telegram import Update, Bot, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler, ContextTypes
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 
 # Импорты наших модулей
-from config import BOT_TOKEN, TEXTS, TELEGRAM_CHANNEL
+from config import (
+    BOT_TOKEN, TEXTS, TELEGRAM_CHANNEL, PREFETCH_ENABLED, BINANCE_WS_ENABLED,
+    RUN_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, NOTIFICATION_WORKERS, METRICS_PORT,
+    TELEGRAM_API_URL, LOADING_EDIT_DEADLINE, INTERVAL_NAMES, UPSTREAM_QUOTA_WORKER_SHARE,
+    PRICE_HISTORY_ENABLED, ALERTS_PER_USER, MOVE_ALERTS_PER_USER, INLINE_CACHE_SECONDS, COIN_ID_ALIASES
+)
 from crypto_api import crypto_api
 from keyboards import keyboards
 from notifications import init_notification_manager
+from alerts import AlertManager, coin_name, describe_alert, format_price, round_level
+from move_alerts import MoveAlertManager, describe_move
+from inline_search import coin_search
+from coin_catalog import coin_catalog
+from view_cache import RenderedViewCache
+from templates import view_templates
+from prefetch import PrefetchEngine
+from timeseries import PriceHistory
+from binance_feed import BinanceTickerFeed
+from webhook import WebhookServer
+from sender import outbound_queue, PRIORITY_INTERACTIVE
+from metrics import registry, MetricsServer
 
 # Настройка логирования
 logging.basicConfig(
@@ -18,32 +37,131 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+HANDLER_LATENCY = registry.histogram(
+    'cryptobot_handler_seconds', 'Callback query handling time', ['route'])
+HANDLER_ERRORS = registry.counter(
+    'cryptobot_handler_errors_total', 'Callback queries that ended with an error message', ['route'])
+MESSAGE_EDITS = registry.counter(
+    'cryptobot_message_edits_total', 'Message edits by outcome (sent, skipped as unchanged, rejected as not modified)',
+    ['result'])
+
+# Сколько последних сообщений помнит бот, чтобы не отправлять правки без изменений
+MAX_TRACKED_MESSAGES = 10000
+
 class CryptoVektorProBot:
     def __init__(self):
         self.app = None
         self.notification_manager = None
+        self.alert_manager = None
+        self.move_alert_manager = None
+        self.metrics_server = MetricsServer(registry) if METRICS_PORT else None
+        self.view_cache = RenderedViewCache()
+        # {(chat_id, message_id): хэш текущего содержимого} - последние отредактированные сообщения
+        self.message_digests = OrderedDict()
+        # {callback_data: (эндпоинт кэша, аргументы, загрузка данных, форматирование)}
+        self.views = {
+            'global_metrics': ('global_metrics', (), crypto_api.get_global_metrics, view_templates.global_metrics),
+            'top_10_coins': ('top_coins', (10,), crypto_api.get_top_coins, view_templates.top_coins),
+            'binance_pairs': ('binance_pairs', (10,), crypto_api.get_binance_top_pairs, view_templates.binance_pairs),
+            'fear_greed': ('fear_greed', (), crypto_api.get_fear_greed_index, view_templates.fear_greed),
+            'trends': ('trending', (), crypto_api.get_trending_coins, view_templates.trends),
+            'defi_metrics': ('defi_metrics', (), crypto_api.get_defi_metrics, view_templates.defi_metrics)
+        }
+        # Live-таблица пар Binance (необязательно): экран пар перестает ходить в REST
+        self.ticker_feed = None
+        if BINANCE_WS_ENABLED:
+            self.ticker_feed = BinanceTickerFeed()
+            crypto_api.ticker_feed = self.ticker_feed
+        # Локальная история цен пополняется каждым ответом API (пишет только процесс бота)
+        self.price_history = None
+        if PRICE_HISTORY_ENABLED:
+            self.price_history = PriceHistory()
+            crypto_api.price_history = self.price_history
+        # Фоновое обновление держит снимки всех экранов свежими
+        self.prefetcher = None
+        if PREFETCH_ENABLED:
+            self.prefetcher = PrefetchEngine({
+                view: (endpoint, args) for view, (endpoint, args, _, _) in self.views.items()
+            })
+    
+    async def reply(self, message, text, **kwargs):
+        """Отвечает на сообщение через исходящую очередь (интерактивный приоритет)"""
+        return await outbound_queue.submit(
+            message.chat_id,
+            lambda: message.reply_text(text, **kwargs),
+            PRIORITY_INTERACTIVE
+        )
+    
+    async def edit_message(self, query, text, **kwargs):
+        """Редактирует сообщение через исходящую очередь (интерактивный приоритет); правки без изменений пропускаются"""
+        chat_id = query.message.chat_id if query.message else query.from_user.id
+        key = (chat_id, query.message.message_id) if query.message else query.inline_message_id
+        digest = hash((text, kwargs.get('parse_mode'), kwargs.get('reply_markup')))
+        if self.message_digests.get(key) == digest:
+            # Сообщение уже выглядит так - на нажатие ответил query.answer()
+            MESSAGE_EDITS.inc('skipped')
+            return None
+        
+        try:
+            result = await outbound_queue.submit(
+                chat_id,
+                lambda: query.edit_message_text(text, **kwargs),
+                PRIORITY_INTERACTIVE
+            )
+            MESSAGE_EDITS.inc('sent')
+        except BadRequest as e:
+            # Содержимое совпало с тем, что бот не запомнил (например, после перезапуска)
+            if 'message is not modified' not in e.message.lower():
+                raise
+            MESSAGE_EDITS.inc('not_modified')
+            result = None
+        
+        self.message_digests[key] = digest
+        self.message_digests.move_to_end(key)
+        if len(self.message_digests) > MAX_TRACKED_MESSAGES:
+            self.message_digests.popitem(last=False)
+        return result
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         user_id = str(update.effective_user.id)
         
         # Если пользователь уже выбрал язык, показываем главное меню
-        if self.notification_manager and user_id in self.notification_manager.user_languages:
+        if self.notification_manager and self.notification_manager.has_user_language(user_id):
             language = self.notification_manager.get_user_language(user_id)
             texts = TEXTS[language]
-            await update.message.reply_text(
+            await self.reply(update.message,
                 texts['welcome'],
                 reply_markup=keyboards.get_main_menu_keyboard(language),
                 parse_mode=ParseMode.HTML
             )
         else:
             # Предлагаем выбрать язык
-            await update.message.reply_text(
+            await self.reply(update.message,
                 "🌍 Please choose your language / Bitte wählen Sie Ihre Sprache / Пожалуйста, выберите язык:",
                 reply_markup=keyboards.get_language_keyboard()
             )
     
+    @staticmethod
+    def handler_route(data: str) -> str:
+        """Метка маршрута для метрик: callback data без идентификаторов монет и кодов языка"""
+        for prefix in ('lang_', 'coin_', 'interval_', 'alertcoin_', 'alert_', 'alertrepeat_', 'alertdel_',
+                       'movecoin_', 'move_', 'movedel_'):
+            if data.startswith(prefix):
+                return prefix + '*'
+        return data
+    
+    @staticmethod
+    def callback_coin(coin_id: str) -> str:
+        """id монеты из callback data: кнопки, отправленные до переименования, несут прежние id (xrp, polygon)"""
+        return COIN_ID_ALIASES.get(coin_id, coin_id)
+    
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик нажатий на кнопки с замером времени обработки"""
+        with HANDLER_LATENCY.time(self.handler_route(update.callback_query.data)):
+            await self.handle_button(update, context)
+    
+    async def handle_button(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик нажатий на кнопки"""
         query = update.callback_query
         await query.answer()
@@ -66,7 +184,7 @@ class CryptoVektorProBot:
                 language = lang_code
                 texts = TEXTS[language]
                 
-                await query.edit_message_text(
+                await self.edit_message(query,
                     texts['welcome'],
                     reply_markup=keyboards.get_main_menu_keyboard(language),
                     parse_mode=ParseMode.HTML
@@ -74,149 +192,55 @@ class CryptoVektorProBot:
             
             # Возврат в главное меню
             elif data == 'back_to_menu':
-                await query.edit_message_text(
+                await self.edit_message(query,
                     texts['welcome'],
                     reply_markup=keyboards.get_main_menu_keyboard(language),
                     parse_mode=ParseMode.HTML
                 )
             
-            # Глобальная метрика
-            elif data == 'global_metrics':
-                await query.edit_message_text(
-                    texts['loading'],
-                    reply_markup=keyboards.get_back_keyboard(language)
-                )
+            # Экраны с рыночными данными
+            elif data in self.views:
+                if self.prefetcher:
+                    self.prefetcher.record_hit(data)
+                # Свежие данные (или быстрый ответ API) показываем сразу, без промежуточной правки "Загрузка..."
+                render = asyncio.ensure_future(self.render_view(data, language))
+                done, _ = await asyncio.wait({render}, timeout=LOADING_EDIT_DEADLINE)
+                if not done:
+                    try:
+                        await self.edit_message(query,
+                            texts['loading'],
+                            reply_markup=keyboards.get_back_keyboard(language)
+                        )
+                    except BaseException:
+                        # Правка не удалась - рендер не нужен: отменяем его и забираем исключение, затем пробрасываем ошибку
+                        render.cancel()
+                        await asyncio.gather(render, return_exceptions=True)
+                        raise
                 
-                global_data = await crypto_api.get_global_metrics()
-                if global_data:
-                    message = self.format_global_metrics(global_data, language)
-                    await query.edit_message_text(
+                message = await render
+                if message:
+                    await self.edit_message(query,
                         message,
                         reply_markup=keyboards.get_update_keyboard(language),
                         parse_mode=ParseMode.HTML
                     )
                 else:
-                    await query.edit_message_text(
-                        texts['error'],
-                        reply_markup=keyboards.get_back_keyboard(language)
-                    )
-            
-            # Топ-10 монет
-            elif data == 'top_10_coins':
-                await query.edit_message_text(
-                    texts['loading'],
-                    reply_markup=keyboards.get_back_keyboard(language)
-                )
-                
-                top_coins = await crypto_api.get_top_coins()
-                if top_coins:
-                    message = self.format_top_coins(top_coins, language)
-                    await query.edit_message_text(
-                        message,
-                        reply_markup=keyboards.get_update_keyboard(language),
-                        parse_mode=ParseMode.HTML
-                    )
-                else:
-                    await query.edit_message_text(
-                        texts['error'],
-                        reply_markup=keyboards.get_back_keyboard(language)
-                    )
-            
-            # Топ пары Binance
-            elif data == 'binance_pairs':
-                await query.edit_message_text(
-                    texts['loading'],
-                    reply_markup=keyboards.get_back_keyboard(language)
-                )
-                
-                binance_pairs = await crypto_api.get_binance_top_pairs()
-                if binance_pairs:
-                    message = self.format_binance_pairs(binance_pairs, language)
-                    await query.edit_message_text(
-                        message,
-                        reply_markup=keyboards.get_update_keyboard(language),
-                        parse_mode=ParseMode.HTML
-                    )
-                else:
-                    await query.edit_message_text(
-                        texts['error'],
-                        reply_markup=keyboards.get_back_keyboard(language)
-                    )
-            
-            # Индекс страха/жадности
-            elif data == 'fear_greed':
-                await query.edit_message_text(
-                    texts['loading'],
-                    reply_markup=keyboards.get_back_keyboard(language)
-                )
-                
-                fear_greed = await crypto_api.get_fear_greed_index()
-                if fear_greed:
-                    message = self.format_fear_greed(fear_greed, language)
-                    await query.edit_message_text(
-                        message,
-                        reply_markup=keyboards.get_update_keyboard(language),
-                        parse_mode=ParseMode.HTML
-                    )
-                else:
-                    await query.edit_message_text(
-                        texts['error'],
-                        reply_markup=keyboards.get_back_keyboard(language)
-                    )
-            
-            # Тренды
-            elif data == 'trends':
-                await query.edit_message_text(
-                    texts['loading'],
-                    reply_markup=keyboards.get_back_keyboard(language)
-                )
-                
-                trends = await crypto_api.get_trending_coins()
-                if trends:
-                    message = self.format_trends(trends, language)
-                    await query.edit_message_text(
-                        message,
-                        reply_markup=keyboards.get_update_keyboard(language),
-                        parse_mode=ParseMode.HTML
-                    )
-                else:
-                    await query.edit_message_text(
-                        texts['error'],
-                        reply_markup=keyboards.get_back_keyboard(language)
-                    )
-            
-            # DeFi метрики
-            elif data == 'defi_metrics':
-                await query.edit_message_text(
-                    texts['loading'],
-                    reply_markup=keyboards.get_back_keyboard(language)
-                )
-                
-                defi_data = await crypto_api.get_defi_metrics()
-                if defi_data:
-                    message = self.format_defi_metrics(defi_data, language)
-                    await query.edit_message_text(
-                        message,
-                        reply_markup=keyboards.get_update_keyboard(language),
-                        parse_mode=ParseMode.HTML
-                    )
-                else:
-                    await query.edit_message_text(
+                    await self.edit_message(query,
                         texts['error'],
                         reply_markup=keyboards.get_back_keyboard(language)
                     )
             
             # Уведомления
             elif data == 'notifications':
-                await query.edit_message_text(
+                await self.edit_message(query,
                     texts['choose_coin'],
                     reply_markup=keyboards.get_coins_keyboard(language)
                 )
             
             # Выбор монеты для уведомлений
             elif data.startswith('coin_'):
-                coin_id = data.split('_', 1)[1]
-                await query.edit_message_text(
+                coin_id = self.callback_coin(data.split('_', 1)[1])
+                await self.edit_message(query,
                     texts['choose_interval'],
                     reply_markup=keyboards.get_intervals_keyboard(coin_id, language)
                 )
@@ -224,40 +248,102 @@ class CryptoVektorProBot:
             # Выбор интервала уведомлений
             elif data.startswith('interval_'):
                 parts = data.split('_')
-                coin_id = parts[1]
+                coin_id = self.callback_coin(parts[1])
                 interval = parts[2]
                 
                 if self.notification_manager:
                     self.notification_manager.add_notification(user_id, coin_id, interval)
                     
-                    # Получаем информацию о монете для отображения
-                    coin_data = await crypto_api.get_coin_info(coin_id)
-                    coin_name = coin_data['name'] if coin_data else coin_id
+                    # Название монеты берется из каталога, без запроса к API
+                    display_name = coin_catalog.name(coin_id) or coin_id
                     
-                    interval_text = interval
-                    if language == 'ru':
-                        interval_names = {'15m': '15 минут', '30m': '30 минут', '1h': '1 час', 
-                                        '3h': '3 часа', '6h': '6 часов', '12h': '12 часов', '24h': '24 часа'}
-                        interval_text = interval_names.get(interval, interval)
-                    elif language == 'en':
-                        interval_names = {'15m': '15 minutes', '30m': '30 minutes', '1h': '1 hour', 
-                                        '3h': '3 hours', '6h': '6 hours', '12h': '12 hours', '24h': '24 hours'}
-                        interval_text = interval_names.get(interval, interval)
-                    elif language == 'de':
-                        interval_names = {'15m': '15 Minuten', '30m': '30 Minuten', '1h': '1 Stunde', 
-                                        '3h': '3 Stunden', '6h': '6 Stunden', '12h': '12 Stunden', '24h': '24 Stunden'}
-                        interval_text = interval_names.get(interval, interval)
+                    interval_text = INTERVAL_NAMES[language].get(interval, interval)
                     
-                    message = texts['notification_set'].format(coin=coin_name, interval=interval_text)
-                    await query.edit_message_text(
+                    message = texts['notification_set'].format(coin=display_name, interval=interval_text)
+                    await self.edit_message(query,
                         message,
                         reply_markup=keyboards.get_back_keyboard(language)
                     )
             
+            # Ценовые алерты
+            elif data == 'price_alerts':
+                await self.show_alerts_menu(query, user_id, language)
+            
+            # Выбор монеты для алерта: уровни предлагаются от текущей цены
+            elif data.startswith('alertcoin_'):
+                coin_id = self.callback_coin(data.split('_', 1)[1])
+                coin_data = await crypto_api.get_coin_info(coin_id)
+                if not coin_data:
+                    raise ValueError(f"No price for {coin_id}")
+                await self.edit_message(query,
+                    texts['choose_alert_level'].format(
+                        coin=coin_data['name'], price=format_price(coin_data['current_price'])),
+                    reply_markup=keyboards.get_alert_levels_keyboard(coin_id, language),
+                    parse_mode=ParseMode.HTML
+                )
+            
+            # Создание алерта на заданном проценте от текущей цены
+            elif data.startswith('alert_'):
+                coin_id, offset = data[len('alert_'):].rsplit('_', 1)
+                coin_id = self.callback_coin(coin_id)
+                coin_data = await crypto_api.get_coin_info(coin_id)
+                if not coin_data:
+                    raise ValueError(f"No price for {coin_id}")
+                price = coin_data['current_price']
+                level = round_level(price * (1 + int(offset) / 100))
+                alert_id = self.alert_manager.add_alert(user_id, coin_id, level, price)
+                await self.show_alert(query, user_id, alert_id, language)
+            
+            # Включение и выключение повтора
+            elif data.startswith('alertrepeat_'):
+                alert_id = int(data.split('_', 1)[1])
+                alert = self.alert_manager.get_alert(user_id, alert_id)
+                if alert:
+                    self.alert_manager.set_repeat(user_id, alert_id, not alert.repeat)
+                await self.show_alert(query, user_id, alert_id, language)
+            
+            # Удаление алерта
+            elif data.startswith('alertdel_'):
+                alert_id = int(data.split('_', 1)[1])
+                self.alert_manager.remove_alert(user_id, alert_id)
+                await self.show_alerts_menu(query, user_id, language, texts['alert_deleted'])
+            
+            # Алерты на резкое движение цены
+            elif data == 'price_moves':
+                await self.show_moves_menu(query, user_id, language)
+            
+            elif data.startswith('movecoin_'):
+                coin_id = self.callback_coin(data.split('_', 1)[1])
+                await self.edit_message(query,
+                    texts['choose_move'].format(coin=coin_name(coin_id)),
+                    reply_markup=keyboards.get_move_thresholds_keyboard(coin_id, language),
+                    parse_mode=ParseMode.HTML
+                )
+            
+            # Подписка: движение отсчитывается от текущей цены
+            elif data.startswith('move_'):
+                coin_id, window, threshold = data[len('move_'):].rsplit('_', 2)
+                coin_id = self.callback_coin(coin_id)
+                coin_data = await crypto_api.get_coin_info(coin_id)
+                price = coin_data['current_price'] if coin_data else None
+                move_id = self.move_alert_manager.add_move(user_id, coin_id, window, float(threshold), price)
+                if move_id is None:
+                    notice = texts['move_limit'].format(limit=MOVE_ALERTS_PER_USER)
+                else:
+                    notice = texts['move_set'].format(
+                        coin=coin_name(coin_id), threshold=threshold,
+                        window=INTERVAL_NAMES[language].get(window, window))
+                await self.show_moves_menu(query, user_id, language, notice)
+            
+            elif data.startswith('movedel_'):
+                move_id = int(data.split('_', 1)[1])
+                self.move_alert_manager.remove_move(user_id, move_id)
+                await self.show_moves_menu(query, user_id, language, texts['move_deleted'])
+            
             # Обновление информации
             elif data == 'update_info' or data == 'update_current':
                 # Возвращаем пользователя в главное меню
-                await query.edit_message_text(
+                await self.edit_message(query,
                     texts['welcome'],
                     reply_markup=keyboards.get_main_menu_keyboard(language),
                     parse_mode=ParseMode.HTML
@@ -265,256 +351,241 @@ class CryptoVektorProBot:
                 
         except Exception as e:
             logger.error(f"Error in button handler: {e}")
-            await query.edit_message_text(
+            HANDLER_ERRORS.inc(self.handler_route(data))
+            await self.edit_message(query,
                 texts['error'],
                 reply_markup=keyboards.get_back_keyboard(language)
             )
     
-    def format_global_metrics(self, data, language):
-        """Форматирует глобальную метрику"""
-        change_emoji = "🟢" if data['market_cap_change_24h'] > 0 else "🔴"
-        change_sign = "+" if data['market_cap_change_24h'] > 0 else ""
-        
-        if language == 'ru':
-            return f"""
-🌍 <b>Глобальная метрика крипторынка</b>
-
-💰 <b>Общая капитализация:</b> ${data['total_market_cap_usd']:,.0f}
-💹 <b>Общий объем 24ч:</b> ${data['total_volume_24h_usd']:,.0f}
-{change_emoji} <b>Изменение капитализации 24ч:</b> {change_sign}{data['market_cap_change_24h']:.2f}%
-
-🪙 <b>Активные криптовалюты:</b> {data['active_cryptocurrencies']:,}
-🏪 <b>Биржи:</b> {data['markets']:,}
-
-📊 <b>Доминация:</b>
-• Bitcoin: {data['market_cap_percentage'].get('btc', 0):.1f}%
-• Ethereum: {data['market_cap_percentage'].get('eth', 0):.1f}%
-
-⏰ <i>Обновлено: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        elif language == 'en':
-            return f"""
-🌍 <b>Global Crypto Market Metrics</b>
-
-💰 <b>Total Market Cap:</b> ${data['total_market_cap_usd']:,.0f}
-💹 <b>Total 24h Volume:</b> ${data['total_volume_24h_usd']:,.0f}
-{change_emoji} <b>Market Cap Change 24h:</b> {change_sign}{data['market_cap_change_24h']:.2f}%
-
-🪙 <b>Active Cryptocurrencies:</b> {data['active_cryptocurrencies']:,}
-🏪 <b>Markets:</b> {data['markets']:,}
-
-📊 <b>Dominance:</b>
-• Bitcoin: {data['market_cap_percentage'].get('btc', 0):.1f}%
-• Ethereum: {data['market_cap_percentage'].get('eth', 0):.1f}%
-
-⏰ <i>Updated: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        else:  # German
-            return f"""
-🌍 <b>Globale Krypto-Marktmetriken</b>
-
-💰 <b>Gesamte Marktkapitalisierung:</b> ${data['total_market_cap_usd']:,.0f}
-💹 <b>Gesamtes 24h Volumen:</b> ${data['total_volume_24h_usd']:,.0f}
-{change_emoji} <b>Marktkapitalisierung Änderung 24h:</b> {change_sign}{data['market_cap_change_24h']:.2f}%
-
-🪙 <b>Aktive Kryptowährungen:</b> {data['active_cryptocurrencies']:,}
-🏪 <b>Märkte:</b> {data['markets']:,}
-
-📊 <b>Dominanz:</b>
-• Bitcoin: {data['market_cap_percentage'].get('btc', 0):.1f}%
-• Ethereum: {data['market_cap_percentage'].get('eth', 0):.1f}%
-
-⏰ <i>Aktualisiert: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
+    async def show_alerts_menu(self, query, user_id: str, language: str, notice: str = None):
+        """Меню алертов: список алертов пользователя и выбор монеты для нового"""
+        texts = TEXTS[language]
+        alerts = self.alert_manager.get_user_alerts(user_id)
+        parts = [notice] if notice else []
+        parts.append(texts['alerts_menu'])
+        if alerts:
+            parts.append(texts['alerts_list'] + '\n' + '\n'.join(f"• {describe_alert(alert)}" for alert in alerts))
+        await self.edit_message(query,
+            '\n\n'.join(parts),
+            reply_markup=keyboards.get_alerts_menu_keyboard(
+                [(alert.alert_id, describe_alert(alert)) for alert in alerts], language),
+            parse_mode=ParseMode.HTML
+        )
     
-    def format_top_coins(self, coins, language):
-        """Форматирует топ монет"""
-        if language == 'ru':
-            message = "🏆 <b>Топ-10 криптовалют</b>\n\n"
-        elif language == 'en':
-            message = "🏆 <b>Top 10 Cryptocurrencies</b>\n\n"
-        else:
-            message = "🏆 <b>Top 10 Kryptowährungen</b>\n\n"
-        
-        for coin in coins:
-            emoji = "🟢" if coin['price_change_24h'] > 0 else "🔴"
-            sign = "+" if coin['price_change_24h'] > 0 else ""
-            
-            message += f"""
-<b>{coin['rank']}. {coin['name']} ({coin['symbol']})</b>
-💰 ${coin['price']:,.2f} {emoji} {sign}{coin['price_change_24h']:.2f}%
-📈 Cap: ${coin['market_cap']:,.0f}
-
-"""
-        
-        timestamp = datetime.now().strftime('%d.%m.%Y %H:%M:%S')
-        if language == 'ru':
-            message += f"⏰ <i>Обновлено: {timestamp}</i>"
-        elif language == 'en':
-            message += f"⏰ <i>Updated: {timestamp}</i>"
-        else:
-            message += f"⏰ <i>Aktualisiert: {timestamp}</i>"
-        
-        return message
+    async def show_moves_menu(self, query, user_id: str, language: str, notice: str = None):
+        """Меню алертов движения: подписки пользователя и выбор монеты для новой"""
+        texts = TEXTS[language]
+        moves = self.move_alert_manager.get_user_moves(user_id)
+        parts = [notice] if notice else []
+        parts.append(texts['moves_menu'])
+        if moves:
+            parts.append(texts['moves_list'] + '\n' + '\n'.join(f"• {describe_move(move)}" for move in moves))
+        await self.edit_message(query,
+            '\n\n'.join(parts),
+            reply_markup=keyboards.get_moves_menu_keyboard(
+                [(move.move_id, describe_move(move)) for move in moves], language),
+            parse_mode=ParseMode.HTML
+        )
     
-    def format_binance_pairs(self, pairs, language):
-        """Форматирует топ пары Binance"""
-        if language == 'ru':
-            message = "💱 <b>Топ пары Binance (USDT)</b>\n\n"
-        elif language == 'en':
-            message = "💱 <b>Top Binance Pairs (USDT)</b>\n\n"
-        else:
-            message = "💱 <b>Top Binance-Paare (USDT)</b>\n\n"
-        
-        for i, pair in enumerate(pairs, 1):
-            emoji = "🟢" if pair['price_change_24h'] > 0 else "🔴"
-            sign = "+" if pair['price_change_24h'] > 0 else ""
-            
-            message += f"""
-<b>{i}. {pair['symbol']}</b>
-💰 ${pair['price']:,.4f} {emoji} {sign}{pair['price_change_24h']:.2f}%
-💹 24h Vol: ${pair['volume_24h']:,.0f}
-
-"""
-        
-        timestamp = datetime.now().strftime('%d.%m.%Y %H:%M:%S')
-        if language == 'ru':
-            message += f"⏰ <i>Обновлено: {timestamp}</i>"
-        elif language == 'en':
-            message += f"⏰ <i>Updated: {timestamp}</i>"
-        else:
-            message += f"⏰ <i>Aktualisiert: {timestamp}</i>"
-        
-        return message
+    def describe_created_alert(self, user_id: str, alert_id, language: str):
+        """Текст и клавиатура созданного алерта (или сообщение о лимите)"""
+        texts = TEXTS[language]
+        alert = self.alert_manager.get_alert(user_id, alert_id) if alert_id is not None else None
+        if alert is None:
+            return texts['alert_limit'].format(limit=ALERTS_PER_USER), keyboards.get_back_keyboard(language)
+        text = texts['alert_set'].format(
+            coin=coin_name(alert.coin_id),
+            direction=texts['alert_below'] if alert.falling else texts['alert_above'],
+            level=format_price(alert.level)
+        )
+        return text, keyboards.get_alert_keyboard(alert.alert_id, alert.repeat, language)
     
-    def format_fear_greed(self, data, language):
-        """Форматирует индекс страха/жадности"""
-        if language == 'ru':
-            message = f"""
-😰 <b>Индекс страха и жадности</b>
-
-{data['emoji']} <b>Значение:</b> {data['value']}/100
-📊 <b>Статус:</b> {data['status']}
-
-⏰ <i>Обновлено: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        elif language == 'en':
-            message = f"""
-😰 <b>Fear & Greed Index</b>
-
-{data['emoji']} <b>Value:</b> {data['value']}/100
-📊 <b>Status:</b> {data['status']}
-
-⏰ <i>Updated: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        else:  # German
-            message = f"""
-😰 <b>Fear & Greed Index</b>
-
-{data['emoji']} <b>Wert:</b> {data['value']}/100
-📊 <b>Status:</b> {data['status']}
-
-⏰ <i>Aktualisiert: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        
-        return message
+    async def show_alert(self, query, user_id: str, alert_id, language: str):
+        """Показывает созданный алерт с кнопками повтора и удаления"""
+        text, reply_markup = self.describe_created_alert(user_id, alert_id, language)
+        await self.edit_message(query, text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
     
-    def format_trends(self, trends, language):
-        """Форматирует трендовые монеты"""
-        if language == 'ru':
-            message = "📈 <b>Трендовые монеты</b>\n\n"
-        elif language == 'en':
-            message = "📈 <b>Trending Coins</b>\n\n"
-        else:
-            message = "📈 <b>Trend-Münzen</b>\n\n"
+    async def alert_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /alert <монета> <цена> [repeat]"""
+        user_id = str(update.effective_user.id)
+        language = self.notification_manager.get_user_language(user_id) if self.notification_manager else 'ru'
+        texts = TEXTS[language]
+        args = context.args or []
+        try:
+            # Монету можно указать id CoinGecko или тикером
+            coin_id = coin_catalog.resolve(args[0]) or args[0].lower()
+            level = float(args[1].replace(',', ''))
+        except (IndexError, ValueError):
+            await self.reply(update.message, texts['alert_usage'])
+            return
+        repeat = len(args) > 2 and args[2].lower() == 'repeat'
         
-        for i, coin in enumerate(trends, 1):
-            rank_text = f"#{coin['market_cap_rank']}" if coin['market_cap_rank'] else "N/A"
-            message += f"<b>{i}. {coin['name']} ({coin['symbol']})</b> - Rank: {rank_text}\n"
+        coin_data = await crypto_api.get_coin_info(coin_id)
+        if not coin_data or level <= 0:
+            await self.reply(update.message, texts['error'])
+            return
+        alert_id = self.alert_manager.add_alert(user_id, coin_id, level, coin_data['current_price'], repeat)
+        text, reply_markup = self.describe_created_alert(user_id, alert_id, language)
+        await self.reply(update.message, text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+    
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик inline-запросов (@bot eth): ответ из индекса и снимков в памяти, без запросов к API"""
+        with HANDLER_LATENCY.time('inline'):
+            query = update.inline_query
+            user_id = str(query.from_user.id)
+            language = self.notification_manager.get_user_language(user_id) if self.notification_manager else 'ru'
+            results = [
+                InlineQueryResultArticle(
+                    id=coin_id,
+                    title=title,
+                    description=description,
+                    input_message_content=InputTextMessageContent(message, parse_mode=ParseMode.HTML)
+                )
+                for coin_id, title, description, message in coin_search.answer(query.query, language)
+            ]
+            # Ответ зависит от языка пользователя, поэтому Telegram кэширует его для каждого пользователя отдельно
+            await query.answer(results, cache_time=INLINE_CACHE_SECONDS, is_personal=True)
+    
+    async def render_view(self, view: str, language: str):
+        """Возвращает HTML экрана; рендер выполняется один раз на снимок данных и язык"""
+        endpoint, args, fetch, formatter = self.views[view]
+        payload = await fetch(*args)
+        if not payload:
+            return None
+        version = crypto_api.snapshot_version(endpoint, *args)
+        text = self.view_cache.get_or_render(view, language, version,
+                                             lambda: formatter(payload, language))
+        # Источник недоступен и показан последний удачный снимок - подписываем его возраст
+        age = crypto_api.snapshot_age(endpoint, *args)
+        if age is not None:
+            text += '\n\n' + TEXTS[language]['stale_data'].format(minutes=max(1, int(age // 60)))
+        return text
+    
+    async def post_init(self, application: Application):
+        """Запускает общие ресурсы вместе с приложением"""
+        await crypto_api.start()
+        await outbound_queue.start()
+        await coin_catalog.start()
+        await coin_search.start()
+        if self.ticker_feed:
+            await self.ticker_feed.start()
+        if self.prefetcher:
+            await self.prefetcher.start()
+        if self.alert_manager:
+            await self.alert_manager.start()
+        if self.move_alert_manager:
+            await self.move_alert_manager.start()
+        if self.metrics_server:
+            await self.metrics_server.start()
         
-        timestamp = datetime.now().strftime('%d.%m.%Y %H:%M:%S')
-        if language == 'ru':
-            message += f"\n⏰ <i>Обновлено: {timestamp}</i>"
-        elif language == 'en':
-            message += f"\n⏰ <i>Updated: {timestamp}</i>"
+        # Запускаем планировщик уведомлений (в шардированном режиме рассылкой заняты процессы worker.py)
+        if NOTIFICATION_WORKERS == 0:
+            self.notification_manager.start_scheduler()
         else:
-            message += f"\n⏰ <i>Aktualisiert: {timestamp}</i>"
-        
-        return message
+            # Бюджет запросов к API делится с процессами-воркерами
+            crypto_api.set_quota_share(1 - UPSTREAM_QUOTA_WORKER_SHARE)
     
-    def format_defi_metrics(self, data, language):
-        """Форматирует DeFi метрики"""
-        if language == 'ru':
-            message = f"""
-🔗 <b>DeFi Метрики</b>
-
-💰 <b>DeFi Капитализация:</b> ${data['defi_market_cap']:,.0f}
-⚡ <b>ETH Капитализация:</b> ${data['eth_market_cap']:,.0f}
-📊 <b>DeFi/ETH Отношение:</b> {data['defi_to_eth_ratio']:.2f}%
-💹 <b>Объем торгов 24ч:</b> ${data['trading_volume_24h']:,.0f}
-🏆 <b>DeFi Доминация:</b> {data['defi_dominance']:.2f}%
-
-⏰ <i>Обновлено: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        elif language == 'en':
-            message = f"""
-🔗 <b>DeFi Metrics</b>
-
-💰 <b>DeFi Market Cap:</b> ${data['defi_market_cap']:,.0f}
-⚡ <b>ETH Market Cap:</b> ${data['eth_market_cap']:,.0f}
-📊 <b>DeFi/ETH Ratio:</b> {data['defi_to_eth_ratio']:.2f}%
-💹 <b>24h Trading Volume:</b> ${data['trading_volume_24h']:,.0f}
-🏆 <b>DeFi Dominance:</b> {data['defi_dominance']:.2f}%
-
-⏰ <i>Updated: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        else:  # German
-            message = f"""
-🔗 <b>DeFi-Metriken</b>
-
-💰 <b>DeFi-Marktkapitalisierung:</b> ${data['defi_market_cap']:,.0f}
-⚡ <b>ETH-Marktkapitalisierung:</b> ${data['eth_market_cap']:,.0f}
-📊 <b>DeFi/ETH-Verhältnis:</b> {data['defi_to_eth_ratio']:.2f}%
-💹 <b>24h Handelsvolumen:</b> ${data['trading_volume_24h']:,.0f}
-🏆 <b>DeFi-Dominanz:</b> {data['defi_dominance']:.2f}%
-
-⏰ <i>Aktualisiert: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        
-        return message
+    async def post_shutdown(self, application: Application):
+        """Освобождает общие ресурсы при остановке приложения"""
+        if self.alert_manager:
+            await self.alert_manager.stop()
+        if self.move_alert_manager:
+            await self.move_alert_manager.stop()
+        if self.notification_manager:
+            self.notification_manager.stop_scheduler()
+            self.notification_manager.close()
+        if self.prefetcher:
+            await self.prefetcher.stop()
+        if self.ticker_feed:
+            await self.ticker_feed.stop()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        await coin_search.stop()
+        await coin_catalog.stop()
+        await outbound_queue.stop()
+        await crypto_api.close()
+        if self.price_history:
+            self.price_history.close()
     
-    async def run(self):
-        """Запуск бота"""
-        if not BOT_TOKEN:
-            logger.error("BOT_TOKEN not found in environment variables!")
-            return
-        
-        # Создаем приложение
-        self.app = Application.builder().token(BOT_TOKEN).build()
+    def build_application(self) -> Application:
+        """Создает приложение, менеджер уведомлений и обработчики"""
+        # HTTP-пул CryptoAPI живет столько же, сколько приложение
+        self.app = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .base_url(TELEGRAM_API_URL)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
         
         # Инициализируем менеджер уведомлений
         self.notification_manager = init_notification_manager(self.app.bot)
+        # Ценовые алерты хранятся рядом с подписками и проверяются процессом бота
+        self.alert_manager = AlertManager(self.app.bot, self.notification_manager.store,
+                                          self.notification_manager.get_user_language)
+        self.move_alert_manager = MoveAlertManager(self.app.bot, self.notification_manager.store,
+                                                   self.notification_manager.get_user_language)
         
         # Добавляем обработчики
         self.app.add_handler(CommandHandler("start", self.start))
+        self.app.add_handler(CommandHandler("alert", self.alert_command))
         self.app.add_handler(CallbackQueryHandler(self.button_handler))
+        self.app.add_handler(InlineQueryHandler(self.inline_query))
+        return self.app
+    
+    def run(self):
+        """Запуск бота"""
+        if not BOT_TOKEN:
+            logger.error("BOT_TOKEN not found in environment variables!")
+            return
+        if RUN_MODE == 'webhook' and not (WEBHOOK_URL and WEBHOOK_SECRET):
+            logger.error("WEBHOOK_URL and WEBHOOK_SECRET are required in webhook mode!")
+            return
         
-        # Запускаем планировщик уведомлений
-        self.notification_manager.start_scheduler()
+        self.build_application()
+        logger.info(f"Bot started successfully in {RUN_MODE} mode!")
         
-        logger.info("Bot started successfully!")
+        if RUN_MODE == 'webhook':
+            asyncio.run(self.run_webhook())
+        else:
+            # Запускаем бота (run_polling сам управляет циклом событий)
+            self.app.run_polling(allowed_updates=Update.ALL_TYPES)
+    
+    async def run_webhook(self):
+        """Работа через webhook: обновления принимает встроенный HTTP-сервер"""
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
         
-        # Запускаем бота
-        await self.app.run_polling(allowed_updates=Update.ALL_TYPES)
+        server = WebhookServer(self.app)
+        await self.app.initialize()
+        await self.post_init(self.app)
+        try:
+            await self.app.start()
+            await server.start()
+            await self.app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES
+            )
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            if self.app.running:
+                await self.app.stop()
+            await self.app.shutdown()
+            await self.post_shutdown(self.app)
 
-async def main():
+def main():
     """Главная функция"""
     bot = CryptoVektorProBot()
-    await bot.run()
+    bot.run()
 
 if __name__ == '__main__':
     try:
-        asyncio.run(main())
+        main()
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
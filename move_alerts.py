@@ -0,0 +1,344 @@
+import asyncio
+import time
+from array import array
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import numpy as np
+from crypto_api import crypto_api
+from alerts import coin_name, format_price
+from sender import outbound_queue, PRIORITY_BULK
+from quota import PRIORITY_NOTIFICATION, upstream_priority
+from metrics import registry
+from config import (
+    TEXTS, INTERVAL_NAMES, POPULAR_COINS, MOVE_WINDOWS, MOVE_ALERTS_PER_USER, ALERT_CHECK_SECONDS
+)
+
+MOVE_ALERTS_FIRED = registry.counter('cryptobot_move_alerts_fired_total', 'Price move alerts fired', ['window'])
+MOVE_EVALUATE_LATENCY = registry.histogram(
+    'cryptobot_move_alert_evaluate_seconds', 'Time to evaluate one price snapshot against all move subscriptions')
+
+class MoveAlert(NamedTuple):
+    move_id: int
+    user_id: int
+    coin_id: str
+    window: str
+    threshold: float  # проценты
+
+def describe_move(move: MoveAlert) -> str:
+    """Короткое описание подписки для списков и кнопок"""
+    return f"{coin_name(move.coin_id)} ±{move.threshold:g}% / {move.window}"
+
+class MoveBook:
+    """Подписки "монета изменилась больше чем на N% за окно" в столбцах NumPy; снимок цен сверяется одним проходом"""
+
+    def __init__(self, coins: Iterable[str] = POPULAR_COINS, windows: Dict[str, int] = MOVE_WINDOWS,
+                 capacity: int = 1024):
+        self.coins = list(coins)
+        self._coin_index = {coin_id: index for index, coin_id in enumerate(self.coins)}
+        self.windows = list(windows)
+        self._window_index = {window: index for index, window in enumerate(self.windows)}
+        self.window_seconds = np.array([windows[window] for window in self.windows], dtype=np.float64)
+        # Столбцы подписок по move_id; освобожденные id переиспользуются
+        self._users = np.zeros(capacity, dtype=np.int64)
+        self._coins = np.zeros(capacity, dtype=np.int16)
+        self._windows = np.zeros(capacity, dtype=np.int8)
+        self._thresholds = np.zeros(capacity, dtype=np.float64)  # доля, а не проценты
+        # База сравнения: цена и время последнего срабатывания (или создания подписки)
+        self._base_at = np.zeros(capacity, dtype=np.float64)
+        self._base_price = np.full(capacity, np.nan)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._size = 0
+        self._free: List[int] = []
+        self._reserved: Set[int] = set()  # id сохраненных подписок, которые не загрузились
+        self._by_user: Dict[int, array] = {}  # {user_id: array('q') id подписок}
+        self.active = 0
+
+    def _columns(self) -> Tuple[np.ndarray, ...]:
+        return (self._users, self._coins, self._windows, self._thresholds,
+                self._base_at, self._base_price, self._active)
+
+    def _reserve(self, size: int):
+        """Увеличивает столбцы (вдвое), чтобы в них поместилось size подписок"""
+        capacity = len(self._active)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        grown = []
+        for column in self._columns():
+            fill = np.nan if column is self._base_price else 0
+            new = np.full(capacity, fill, dtype=column.dtype)
+            new[:len(column)] = column
+            grown.append(new)
+        (self._users, self._coins, self._windows, self._thresholds,
+         self._base_at, self._base_price, self._active) = grown
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        self._reserve(self._size + 1)
+        self._size += 1
+        return self._size - 1
+
+    def _index(self, user_id: int, move_id: int):
+        moves = self._by_user.get(user_id)
+        if moves is None:
+            moves = self._by_user[user_id] = array('q')
+        moves.append(move_id)
+
+    def find(self, user_id: int, coin_id: str, window: str) -> Optional[int]:
+        """Подписка пользователя на монету и окно"""
+        coin, window = self._coin_index[coin_id], self._window_index[window]
+        for move_id in self._by_user.get(user_id, ()):
+            if self._coins[move_id] == coin and self._windows[move_id] == window:
+                return move_id
+        return None
+
+    def add(self, user_id: int, coin_id: str, window: str, threshold: float,
+            price: Optional[float] = None, now: Optional[float] = None) -> int:
+        """Создает подписку (или меняет порог существующей); движение отсчитывается от текущей цены"""
+        move_id = self.find(user_id, coin_id, window)
+        if move_id is None:
+            move_id = self._allocate()
+            self._users[move_id] = user_id
+            self._coins[move_id] = self._coin_index[coin_id]
+            self._windows[move_id] = self._window_index[window]
+            self._active[move_id] = True
+            self._index(user_id, move_id)
+            self.active += 1
+        self._thresholds[move_id] = threshold / 100
+        if price:
+            self._base_at[move_id] = time.time() if now is None else now
+            self._base_price[move_id] = price
+        return move_id
+
+    def load(self, rows: Iterable[Tuple[int, int, str, str, float, float, float]]):
+        """Массовая загрузка сохраненных подписок (move_id, user_id, coin_id, окно, порог %, время и цена базы)"""
+        rows = list(rows)
+        if not rows:
+            return
+        size = max(row[0] for row in rows) + 1
+        self._reserve(size)
+        self._size = max(self._size, size)
+        # Подписки на монеты и окна, которых больше нет в конфигурации, не загружаются, но их id не выдаются
+        # новым подпискам: иначе INSERT OR REPLACE перезаписал бы в хранилище чужую строку
+        self._reserved.update(row[0] for row in rows
+                              if row[2] not in self._coin_index or row[3] not in self._window_index)
+        rows = [row for row in rows if row[2] in self._coin_index and row[3] in self._window_index]
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._users[ids] = [row[1] for row in rows]
+        self._coins[ids] = [self._coin_index[row[2]] for row in rows]
+        self._windows[ids] = [self._window_index[row[3]] for row in rows]
+        self._thresholds[ids] = [row[4] / 100 for row in rows]
+        self._base_at[ids] = [row[5] or 0.0 for row in rows]
+        self._base_price[ids] = [row[6] if row[6] else np.nan for row in rows]
+        self._active[ids] = True
+        for move_id, user_id in zip(ids.tolist(), self._users[ids].tolist()):
+            self._index(user_id, move_id)
+        self.active = int(self._active[:self._size].sum())
+        free = ~self._active[:self._size]
+        free[list(self._reserved)] = False
+        self._free = np.flatnonzero(free).tolist()
+
+    def remove(self, move_id: int) -> bool:
+        """Удаляет подписку"""
+        if not self.exists(move_id):
+            return False
+        user_id = int(self._users[move_id])
+        moves = self._by_user[user_id]
+        moves.remove(move_id)
+        if not moves:
+            del self._by_user[user_id]
+        self._active[move_id] = False
+        self._base_price[move_id] = np.nan
+        self._base_at[move_id] = 0.0
+        self._free.append(move_id)
+        self.active -= 1
+        return True
+
+    def exists(self, move_id: int) -> bool:
+        return 0 <= move_id < self._size and bool(self._active[move_id])
+
+    def get(self, move_id: int) -> Optional[MoveAlert]:
+        """Возвращает подписку по id"""
+        if not self.exists(move_id):
+            return None
+        return MoveAlert(move_id, int(self._users[move_id]), self.coins[self._coins[move_id]],
+                         self.windows[self._windows[move_id]], round(float(self._thresholds[move_id]) * 100, 6))
+
+    def row(self, move_id: int) -> Tuple[int, str, str, float, float, Optional[float]]:
+        """Запись подписки для хранилища: (user_id, coin_id, окно, порог %, время и цена базы)"""
+        move = self.get(move_id)
+        base_price = float(self._base_price[move_id])
+        return (move.user_id, move.coin_id, move.window, move.threshold, float(self._base_at[move_id]),
+                None if np.isnan(base_price) else base_price)
+
+    def user_moves(self, user_id: int) -> List[MoveAlert]:
+        """Подписки пользователя в порядке создания"""
+        return [self.get(move_id) for move_id in self._by_user.get(user_id, ())]
+
+    def user_move_count(self, user_id: int) -> int:
+        return len(self._by_user.get(user_id, ()))
+
+    def price_vector(self, prices: Dict[str, float]) -> np.ndarray:
+        """Цены монет книги в порядке self.coins; монет, которых нет в снимке, - NaN"""
+        vector = np.full(len(self.coins), np.nan)
+        for coin_id, price in prices.items():
+            index = self._coin_index.get(coin_id)
+            if index is not None and price:
+                vector[index] = price
+        return vector
+
+    def evaluate(self, prices: np.ndarray, references: np.ndarray,
+                 now: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Сверяет снимок со всеми подписками; возвращает id сработавших и их изменения (доли)
+
+        prices - цены монет (NaN - монеты нет в снимке), references[монета, окно] - цена начала окна
+        (NaN - неизвестна). Пока окно после срабатывания не истекло, движение считается от цены
+        срабатывания, иначе - от цены начала окна."""
+        now = time.time() if now is None else now
+        size = self._size
+        coins, windows = self._coins[:size], self._windows[:size]
+        price = prices[coins]
+        expired = now - self._base_at[:size] >= self.window_seconds[windows]
+        base = np.where(expired, references[coins, windows], self._base_price[:size])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            move = price / base - 1
+        # Сравнения с NaN ложны: монеты без цены и подписки без базы не срабатывают
+        fired = np.flatnonzero(self._active[:size] & (np.abs(move) >= self._thresholds[:size]))
+        # Без истории цен истекшая база сдвигается на текущую цену, чтобы отсчет шел от нее
+        rebase = np.flatnonzero(self._active[:size] & expired & np.isnan(base) & ~np.isnan(price))
+        for ids in (fired, rebase):
+            self._base_at[ids] = now
+            self._base_price[ids] = price[ids]
+        return fired, move[fired]
+
+class MoveAlertManager:
+    """Алерты на резкое движение цены: сверка подписок с каждым снимком цен, отправка и сохранение"""
+
+    def __init__(self, bot, store, get_language: Callable[[int], str],
+                 check_interval: float = ALERT_CHECK_SECONDS):
+        self.bot = bot
+        self.store = store
+        self.get_language = get_language
+        self.check_interval = check_interval
+        self.book = MoveBook()
+        self._task: Optional[asyncio.Task] = None
+        try:
+            self.book.load(self.store.load_move_alerts())
+        except Exception as e:
+            print(f"Error loading move alerts: {e}")
+        crypto_api.add_price_listener(self.on_prices)
+
+    def add_move(self, user_id: str, coin_id: str, window: str, threshold: float,
+                 price: Optional[float] = None) -> Optional[int]:
+        """Создает подписку; None, если у пользователя уже максимум подписок"""
+        user_id = int(user_id)
+        if (self.book.find(user_id, coin_id, window) is None
+                and self.book.user_move_count(user_id) >= MOVE_ALERTS_PER_USER):
+            return None
+        move_id = self.book.add(user_id, coin_id, window, threshold, price)
+        self.store.set_move_alert(move_id, *self.book.row(move_id))
+        return move_id
+
+    def remove_move(self, user_id: str, move_id: int) -> bool:
+        """Удаляет подписку пользователя"""
+        move = self.book.get(move_id)
+        if move is None or move.user_id != int(user_id):
+            return False
+        self.book.remove(move_id)
+        self.store.delete_move_alert(move_id)
+        return True
+
+    def get_user_moves(self, user_id: str) -> List[MoveAlert]:
+        """Получает подписки пользователя"""
+        return self.book.user_moves(int(user_id))
+
+    def references(self, now: float) -> np.ndarray:
+        """Цены начала каждого окна по монетам из локальной истории цен (без запросов к API)"""
+        references = np.full((len(self.book.coins), len(self.book.windows)), np.nan)
+        history = crypto_api.price_history
+        if history is None:
+            return references
+        for coin_index, coin_id in enumerate(self.book.coins):
+            for window_index, seconds in enumerate(self.book.window_seconds):
+                price = history.price_at(coin_id, now - seconds, now)
+                if price:
+                    references[coin_index, window_index] = price
+        return references
+
+    def on_prices(self, prices: Dict[str, Tuple[float, float, float]]):
+        """Сверяет снимок цен {coin_id: (цена, объем, капитализация)} со всеми подписками"""
+        if not self.book.active:
+            return
+        vector = self.book.price_vector({coin_id: price for coin_id, (price, _, _) in prices.items()})
+        if np.isnan(vector).all():
+            return
+        now = time.time()
+        with MOVE_EVALUATE_LATENCY.time():
+            fired, moves = self.book.evaluate(vector, self.references(now), now)
+        by_user: Dict[int, List[Tuple[MoveAlert, float]]] = {}
+        for move_id, move in zip(fired.tolist(), moves.tolist()):
+            alert = self.book.get(move_id)
+            by_user.setdefault(alert.user_id, []).append((alert, move))
+            self.store.set_move_alert(move_id, *self.book.row(move_id))
+        for user_id, user_moves in by_user.items():
+            self._notify(user_id, user_moves, vector)
+
+    def _notify(self, user_id: int, moves: List[Tuple[MoveAlert, float]], prices: np.ndarray):
+        """Одно сообщение пользователю обо всех его сработавших подписках"""
+        language = self.get_language(user_id)
+        texts = TEXTS[language]
+        lines = []
+        for alert, move in moves:
+            MOVE_ALERTS_FIRED.inc(alert.window)
+            lines.append(texts['move_triggered'].format(
+                coin=coin_name(alert.coin_id),
+                change=f"{move * 100:+.2f}",
+                window=INTERVAL_NAMES[language].get(alert.window, alert.window),
+                price=format_price(float(prices[self.book._coin_index[alert.coin_id]]))
+            ))
+        message = '\n\n'.join(lines)
+        future = outbound_queue.submit(
+            user_id,
+            lambda: self.bot.send_message(chat_id=user_id, text=message, parse_mode='HTML'),
+            PRIORITY_BULK
+        )
+        future.add_done_callback(lambda f: self._on_sent(user_id, f))
+
+    @staticmethod
+    def _on_sent(user_id: int, future: asyncio.Future):
+        """Логирует ошибку отправки"""
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error sending move alert to {user_id}: {future.exception()}")
+
+    async def check_prices(self):
+        """Запрашивает свежие цены монет из POPULAR_COINS (один пакетный запрос)"""
+        if not self.book.active:
+            return
+        try:
+            with upstream_priority(PRIORITY_NOTIFICATION):
+                # Цены приходят в on_prices через подписку на CryptoAPI
+                await crypto_api.get_coins_markets(self.book.coins)
+        except Exception as e:
+            print(f"Error checking move alert prices: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_prices()
+
+    async def start(self):
+        """Запускает периодическую проверку цен"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает периодическую проверку цен"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        """Возвращает число активных подписок"""
+        return {'active': self.book.active}
@@ -1,197 +1,287 @@
 import asyncio
-import json
-import os
-from datetime import datetime, timedelta
-from typing import Dict, List
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from crypto_api import crypto_api
-from config import TIME_INTERVALS, TEXTS
+from scheduler import TimingWheel
+from storage import UserStore
+from user_state import CompactUserState
+from sender import outbound_queue, PRIORITY_BULK
+from quota import PRIORITY_NOTIFICATION, upstream_priority
+from templates import view_templates
+from metrics import registry
+from config import (
+    TIME_INTERVALS, TEXTS, NOTIFICATION_BATCH_SECONDS, SCHEDULER_TICK_SECONDS, WORKER_SYNC_SECONDS,
+    NOTIFICATION_WORKERS
+)
+
+SCHEDULER_LAG = registry.histogram(
+    'cryptobot_scheduler_lag_seconds', 'Delay between a timing-wheel tick and its processing')
+SCHEDULER_DUE = registry.histogram(
+    'cryptobot_scheduler_due_jobs', 'Subscriptions due per timing-wheel advance (one tick normally)',
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000))
+FANOUT_LATENCY = registry.histogram(
+    'cryptobot_notification_fanout_seconds', 'Time to fetch data and enqueue one notification batch')
+NOTIFICATIONS = registry.counter(
+    'cryptobot_notifications_total', 'Notifications enqueued for sending', ['result'])
+
+# Старый формат данных, переносится в SQLite при первом запуске бота (или родительского процесса worker.py)
+LEGACY_DATA_FILE = 'user_data.json'
 
 class NotificationManager:
-    def __init__(self, bot):
+    def __init__(self, bot, shards=None):
         self.bot = bot
+        self.shards = shards  # ShardLeaseManager в режиме воркера: отправляем только своим шардам
         self.scheduler = AsyncIOScheduler()
-        self.user_notifications = {}  # {user_id: {coin_id: interval}}
-        self.user_languages = {}  # {user_id: language}
-        self.data_file = 'user_data.json'
+        # Все подписки живут в колесе таймеров, а не в отдельных задачах. Процессу бота при
+        # NOTIFICATION_WORKERS > 0 колесо не нужно: рассылкой заняты воркеры
+        self.wheel: Optional[TimingWheel] = (
+            TimingWheel() if shards is not None or NOTIFICATION_WORKERS == 0 else None
+        )
+        self.state = CompactUserState()  # языки и подписки всех пользователей
+        self.data_file = LEGACY_DATA_FILE
+        self.store = UserStore()
+        self._sync_cursor = 0  # последняя прочитанная запись журнала изменений хранилища (режим воркера)
+        self._pending = set()  # {(user_id, coin_id)} - задачи, ожидающие отправки в текущем такте
         self.load_user_data()
         
     def load_user_data(self):
-        """Загружает данные пользователей из файла"""
+        """Загружает данные пользователей из хранилища"""
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.user_notifications = data.get('notifications', {})
-                    self.user_languages = data.get('languages', {})
+            # Воркеры не переносят старый файл: это делает родительский процесс до их запуска
+            if self.shards is None:
+                self.store.migrate_from_json(self.data_file)
+            self._sync_cursor = self.store.change_cursor()
+            languages, notifications = self.store.load()
+            self.state.load_languages(languages)
+            self.state.load_notifications(notifications)
         except Exception as e:
             print(f"Error loading user data: {e}")
+        self.store.start()
     
-    def save_user_data(self):
-        """Сохраняет данные пользователей в файл"""
-        try:
-            data = {
-                'notifications': self.user_notifications,
-                'languages': self.user_languages
-            }
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error saving user data: {e}")
+    def reload_user_data(self):
+        """Подтягивает изменения, сделанные другими процессами (режим воркера)"""
+        self.apply_user_changes(self.load_user_changes())
+    
+    def load_user_changes(self) -> Tuple:
+        """Читает из хранилища только пользователей, измененных с прошлой синхронизации (полностью - если журнал обрезан)"""
+        changes = self.store.load_changes(self._sync_cursor)
+        if changes is None:
+            cursor = self.store.change_cursor()
+            languages, notifications = self.store.load()
+            return cursor, None, languages, notifications
+        return changes
+    
+    def apply_user_changes(self, changes: Tuple):
+        """Применяет результат load_user_changes"""
+        cursor, user_ids, languages, notifications = changes
+        self.apply_user_data(languages, notifications, user_ids)
+        self._sync_cursor = cursor
+    
+    def apply_user_data(self, languages: Dict[int, str], notifications: Dict[int, Dict[str, str]],
+                        user_ids: Optional[Iterable[int]] = None):
+        """Приводит состояние и колесо таймеров к данным из хранилища (всех или только user_ids), не записывая их обратно"""
+        for user_id, language in languages.items():
+            self.state.set_language(user_id, language)
+        if user_ids is None:
+            current = {(user_id, coin_id): interval
+                       for user_id, coin_id, interval in self.state.iter_notifications()}
+        else:
+            current = {(user_id, coin_id): interval
+                       for user_id in user_ids
+                       for coin_id, interval in self.state.get_notifications(user_id).items()}
+        loaded = {
+            (user_id, coin_id): interval
+            for user_id, coins in notifications.items()
+            for coin_id, interval in coins.items()
+        }
+        for (user_id, coin_id), interval in loaded.items():
+            if current.get((user_id, coin_id)) != interval:
+                self.state.set_notification(user_id, coin_id, interval)
+                if self.wheel is not None:
+                    self.wheel.add((user_id, coin_id), interval)
+        for user_id, coin_id in current.keys() - loaded.keys():
+            self.state.remove_notification(user_id, coin_id)
+            if self.wheel is not None:
+                self.wheel.remove((user_id, coin_id))
+    
+    def close(self):
+        """Сбрасывает несохраненные изменения на диск"""
+        self.store.close()
     
     def set_user_language(self, user_id: str, language: str):
         """Устанавливает язык пользователя"""
-        self.user_languages[user_id] = language
-        self.save_user_data()
+        self.state.set_language(int(user_id), language)
+        self.store.set_language(int(user_id), language)
+    
+    def has_user_language(self, user_id: str) -> bool:
+        """Проверяет, выбирал ли пользователь язык"""
+        return self.state.has_language(int(user_id))
     
     def get_user_language(self, user_id: str) -> str:
         """Получает язык пользователя"""
-        return self.user_languages.get(user_id, 'ru')
+        return self.state.get_language(int(user_id))
     
     def add_notification(self, user_id: str, coin_id: str, interval: str):
         """Добавляет уведомление для пользователя"""
-        if user_id not in self.user_notifications:
-            self.user_notifications[user_id] = {}
-        
-        # Удаляем старое уведомление для этой монеты, если есть
-        if coin_id in self.user_notifications[user_id]:
-            self.remove_notification(user_id, coin_id)
+        user_id = int(user_id)
         
-        self.user_notifications[user_id][coin_id] = interval
-        self.save_user_data()
+        # Старое уведомление для этой монеты заменяется новым
+        self.state.set_notification(user_id, coin_id, interval)
+        self.store.set_notification(user_id, coin_id, interval)
         
-        # Создаем задачу в планировщике
-        job_id = f"{user_id}_{coin_id}"
-        minutes = TIME_INTERVALS[interval]
-        
-        self.scheduler.add_job(
-            func=self.send_coin_update,
-            trigger='interval',
-            minutes=minutes,
-            args=[user_id, coin_id],
-            id=job_id,
-            replace_existing=True
-        )
+        # Ставим подписку в колесо таймеров
+        if self.wheel is not None:
+            self.wheel.add((user_id, coin_id), interval)
     
     def remove_notification(self, user_id: str, coin_id: str):
         """Удаляет уведомление"""
-        if user_id in self.user_notifications and coin_id in self.user_notifications[user_id]:
-            del self.user_notifications[user_id][coin_id]
-            self.save_user_data()
+        user_id = int(user_id)
+        if self.state.remove_notification(user_id, coin_id):
+            self.store.delete_notification(user_id, coin_id)
             
-            # Удаляем задачу из планировщика
-            job_id = f"{user_id}_{coin_id}"
-            try:
-                self.scheduler.remove_job(job_id)
-            except:
-                pass
+            # Удаляем подписку из колеса таймеров
+            if self.wheel is not None:
+                self.wheel.remove((user_id, coin_id))
     
     def get_user_notifications(self, user_id: str) -> Dict:
         """Получает список уведомлений пользователя"""
-        return self.user_notifications.get(user_id, {})
+        return self.state.get_notifications(int(user_id))
+    
+    async def advance_wheel(self, now: Optional[float] = None):
+        """Забирает из колеса таймеров подписки, сработавшие с прошлого такта (now - для нагрузочного теста)"""
+        due = self.wheel.advance(now)
+        if not self.wheel.last_ticks:
+            return
+        SCHEDULER_LAG.observe(self.wheel.last_lag)
+        if self.shards is not None:
+            due = [key for key in due if self.shards.owns(key[0])]
+        SCHEDULER_DUE.observe(len(due))
+        self._pending.update(due)
     
-    async def send_coin_update(self, user_id: str, coin_id: str):
-        """Отправляет обновление о монете"""
+    async def renew_shards(self):
+        """Продлевает аренду шардов (SQLite-запрос выполняется вне цикла событий)"""
+        loop = asyncio.get_running_loop()
         try:
-            language = self.get_user_language(user_id)
-            texts = TEXTS[language]
-            
-            # Получаем данные о монете
-            coin_data = await crypto_api.get_coin_info(coin_id)
-            
-            if coin_data:
-                # Формируем сообщение
-                message = self.format_coin_message(coin_data, language)
-                
-                # Отправляем сообщение
-                await self.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    parse_mode='HTML'
-                )
-            else:
-                await self.bot.send_message(
-                    chat_id=user_id,
-                    text=texts['error']
-                )
-                
+            await loop.run_in_executor(None, self.shards.heartbeat)
         except Exception as e:
-            print(f"Error sending notification to {user_id}: {e}")
+            print(f"Error renewing shard leases: {e}")
     
-    def format_coin_message(self, coin_data: Dict, language: str) -> str:
-        """Форматирует сообщение о монете"""
-        texts = TEXTS[language]
-        
-        # Эмодзи для изменения цены
-        price_emoji = "🟢" if coin_data['price_change_24h'] > 0 else "🔴"
-        price_change_sign = "+" if coin_data['price_change_24h'] > 0 else ""
+    async def sync_user_data(self):
+        """Периодически подтягивает из общего хранилища подписки измененных пользователей"""
+        loop = asyncio.get_running_loop()
+        try:
+            changes = await loop.run_in_executor(None, self.load_user_changes)
+            self.apply_user_changes(changes)
+        except Exception as e:
+            print(f"Error syncing user data: {e}")
+    
+    async def flush_pending(self):
+        """Отправляет все накопившиеся за такт уведомления одним пакетом"""
+        if not self._pending:
+            return
+        due, self._pending = self._pending, set()
+        with FANOUT_LATENCY.time():
+            await self.send_batch(due)
+    
+    async def send_batch(self, due: Iterable[Tuple[str, str]]):
+        """Отправляет пакет уведомлений: один запрос на все монеты, одно сообщение на (монету, язык)"""
+        # {coin_id: {language: [user_id, ...]}}
+        recipients = defaultdict(lambda: defaultdict(list))
+        for user_id, coin_id in due:
+            recipients[coin_id][self.get_user_language(user_id)].append(user_id)
+        if not recipients:
+            return
         
-        if language == 'ru':
-            message = f"""
-🪙 <b>{coin_data['name']} ({coin_data['symbol']})</b>
-
-💰 <b>Цена:</b> ${coin_data['current_price']:,.2f}
-{price_emoji} <b>Изменение 24ч:</b> {price_change_sign}{coin_data['price_change_24h']:.2f}%
-📊 <b>Изменение 7д:</b> {coin_data['price_change_7d']:.2f}%
-🏆 <b>Ранг:</b> #{coin_data['market_cap_rank']}
-📈 <b>Рын. капитализация:</b> ${coin_data['market_cap']:,.0f}
-💹 <b>Объем 24ч:</b> ${coin_data['volume_24h']:,.0f}
-
-⏰ <i>Обновлено: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        elif language == 'en':
-            message = f"""
-🪙 <b>{coin_data['name']} ({coin_data['symbol']})</b>
-
-💰 <b>Price:</b> ${coin_data['current_price']:,.2f}
-{price_emoji} <b>24h Change:</b> {price_change_sign}{coin_data['price_change_24h']:.2f}%
-📊 <b>7d Change:</b> {coin_data['price_change_7d']:.2f}%
-🏆 <b>Rank:</b> #{coin_data['market_cap_rank']}
-📈 <b>Market Cap:</b> ${coin_data['market_cap']:,.0f}
-💹 <b>24h Volume:</b> ${coin_data['volume_24h']:,.0f}
-
-⏰ <i>Updated: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
-        else:  # German
-            message = f"""
-🪙 <b>{coin_data['name']} ({coin_data['symbol']})</b>
-
-💰 <b>Preis:</b> ${coin_data['current_price']:,.2f}
-{price_emoji} <b>24h Änderung:</b> {price_change_sign}{coin_data['price_change_24h']:.2f}%
-📊 <b>7d Änderung:</b> {coin_data['price_change_7d']:.2f}%
-🏆 <b>Rang:</b> #{coin_data['market_cap_rank']}
-📈 <b>Marktkapitalisierung:</b> ${coin_data['market_cap']:,.0f}
-💹 <b>24h Volumen:</b> ${coin_data['volume_24h']:,.0f}
-
-⏰ <i>Aktualisiert: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}</i>
-            """
+        try:
+            with upstream_priority(PRIORITY_NOTIFICATION):
+                coins_data = await crypto_api.get_coins_markets(list(recipients))
+        except Exception as e:
+            print(f"Error fetching coins for notifications: {e}")
+            coins_data = {}
         
-        return message
+        for coin_id, by_language in recipients.items():
+            coin_data = coins_data.get(coin_id)
+            for language, user_ids in by_language.items():
+                if coin_data:
+                    message = self.format_coin_message(coin_data, language)
+                    parse_mode = 'HTML'
+                else:
+                    message = TEXTS[language]['error']
+                    parse_mode = None
+                NOTIFICATIONS.inc('ok' if coin_data else 'no_data', amount=len(user_ids))
+                for user_id in user_ids:
+                    self._send(user_id, message, parse_mode)
+    
+    def _send(self, user_id: str, message: str, parse_mode=None):
+        """Ставит сообщение пользователю в исходящую очередь с низким приоритетом"""
+        future = outbound_queue.submit(
+            user_id,
+            lambda: self.bot.send_message(chat_id=user_id, text=message, parse_mode=parse_mode),
+            PRIORITY_BULK
+        )
+        future.add_done_callback(lambda f: self._on_sent(user_id, f))
+    
+    @staticmethod
+    def _on_sent(user_id: str, future: asyncio.Future):
+        """Логирует ошибку отправки уведомления"""
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error sending notification to {user_id}: {future.exception()}")
+    
+    def format_coin_message(self, coin_data: Dict, language: str) -> str:
+        """Форматирует сообщение о монете"""
+        return view_templates.coin(coin_data, language)
     
     def start_scheduler(self):
         """Запускает планировщик"""
         if not self.scheduler.running:
             self.scheduler.start()
             
-            # Восстанавливаем задачи для всех пользователей
-            for user_id, notifications in self.user_notifications.items():
-                for coin_id, interval in notifications.items():
-                    job_id = f"{user_id}_{coin_id}"
-                    minutes = TIME_INTERVALS[interval]
-                    
-                    self.scheduler.add_job(
-                        func=self.send_coin_update,
-                        trigger='interval',
-                        minutes=minutes,
-                        args=[user_id, coin_id],
-                        id=job_id,
-                        replace_existing=True
-                    )
+            # Одна задача на такт колеса таймеров вместо задачи на каждую подписку
+            self.scheduler.add_job(
+                func=self.advance_wheel,
+                trigger='interval',
+                seconds=SCHEDULER_TICK_SECONDS,
+                id='timing_wheel',
+                replace_existing=True
+            )
+            
+            # Одна задача собирает все сработавшие подписки в пакет
+            self.scheduler.add_job(
+                func=self.flush_pending,
+                trigger='interval',
+                seconds=NOTIFICATION_BATCH_SECONDS,
+                id='flush_pending',
+                replace_existing=True
+            )
+            
+            if self.shards is not None:
+                # Воркер: аренда шардов и подписки, добавленные ботом в общее хранилище
+                self.scheduler.add_job(
+                    func=self.renew_shards,
+                    trigger='interval',
+                    seconds=self.shards.lease_seconds / 3,
+                    id='shard_leases',
+                    replace_existing=True
+                )
+                self.scheduler.add_job(
+                    func=self.sync_user_data,
+                    trigger='interval',
+                    seconds=WORKER_SYNC_SECONDS,
+                    id='sync_user_data',
+                    replace_existing=True
+                )
+            
+            # Восстанавливаем подписки всех пользователей: каждая встает в слот своей фазы, а не в текущий такт
+            for user_id, coin_id, interval in self.state.iter_notifications():
+                self.wheel.add((user_id, coin_id), interval)
     
     def stop_scheduler(self):
         """Останавливает планировщик"""
         if self.scheduler.running:
             self.scheduler.shutdown()
+        if self.shards is not None:
+            self.shards.release_all()
 
 # Глобальная переменная для менеджера уведомлений
 notification_manager = None
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Tuple
+from crypto_api import crypto_api
+from quota import PRIORITY_PREFETCH, upstream_priority
+from config import CACHE_TTL, PREFETCH_HOT_RATE, PREFETCH_MAX_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Доля TTL, после которой горячий экран обновляется заранее
+REFRESH_AHEAD = 0.8
+
+class PrefetchEngine:
+    """Фоновое обновление данных экранов: частота подстраивается под популярность экрана"""
+
+    def __init__(self, views: Dict[str, Tuple[str, tuple]],
+                 hot_rate: float = PREFETCH_HOT_RATE,
+                 max_interval: float = PREFETCH_MAX_INTERVAL):
+        self.views = views  # {view: (эндпоинт кэша, аргументы)}
+        self.hot_rate = hot_rate
+        self.max_interval = max_interval
+        self._hits = {view: 0 for view in views}
+        self._rates = {view: hot_rate for view in views}  # на старте все экраны считаются горячими
+        self._measured_at = {view: time.monotonic() for view in views}
+        self._tasks: List[asyncio.Task] = []
+        self.refreshes = 0
+
+    def record_hit(self, view: str):
+        """Отмечает запрос экрана пользователем"""
+        if view in self._hits:
+            self._hits[view] += 1
+
+    def interval_for(self, view: str) -> float:
+        """Период обновления: чуть меньше TTL для горячих экранов, реже - для редких"""
+        endpoint, _ = self.views[view]
+        base = max(1.0, CACHE_TTL.get(endpoint, 60) * REFRESH_AHEAD)
+        rate = self._rates[view]
+        if rate >= self.hot_rate:
+            return base
+        return min(self.max_interval, max(base, base * self.hot_rate / max(rate, 1e-6)))
+
+    def _update_rate(self, view: str):
+        """Сглаженная (EWMA) частота запросов экрана"""
+        now = time.monotonic()
+        elapsed = max(now - self._measured_at[view], 1e-6)
+        rate = self._hits[view] / elapsed
+        self._rates[view] = 0.5 * self._rates[view] + 0.5 * rate
+        self._hits[view] = 0
+        self._measured_at[view] = now
+
+    async def start(self):
+        """Запускает фоновые задачи обновления"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run(view)) for view in self.views]
+
+    async def stop(self):
+        """Останавливает фоновые задачи"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, view: str):
+        endpoint, args = self.views[view]
+        while True:
+            try:
+                with upstream_priority(PRIORITY_PREFETCH):
+                    await crypto_api.refresh(endpoint, *args)
+                self.refreshes += 1
+            except Exception as e:
+                logger.error(f"Prefetch of {view} failed: {e}")
+            await asyncio.sleep(self.interval_for(view))
+            self._update_rate(view)
+
+    def get_stats(self) -> Dict:
+        """Возвращает частоту запросов и текущий период обновления по экранам"""
+        return {
+            view: {'rate': round(self._rates[view], 4), 'interval': round(self.interval_for(view), 1)}
+            for view in self.views
+        }
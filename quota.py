@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from config import UPSTREAM_QUOTA_BURST, UPSTREAM_QUOTA_RESERVES, UPSTREAM_QUOTA_MAX_WAIT
+from metrics import registry
+
+# Классы приоритета запросов к API: интерактивные важнее уведомлений, уведомления важнее фонового обновления
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NOTIFICATION = 1
+PRIORITY_PREFETCH = 2
+CLASSES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_NOTIFICATION: 'notification', PRIORITY_PREFETCH: 'prefetch'}
+
+QUOTA_DECISIONS = registry.counter(
+    'cryptobot_upstream_quota_total', 'Upstream quota decisions by host, priority class and result',
+    ['host', 'class', 'result'])
+QUOTA_REMAINING = registry.gauge(
+    'cryptobot_upstream_quota_remaining', 'Upstream requests that can be made right now without waiting', ['host'])
+
+# Приоритет текущей задачи; asyncio копирует контекст в дочерние задачи, поэтому запросы его наследуют
+_priority = contextvars.ContextVar('upstream_priority', default=PRIORITY_INTERACTIVE)
+
+def current_priority() -> int:
+    """Класс приоритета, с которым сейчас выполняются запросы к API"""
+    return _priority.get()
+
+@contextmanager
+def upstream_priority(priority: int):
+    """Выполняет блок with с заданным классом приоритета запросов к API"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class QuotaBudget:
+    """Бюджет запросов к хосту: классы ниже по приоритету не трогают запас, оставленный более важным"""
+
+    def __init__(self, host: str, per_minute: float, burst: float = UPSTREAM_QUOTA_BURST,
+                 reserves: Dict[str, float] = UPSTREAM_QUOTA_RESERVES,
+                 max_wait: Dict[str, float] = UPSTREAM_QUOTA_MAX_WAIT):
+        self.host = host
+        # Запас и пополнение за минуту вместе не превышают per_minute ни в каком окне в 60 секунд
+        self.capacity = max(1.0, per_minute * burst)
+        self.rate = max(per_minute - self.capacity, 1.0) / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.reserves = {name: self.capacity * share for name, share in reserves.items()}
+        self.max_wait = max_wait
+        self.stats = {name: {'granted': 0, 'deferred': 0, 'denied': 0} for name in CLASSES.values()}
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def remaining(self) -> float:
+        """Сколько запросов можно сделать сейчас без ожидания"""
+        self._refill(time.monotonic())
+        return self.tokens
+
+    def delay(self, priority: int) -> float:
+        """Сколько секунд классу ждать, пока над его резервом появится токен"""
+        self._refill(time.monotonic())
+        shortage = self.reserves.get(CLASSES[priority], 0) + 1 - self.tokens
+        return shortage / self.rate if shortage > 0 else 0.0
+
+    async def acquire(self, priority: Optional[int] = None) -> bool:
+        """Забирает токен; ждет не дольше лимита своего класса, иначе отказывает"""
+        if priority is None:
+            priority = current_priority()
+        name = CLASSES[priority]
+        deadline = time.monotonic() + self.max_wait.get(name, 0)
+        deferred = False
+        while True:
+            delay = self.delay(priority)
+            if delay == 0:
+                self.tokens -= 1
+                self._record(name, 'granted')
+                return True
+            if time.monotonic() + delay > deadline:
+                self._record(name, 'denied')
+                return False
+            if not deferred:
+                deferred = True
+                self._record(name, 'deferred')
+            # После ожидания токен мог забрать другой запрос, поэтому проверка повторяется
+            await asyncio.sleep(delay)
+
+    def _record(self, name: str, result: str):
+        self.stats[name][result] += 1
+        QUOTA_DECISIONS.inc(self.host, name, result)
+
+    def get_stats(self) -> Dict:
+        """Возвращает остаток бюджета и решения по классам"""
+        return dict(self.stats, remaining=round(self.remaining(), 2), capacity=self.capacity,
+                    per_minute=round((self.capacity + self.rate * 60), 2))
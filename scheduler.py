@@ -0,0 +1,138 @@
+import hashlib
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+from config import TIME_INTERVALS, SCHEDULER_TICK_SECONDS, SCHEDULER_PHASE_SPREAD, SCHEDULER_JITTER_SECONDS
+
+def phase_for(key: Hashable, period: int) -> int:
+    """Детерминированная фаза подписки в периоде по хэшу user_id (одна и та же после перезапуска и в любом процессе)"""
+    user_id = key[0] if isinstance(key, tuple) else key
+    # Не crc32, как у shard_for: иначе фазы подписок одного шарда совпадали бы по модулю числа шардов
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8, person=b'phase').digest()
+    return int.from_bytes(digest, 'little') % period
+
+def jitter_for(key: Hashable, limit: int) -> int:
+    """Детерминированный сдвиг подписки в тактах от 0 до limit по хэшу всего ключа (свой у каждой монеты)"""
+    data = '/'.join(map(str, key)) if isinstance(key, tuple) else str(key)
+    digest = hashlib.blake2b(data.encode(), digest_size=8, person=b'jitter').digest()
+    return int.from_bytes(digest, 'little') % (limit + 1)
+
+class TimingWheel:
+    """Колесо таймеров: подписки разложены по слотам своего интервала, один проход на такт"""
+
+    def __init__(self, intervals: Dict[str, int] = TIME_INTERVALS,
+                 tick_seconds: int = SCHEDULER_TICK_SECONDS, spread: bool = SCHEDULER_PHASE_SPREAD,
+                 jitter_seconds: int = SCHEDULER_JITTER_SECONDS):
+        self.tick_seconds = tick_seconds
+        self.spread = spread
+        self.jitter_ticks = max(0, jitter_seconds // tick_seconds)
+        # Период каждого интервала в тактах (интервалы заданы в минутах)
+        self.periods = {
+            interval: max(1, minutes * 60 // tick_seconds)
+            for interval, minutes in intervals.items()
+        }
+        # {interval: {slot: {key, ...}}} - пустые слоты не хранятся
+        self._slots: Dict[str, Dict[int, set]] = {interval: {} for interval in intervals}
+        # {key: (interval, slot)} - для удаления за O(1)
+        self._index: Dict[Hashable, Tuple[str, int]] = {}
+        self._last_tick: Optional[int] = None
+        # Отставание последнего advance(): сколько секунд назад начался самый ранний обработанный такт
+        self.last_lag = 0.0
+        # Сколько тактов обработал последний advance() (0 - новых тактов не было, last_lag не обновлялся)
+        self.last_ticks = 0
+
+    def _tick_at(self, now: Optional[float] = None) -> int:
+        """Номер такта для момента времени (по умолчанию - текущего)"""
+        return int((time.time() if now is None else now) // self.tick_seconds)
+
+    def add(self, key: Hashable, interval: str, now: Optional[float] = None):
+        """Добавляет подписку в слот ее фазы; первое срабатывание - не позже чем через интервал"""
+        self.remove(key)
+        period = self.periods[interval]
+        if self.spread:
+            # Подписки, восстановленные при старте, не собираются в одном слоте
+            slot = phase_for(key, period)
+        else:
+            # Привязка к последнему обработанному такту: первое срабатывание через полный интервал
+            tick = self._tick_at(now)
+            slot = tick if self._last_tick is None else min(tick, self._last_tick)
+        if self.jitter_ticks:
+            slot += jitter_for(key, min(self.jitter_ticks, period - 1))
+        slot %= period
+        self._slots[interval].setdefault(slot, set()).add(key)
+        self._index[key] = (interval, slot)
+
+    def remove(self, key: Hashable) -> bool:
+        """Удаляет подписку, если она есть"""
+        position = self._index.pop(key, None)
+        if position is None:
+            return False
+        interval, slot = position
+        bucket = self._slots[interval][slot]
+        bucket.discard(key)
+        if not bucket:
+            del self._slots[interval][slot]
+        return True
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Продвигает колесо до текущего такта и возвращает подписки, которые должны сработать"""
+        if now is None:
+            now = time.time()
+        tick = self._tick_at(now)
+        self.last_ticks = 0
+        if self._last_tick is None:
+            # Первый такт только запоминается: подписки этого слота уже отсчитывают полный интервал
+            self._last_tick = tick
+            return []
+        if tick <= self._last_tick:
+            return []
+        # Пропущенные такты (например, при задержке цикла) обрабатываются, но не дольше одного периода
+        longest = max(self.periods.values())
+        first = max(self._last_tick + 1, tick - longest + 1)
+        self.last_lag = now - first * self.tick_seconds
+        self.last_ticks = tick - first + 1
+
+        due = []
+        for current in range(first, tick + 1):
+            for interval, period in self.periods.items():
+                bucket = self._slots[interval].get(current % period)
+                if bucket:
+                    due.extend(bucket)
+        self._last_tick = tick
+        return due
+
+    def load_profile(self) -> List[int]:
+        """Число срабатываний в каждом такте самого длинного периода (такты считаются от его начала)"""
+        longest = max(self.periods.values())
+        profile = [0] * longest
+        for interval, period in self.periods.items():
+            for slot, bucket in self._slots[interval].items():
+                for tick in range(slot, longest, period):
+                    profile[tick] += len(bucket)
+        return profile
+
+    def load_stats(self) -> Dict:
+        """Пиковая и средняя нагрузка (срабатываний за такт): при равномерной фазе пик близок к среднему"""
+        profile = self.load_profile()
+        peak = max(profile)
+        mean = sum(profile) / len(profile)
+        return {
+            'tick_seconds': self.tick_seconds,
+            'peak': peak,
+            'mean': mean,
+            'peak_to_mean': peak / mean if mean else 0.0,
+            'idle_ticks': profile.count(0)
+        }
+
+    def get_stats(self) -> Dict:
+        """Возвращает число подписок, занятых слотов по интервалам и нагрузку по тактам"""
+        return {
+            'subscriptions': len(self._index),
+            'slots': {interval: len(slots) for interval, slots in self._slots.items()},
+            'load': self.load_stats()
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
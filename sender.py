@@ -0,0 +1,235 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from telegram.error import RetryAfter
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST,
+    TELEGRAM_SEND_WORKERS, TELEGRAM_MAX_RETRIES
+)
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: ответы на действия пользователя обгоняют массовые уведомления
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+LANES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+SEND_LATENCY = registry.histogram(
+    'cryptobot_telegram_send_seconds', 'Time from enqueue to successful Bot API call', ['lane'])
+SEND_RESULTS = registry.counter(
+    'cryptobot_telegram_send_total', 'Bot API calls by outcome', ['lane', 'result'])
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Сколько секунд ждать до появления токена"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        """Забирает один токен (вызывать после delay() == 0)"""
+        self.tokens -= 1
+
+    def is_idle(self) -> bool:
+        """Ведро полное - его можно выбросить и создать заново без потери лимита"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+class _Job:
+    __slots__ = ('chat_id', 'call', 'future', 'enqueued_at', 'attempts')
+
+    def __init__(self, chat_id: Hashable, call: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+class OutboundQueue:
+    """Очередь исходящих запросов к Telegram с глобальным и per-chat лимитами"""
+
+    def __init__(self, workers: int = TELEGRAM_SEND_WORKERS,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_rate: float = TELEGRAM_CHAT_RATE,
+                 chat_burst: float = TELEGRAM_CHAT_BURST,
+                 max_retries: int = TELEGRAM_MAX_RETRIES):
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[Hashable, TokenBucket] = {}
+        # Задания чатов с пустым ведром ждут здесь, а не в воркере: {chat_id: deque[(priority, seq, job)]}
+        self._parked: Dict[Hashable, deque] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._depth = {PRIORITY_INTERACTIVE: 0, PRIORITY_BULK: 0}
+        self._latencies = deque(maxlen=1000)
+        self._stats = {'sent': 0, 'failed': 0, 'retry_after': 0, 'deferred': 0}
+
+    def set_global_rate(self, rate: float):
+        """Меняет глобальный лимит (например, делит его между процессами-воркерами)"""
+        self._global_bucket = TokenBucket(rate, max(rate, 1))
+
+    async def start(self):
+        """Запускает пул воркеров"""
+        self._ensure_workers()
+
+    async def stop(self):
+        """Останавливает воркеров; неотправленные задания отменяются"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, _, job = self._queue.get_nowait()
+                job.future.cancel()
+        for parked in self._parked.values():
+            for _, _, job in parked:
+                job.future.cancel()
+        self._parked = {}
+        self._queue = None
+        self._depth = {PRIORITY_INTERACTIVE: 0, PRIORITY_BULK: 0}
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, chat_id: Hashable, call: Callable[[], Awaitable[Any]],
+               priority: int = PRIORITY_BULK) -> asyncio.Future:
+        """Ставит вызов Bot API в очередь и возвращает future с его результатом"""
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        self._put(priority, _Job(chat_id, call, future))
+        return future
+
+    def _put(self, priority: int, job: _Job):
+        self._depth[priority] += 1
+        self._queue.put_nowait((priority, next(self._sequence), job))
+
+    async def _worker(self):
+        while True:
+            priority, sequence, job = await self._queue.get()
+            self._depth[priority] -= 1
+            if job.future.done():
+                continue
+            if not await self._wait_for_capacity(priority, sequence, job):
+                continue
+            job.attempts += 1
+            try:
+                result = await job.call()
+            except RetryAfter as e:
+                self._stats['retry_after'] += 1
+                SEND_RESULTS.inc(LANES[priority], 'retry_after')
+                retry_after = float(e.retry_after)
+                logger.warning(f"Telegram flood control: retry after {retry_after}s (chat {job.chat_id})")
+                # Telegram просит подождать - притормаживаем всю очередь, а не только этот чат
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if job.attempts <= self.max_retries:
+                    self._put(priority, job)
+                else:
+                    self._stats['failed'] += 1
+                    SEND_RESULTS.inc(LANES[priority], 'failed')
+                    job.future.set_exception(e)
+            except Exception as e:
+                self._stats['failed'] += 1
+                SEND_RESULTS.inc(LANES[priority], 'failed')
+                job.future.set_exception(e)
+            else:
+                latency = time.monotonic() - job.enqueued_at
+                self._stats['sent'] += 1
+                self._latencies.append(latency)
+                SEND_LATENCY.observe(latency, LANES[priority])
+                SEND_RESULTS.inc(LANES[priority], 'sent')
+                job.future.set_result(result)
+
+    async def _wait_for_capacity(self, priority: int, sequence: int, job: _Job) -> bool:
+        """Ждет глобального лимита; если лимит чата исчерпан, откладывает задание и возвращает False"""
+        chat_id = job.chat_id
+        parked = self._parked.get(chat_id)
+        if parked is not None:
+            # У чата уже есть отложенные задания - встаем за ними, сохраняя порядок
+            parked.append((priority, sequence, job))
+            self._depth[priority] += 1
+            return False
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._prune_chat_buckets()
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        while True:
+            now = time.monotonic()
+            chat_delay = bucket.delay(now)
+            if chat_delay > 0:
+                # Воркер не спит за один чат: задание вернется в очередь, когда в ведре появится токен
+                self._parked[chat_id] = deque([(priority, sequence, job)])
+                self._depth[priority] += 1
+                self._stats['deferred'] += 1
+                asyncio.get_running_loop().call_later(chat_delay, self._unpark, chat_id)
+                return False
+            delay = max(self._paused_until - now, self._global_bucket.delay(now))
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self._global_bucket.consume()
+        bucket.consume()
+        return True
+
+    def _unpark(self, chat_id: Hashable):
+        """Возвращает отложенные задания чата в очередь с прежними приоритетом и порядком"""
+        parked = self._parked.pop(chat_id, None)
+        if parked is None or self._queue is None:
+            return
+        for entry in parked:
+            self._queue.put_nowait(entry)
+
+    def _prune_chat_buckets(self):
+        """Удаляет полные (неактивные) ведра чатов"""
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_idle()]:
+            del self._chat_buckets[chat_id]
+
+    def get_stats(self) -> Dict:
+        """Возвращает глубину очереди по приоритетам и задержку отправки"""
+        latencies = sorted(self._latencies)
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+        return dict(
+            self._stats,
+            depth_interactive=self._depth[PRIORITY_INTERACTIVE],
+            depth_bulk=self._depth[PRIORITY_BULK],
+            latency_p50=percentile(0.5),
+            latency_p99=percentile(0.99),
+            latency_max=latencies[-1] if latencies else 0.0,
+            workers=len(self._workers)
+        )
+
+# Создаем глобальную очередь исходящих сообщений
+outbound_queue = OutboundQueue()
+
+# Глубина очереди по приоритетам в метриках
+_depth_gauge = registry.gauge('cryptobot_outbound_queue_depth', 'Pending Bot API calls', ['lane'])
+for _priority, _lane in LANES.items():
+    _depth_gauge.set_function(lambda priority=_priority: outbound_queue._depth[priority], _lane)
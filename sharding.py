@@ -0,0 +1,113 @@
+import math
+import os
+import socket
+import sqlite3
+import time
+import zlib
+from typing import Dict, Optional, Set
+from config import USER_DB_PATH, NOTIFICATION_SHARDS, SHARD_LEASE_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shard_leases (
+    shard_id INTEGER PRIMARY KEY,
+    owner TEXT,
+    expires_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+def shard_for(user_id: int, shard_count: int = NOTIFICATION_SHARDS) -> int:
+    """Номер шарда пользователя (стабилен между процессами и перезапусками)"""
+    return zlib.crc32(str(user_id).encode()) % shard_count
+
+class ShardLeaseManager:
+    """Аренда шардов подписок через SQLite: каждый шард принадлежит не более чем одному живому воркеру"""
+
+    def __init__(self, path: str = USER_DB_PATH, shard_count: int = NOTIFICATION_SHARDS,
+                 lease_seconds: float = SHARD_LEASE_SECONDS, worker_id: Optional[str] = None):
+        self.path = path
+        self.shard_count = shard_count
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        # {shard_id: момент истечения аренды} - шарды, которыми воркер владеет сейчас
+        self._leases: Dict[int, float] = {}
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executescript(SCHEMA)
+                conn.executemany('INSERT OR IGNORE INTO shard_leases (shard_id) VALUES (?)',
+                                 ((shard_id,) for shard_id in range(shard_count)))
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.lease_seconds, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def heartbeat(self) -> Set[int]:
+        """Продлевает аренду, забирает свободные шарды и отдает лишние; возвращает свои шарды"""
+        conn = self._connect()
+        try:
+            now = time.time()
+            expires_at = now + self.lease_seconds
+            # BEGIN IMMEDIATE: распределение шардов меняет только один воркер за раз
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT OR REPLACE INTO workers VALUES (?, ?)', (self.worker_id, now))
+            conn.execute('DELETE FROM workers WHERE heartbeat < ?', (now - self.lease_seconds,))
+            live_workers = conn.execute('SELECT COUNT(*) FROM workers').fetchone()[0]
+            target = math.ceil(self.shard_count / max(live_workers, 1))
+
+            owned = [row[0] for row in conn.execute(
+                'SELECT shard_id FROM shard_leases WHERE owner = ? AND expires_at >= ? ORDER BY shard_id',
+                (self.worker_id, now))]
+            # Появились новые воркеры - отдаем лишние шарды
+            released = owned[target:]
+            owned = owned[:target]
+            conn.executemany('UPDATE shard_leases SET owner = NULL, expires_at = 0 WHERE shard_id = ?',
+                             ((shard_id,) for shard_id in released))
+            # Не хватает - забираем свободные и просроченные (их владелец умер)
+            if len(owned) < target:
+                free = [row[0] for row in conn.execute(
+                    'SELECT shard_id FROM shard_leases WHERE owner IS NULL OR expires_at < ? '
+                    'ORDER BY shard_id LIMIT ?', (now, target - len(owned)))]
+                owned.extend(free)
+            conn.executemany('UPDATE shard_leases SET owner = ?, expires_at = ? WHERE shard_id = ?',
+                             ((self.worker_id, expires_at, shard_id) for shard_id in owned))
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        self._leases = {shard_id: expires_at for shard_id in owned}
+        return set(owned)
+
+    def release_all(self):
+        """Отдает все шарды (при штатной остановке), чтобы их сразу подхватили другие воркеры"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('UPDATE shard_leases SET owner = NULL, expires_at = 0 WHERE owner = ?',
+                         (self.worker_id,))
+            conn.execute('DELETE FROM workers WHERE worker_id = ?', (self.worker_id,))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        self._leases = {}
+
+    def owns(self, user_id: int) -> bool:
+        """Должен ли этот воркер отправлять уведомления пользователю прямо сейчас"""
+        expires_at = self._leases.get(shard_for(user_id, self.shard_count))
+        # Истекшую локально аренду не используем: шард мог уже перейти к другому воркеру
+        return expires_at is not None and time.time() < expires_at
+
+    def owned_shards(self) -> Set[int]:
+        """Шарды с действующей арендой"""
+        now = time.time()
+        return {shard_id for shard_id, expires_at in self._leases.items() if now < expires_at}
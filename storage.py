@@ -0,0 +1,320 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from config import USER_DB_PATH, USER_DB_FLUSH_SECONDS, COIN_ID_ALIASES, USER_CHANGE_LOG_SECONDS
+
+# Сколько изменений копится до внеочередной записи
+FLUSH_THRESHOLD = 1000
+# Версия данных (PRAGMA user_version): 1 - id монет переведены на id CoinGecko
+DATA_VERSION = 1
+# Как часто обрезается журнал изменений (секунды)
+CHANGE_LOG_PRUNE_SECONDS = 60
+# Сколько id пользователей подставляется в один запрос IN (...)
+QUERY_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS languages (
+    user_id INTEGER PRIMARY KEY,
+    language TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notifications (
+    user_id INTEGER NOT NULL,
+    coin_id TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    PRIMARY KEY (user_id, coin_id)
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    alert_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    coin_id TEXT NOT NULL,
+    level REAL NOT NULL,
+    flags INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS move_alerts (
+    move_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    coin_id TEXT NOT NULL,
+    window TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    base_at REAL NOT NULL,
+    base_price REAL
+);
+CREATE TABLE IF NOT EXISTS user_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    changed_at REAL NOT NULL
+);
+"""
+
+class UserStore:
+    """Хранилище данных пользователей в SQLite (WAL) с отложенной пакетной записью"""
+
+    def __init__(self, path: str = USER_DB_PATH, flush_interval: float = USER_DB_FLUSH_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._pending_languages: Dict[int, str] = {}
+        # {(user_id, coin_id): interval}; None означает удаление подписки
+        self._pending_notifications: Dict[Tuple[int, str], Optional[str]] = {}
+        # {alert_id: (user_id, coin_id, уровень, флаги)}; None означает удаление алерта
+        self._pending_alerts: Dict[int, Optional[Tuple[int, str, float, int]]] = {}
+        # {move_id: (user_id, coin_id, окно, порог %, время базы, цена базы)}; None означает удаление
+        self._pending_moves: Dict[int, Optional[Tuple[int, str, str, float, float, Optional[float]]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._pruned_at = 0.0
+        self.writes = 0
+
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+            self._upgrade(conn)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _upgrade(self, conn: sqlite3.Connection):
+        """Однократно переносит подписки и алерты с прежних id монет (COIN_ID_ALIASES) на верные"""
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= DATA_VERSION:
+            return
+        with conn:
+            for old_id, coin_id in COIN_ID_ALIASES.items():
+                # Если подписка на верный id уже есть, она заменяется подпиской со старым id
+                conn.execute('UPDATE OR REPLACE notifications SET coin_id = ? WHERE coin_id = ?', (coin_id, old_id))
+                conn.execute('UPDATE alerts SET coin_id = ? WHERE coin_id = ?', (coin_id, old_id))
+                conn.execute('UPDATE move_alerts SET coin_id = ? WHERE coin_id = ?', (coin_id, old_id))
+            conn.execute(f'PRAGMA user_version = {DATA_VERSION}')
+
+    def migrate_from_json(self, json_path: str) -> bool:
+        """Однократно переносит данные из старого user_data.json"""
+        if not os.path.exists(json_path):
+            return False
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        languages = [(int(user_id), language) for user_id, language in data.get('languages', {}).items()]
+        notifications = [
+            (int(user_id), COIN_ID_ALIASES.get(coin_id, coin_id), interval)
+            for user_id, coins in data.get('notifications', {}).items()
+            for coin_id, interval in coins.items()
+        ]
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany('INSERT OR IGNORE INTO languages VALUES (?, ?)', languages)
+                conn.executemany('INSERT OR IGNORE INTO notifications VALUES (?, ?, ?)', notifications)
+        finally:
+            conn.close()
+        # Переименовываем файл, чтобы миграция не повторялась при следующем запуске
+        try:
+            os.replace(json_path, json_path + '.migrated')
+        except FileNotFoundError:
+            # Файл уже перенес другой процесс; вставки выше идемпотентны
+            return False
+        print(f"Migrated {len(languages)} languages and {len(notifications)} notifications from {json_path}")
+        return True
+
+    def load(self) -> Tuple[Dict[int, str], Dict[int, Dict[str, str]]]:
+        """Загружает языки и подписки всех пользователей"""
+        conn = self._connect()
+        try:
+            languages = dict(conn.execute('SELECT user_id, language FROM languages'))
+            notifications: Dict[int, Dict[str, str]] = {}
+            for user_id, coin_id, interval in conn.execute(
+                    'SELECT user_id, coin_id, interval FROM notifications'):
+                notifications.setdefault(user_id, {})[coin_id] = interval
+        finally:
+            conn.close()
+        return languages, notifications
+
+    def change_cursor(self) -> int:
+        """Номер последней записи журнала изменений (читать до полной загрузки)"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'user_changes'").fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def load_changes(self, cursor: int) -> Optional[Tuple[int, Set[int], Dict[int, str], Dict[int, Dict[str, str]]]]:
+        """Изменения после cursor: (новый cursor, id пользователей, их языки и подписки); None - журнал обрезан"""
+        conn = self._connect()
+        try:
+            oldest = conn.execute('SELECT MIN(seq) FROM user_changes').fetchone()[0]
+            if oldest is not None and oldest > cursor + 1:
+                return None
+            rows = conn.execute('SELECT seq, user_id FROM user_changes WHERE seq > ?', (cursor,)).fetchall()
+            user_ids = {user_id for _, user_id in rows}
+            cursor = max((seq for seq, _ in rows), default=cursor)
+            languages: Dict[int, str] = {}
+            notifications: Dict[int, Dict[str, str]] = {}
+            ordered = sorted(user_ids)
+            for start in range(0, len(ordered), QUERY_CHUNK):
+                chunk = ordered[start:start + QUERY_CHUNK]
+                marks = ','.join('?' * len(chunk))
+                languages.update(conn.execute(
+                    f'SELECT user_id, language FROM languages WHERE user_id IN ({marks})', chunk))
+                for user_id, coin_id, interval in conn.execute(
+                        f'SELECT user_id, coin_id, interval FROM notifications WHERE user_id IN ({marks})', chunk):
+                    notifications.setdefault(user_id, {})[coin_id] = interval
+        finally:
+            conn.close()
+        return cursor, user_ids, languages, notifications
+
+    def load_alerts(self) -> List[Tuple[int, int, str, float, int]]:
+        """Загружает ценовые алерты как (alert_id, user_id, coin_id, уровень, флаги)"""
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT alert_id, user_id, coin_id, level, flags FROM alerts').fetchall()
+        finally:
+            conn.close()
+
+    def load_move_alerts(self) -> List[Tuple[int, int, str, str, float, float, Optional[float]]]:
+        """Загружает алерты движения цены как (move_id, user_id, coin_id, окно, порог %, время и цена базы)"""
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT move_id, user_id, coin_id, window, threshold, base_at, base_price '
+                                'FROM move_alerts').fetchall()
+        finally:
+            conn.close()
+
+    def start(self):
+        """Запускает фоновый поток записи"""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='user-store-writer', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Останавливает поток записи и сбрасывает все накопленные изменения"""
+        if self._thread is not None:
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def set_language(self, user_id: int, language: str):
+        """Запоминает язык пользователя для ближайшей записи"""
+        with self._lock:
+            self._pending_languages[user_id] = language
+        self._changed()
+
+    def set_notification(self, user_id: int, coin_id: str, interval: str):
+        """Запоминает подписку для ближайшей записи"""
+        with self._lock:
+            self._pending_notifications[(user_id, coin_id)] = interval
+        self._changed()
+
+    def delete_notification(self, user_id: int, coin_id: str):
+        """Запоминает удаление подписки для ближайшей записи"""
+        with self._lock:
+            self._pending_notifications[(user_id, coin_id)] = None
+        self._changed()
+
+    def set_alert(self, alert_id: int, user_id: int, coin_id: str, level: float, flags: int):
+        """Запоминает алерт для ближайшей записи"""
+        with self._lock:
+            self._pending_alerts[alert_id] = (user_id, coin_id, level, flags)
+        self._changed()
+
+    def delete_alert(self, alert_id: int):
+        """Запоминает удаление алерта для ближайшей записи"""
+        with self._lock:
+            self._pending_alerts[alert_id] = None
+        self._changed()
+
+    def set_move_alert(self, move_id: int, user_id: int, coin_id: str, window: str, threshold: float,
+                       base_at: float, base_price: Optional[float]):
+        """Запоминает алерт движения цены для ближайшей записи"""
+        with self._lock:
+            self._pending_moves[move_id] = (user_id, coin_id, window, threshold, base_at, base_price)
+        self._changed()
+
+    def delete_move_alert(self, move_id: int):
+        """Запоминает удаление алерта движения цены для ближайшей записи"""
+        with self._lock:
+            self._pending_moves[move_id] = None
+        self._changed()
+
+    def _changed(self):
+        pending = (len(self._pending_languages) + len(self._pending_notifications) + len(self._pending_alerts)
+                   + len(self._pending_moves))
+        if pending >= FLUSH_THRESHOLD:
+            self._wakeup.set()
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while not self._stopped.is_set():
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                self._flush(conn)
+        finally:
+            conn.close()
+
+    def flush(self):
+        """Синхронно записывает накопленные изменения"""
+        conn = self._connect()
+        try:
+            self._flush(conn)
+        finally:
+            conn.close()
+
+    def _flush(self, conn: sqlite3.Connection):
+        with self._lock:
+            languages, self._pending_languages = self._pending_languages, {}
+            notifications, self._pending_notifications = self._pending_notifications, {}
+            alerts, self._pending_alerts = self._pending_alerts, {}
+            moves, self._pending_moves = self._pending_moves, {}
+        if not languages and not notifications and not alerts and not moves:
+            return
+        upserts = [(user_id, coin_id, interval)
+                   for (user_id, coin_id), interval in notifications.items() if interval is not None]
+        deletes = [(user_id, coin_id)
+                   for (user_id, coin_id), interval in notifications.items() if interval is None]
+        try:
+            # Одна транзакция на пакет: либо записан весь пакет, либо ничего
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO languages VALUES (?, ?)', languages.items())
+                conn.executemany('INSERT OR REPLACE INTO notifications VALUES (?, ?, ?)', upserts)
+                conn.executemany('DELETE FROM notifications WHERE user_id = ? AND coin_id = ?', deletes)
+                conn.executemany('INSERT OR REPLACE INTO alerts VALUES (?, ?, ?, ?, ?)',
+                                 [(alert_id,) + row for alert_id, row in alerts.items() if row is not None])
+                conn.executemany('DELETE FROM alerts WHERE alert_id = ?',
+                                 [(alert_id,) for alert_id, row in alerts.items() if row is None])
+                conn.executemany('INSERT OR REPLACE INTO move_alerts VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 [(move_id,) + row for move_id, row in moves.items() if row is not None])
+                conn.executemany('DELETE FROM move_alerts WHERE move_id = ?',
+                                 [(move_id,) for move_id, row in moves.items() if row is None])
+                # Журнал изменений: воркеры перечитывают только этих пользователей
+                now = time.time()
+                changed = set(languages) | {user_id for user_id, _ in notifications}
+                conn.executemany('INSERT INTO user_changes (user_id, changed_at) VALUES (?, ?)',
+                                 [(user_id, now) for user_id in changed])
+                if now - self._pruned_at >= CHANGE_LOG_PRUNE_SECONDS:
+                    self._pruned_at = now
+                    conn.execute('DELETE FROM user_changes WHERE seq < '
+                                 '(SELECT seq FROM user_changes WHERE changed_at >= ? ORDER BY seq LIMIT 1)',
+                                 (now - USER_CHANGE_LOG_SECONDS,))
+            self.writes += 1
+        except sqlite3.Error as e:
+            print(f"Error saving user data: {e}")
+            # Возвращаем изменения в очередь, не затирая более новые
+            with self._lock:
+                for user_id, language in languages.items():
+                    self._pending_languages.setdefault(user_id, language)
+                for key, interval in notifications.items():
+                    self._pending_notifications.setdefault(key, interval)
+                for alert_id, row in alerts.items():
+                    self._pending_alerts.setdefault(alert_id, row)
+                for move_id, row in moves.items():
+                    self._pending_moves.setdefault(move_id, row)
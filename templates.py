@@ -0,0 +1,304 @@
+import time
+from datetime import datetime
+from string import Formatter
+from typing import Callable, Dict, Tuple
+from config import LANGUAGES
+
+TIMESTAMP_FORMAT = '%d.%m.%Y %H:%M:%S'
+
+# Шаблоны экранов по языкам (новый язык - это только новый блок данных).
+# {updated} при компиляции заменяется строкой 'updated' языка, {items} - строками списка из ITEM_TEMPLATES
+VIEW_TEMPLATES = {
+    'ru': {
+        'updated': '⏰ <i>Обновлено: {timestamp}</i>',
+        'global_metrics': """\
+🌍 <b>Глобальная метрика крипторынка</b>
+
+💰 <b>Общая капитализация:</b> ${total_market_cap_usd:,.0f}
+💹 <b>Общий объем 24ч:</b> ${total_volume_24h_usd:,.0f}
+{change_emoji} <b>Изменение капитализации 24ч:</b> {change_sign}{market_cap_change_24h:.2f}%
+
+🪙 <b>Активные криптовалюты:</b> {active_cryptocurrencies:,}
+🏪 <b>Биржи:</b> {markets:,}
+
+📊 <b>Доминация:</b>
+• Bitcoin: {btc_dominance:.1f}%
+• Ethereum: {eth_dominance:.1f}%
+
+{updated}""",
+        'top_coins': '🏆 <b>Топ-10 криптовалют</b>\n\n{items}{updated}',
+        'binance_pairs': '💱 <b>Топ пары Binance (USDT)</b>\n\n{items}{updated}',
+        'fear_greed': """\
+😰 <b>Индекс страха и жадности</b>
+
+{emoji} <b>Значение:</b> {value}/100
+📊 <b>Статус:</b> {status}
+
+{updated}""",
+        'trends': '📈 <b>Трендовые монеты</b>\n\n{items}\n{updated}',
+        'defi_metrics': """\
+🔗 <b>DeFi Метрики</b>
+
+💰 <b>DeFi Капитализация:</b> ${defi_market_cap:,.0f}
+⚡ <b>ETH Капитализация:</b> ${eth_market_cap:,.0f}
+📊 <b>DeFi/ETH Отношение:</b> {defi_to_eth_ratio:.2f}%
+💹 <b>Объем торгов 24ч:</b> ${trading_volume_24h:,.0f}
+🏆 <b>DeFi Доминация:</b> {defi_dominance:.2f}%
+
+{updated}""",
+        'coin': """\
+🪙 <b>{name} ({symbol})</b>
+
+💰 <b>Цена:</b> ${current_price:,.2f}
+{change_emoji} <b>Изменение 24ч:</b> {change_sign}{price_change_24h:.2f}%
+📊 <b>Изменение 7д:</b> {price_change_7d:.2f}%
+🏆 <b>Ранг:</b> #{market_cap_rank}
+📈 <b>Рын. капитализация:</b> ${market_cap:,.0f}
+💹 <b>Объем 24ч:</b> ${volume_24h:,.0f}
+
+{updated}"""
+    },
+    'en': {
+        'updated': '⏰ <i>Updated: {timestamp}</i>',
+        'global_metrics': """\
+🌍 <b>Global Crypto Market Metrics</b>
+
+💰 <b>Total Market Cap:</b> ${total_market_cap_usd:,.0f}
+💹 <b>Total 24h Volume:</b> ${total_volume_24h_usd:,.0f}
+{change_emoji} <b>Market Cap Change 24h:</b> {change_sign}{market_cap_change_24h:.2f}%
+
+🪙 <b>Active Cryptocurrencies:</b> {active_cryptocurrencies:,}
+🏪 <b>Markets:</b> {markets:,}
+
+📊 <b>Dominance:</b>
+• Bitcoin: {btc_dominance:.1f}%
+• Ethereum: {eth_dominance:.1f}%
+
+{updated}""",
+        'top_coins': '🏆 <b>Top 10 Cryptocurrencies</b>\n\n{items}{updated}',
+        'binance_pairs': '💱 <b>Top Binance Pairs (USDT)</b>\n\n{items}{updated}',
+        'fear_greed': """\
+😰 <b>Fear & Greed Index</b>
+
+{emoji} <b>Value:</b> {value}/100
+📊 <b>Status:</b> {status}
+
+{updated}""",
+        'trends': '📈 <b>Trending Coins</b>\n\n{items}\n{updated}',
+        'defi_metrics': """\
+🔗 <b>DeFi Metrics</b>
+
+💰 <b>DeFi Market Cap:</b> ${defi_market_cap:,.0f}
+⚡ <b>ETH Market Cap:</b> ${eth_market_cap:,.0f}
+📊 <b>DeFi/ETH Ratio:</b> {defi_to_eth_ratio:.2f}%
+💹 <b>24h Trading Volume:</b> ${trading_volume_24h:,.0f}
+🏆 <b>DeFi Dominance:</b> {defi_dominance:.2f}%
+
+{updated}""",
+        'coin': """\
+🪙 <b>{name} ({symbol})</b>
+
+💰 <b>Price:</b> ${current_price:,.2f}
+{change_emoji} <b>24h Change:</b> {change_sign}{price_change_24h:.2f}%
+📊 <b>7d Change:</b> {price_change_7d:.2f}%
+🏆 <b>Rank:</b> #{market_cap_rank}
+📈 <b>Market Cap:</b> ${market_cap:,.0f}
+💹 <b>24h Volume:</b> ${volume_24h:,.0f}
+
+{updated}"""
+    },
+    'de': {
+        'updated': '⏰ <i>Aktualisiert: {timestamp}</i>',
+        'global_metrics': """\
+🌍 <b>Globale Krypto-Marktmetriken</b>
+
+💰 <b>Gesamte Marktkapitalisierung:</b> ${total_market_cap_usd:,.0f}
+💹 <b>Gesamtes 24h Volumen:</b> ${total_volume_24h_usd:,.0f}
+{change_emoji} <b>Marktkapitalisierung Änderung 24h:</b> {change_sign}{market_cap_change_24h:.2f}%
+
+🪙 <b>Aktive Kryptowährungen:</b> {active_cryptocurrencies:,}
+🏪 <b>Märkte:</b> {markets:,}
+
+📊 <b>Dominanz:</b>
+• Bitcoin: {btc_dominance:.1f}%
+• Ethereum: {eth_dominance:.1f}%
+
+{updated}""",
+        'top_coins': '🏆 <b>Top 10 Kryptowährungen</b>\n\n{items}{updated}',
+        'binance_pairs': '💱 <b>Top Binance-Paare (USDT)</b>\n\n{items}{updated}',
+        'fear_greed': """\
+😰 <b>Fear & Greed Index</b>
+
+{emoji} <b>Wert:</b> {value}/100
+📊 <b>Status:</b> {status}
+
+{updated}""",
+        'trends': '📈 <b>Trend-Münzen</b>\n\n{items}\n{updated}',
+        'defi_metrics': """\
+🔗 <b>DeFi-Metriken</b>
+
+💰 <b>DeFi-Marktkapitalisierung:</b> ${defi_market_cap:,.0f}
+⚡ <b>ETH-Marktkapitalisierung:</b> ${eth_market_cap:,.0f}
+📊 <b>DeFi/ETH-Verhältnis:</b> {defi_to_eth_ratio:.2f}%
+💹 <b>24h Handelsvolumen:</b> ${trading_volume_24h:,.0f}
+🏆 <b>DeFi-Dominanz:</b> {defi_dominance:.2f}%
+
+{updated}""",
+        'coin': """\
+🪙 <b>{name} ({symbol})</b>
+
+💰 <b>Preis:</b> ${current_price:,.2f}
+{change_emoji} <b>24h Änderung:</b> {change_sign}{price_change_24h:.2f}%
+📊 <b>7d Änderung:</b> {price_change_7d:.2f}%
+🏆 <b>Rang:</b> #{market_cap_rank}
+📈 <b>Marktkapitalisierung:</b> ${market_cap:,.0f}
+💹 <b>24h Volumen:</b> ${volume_24h:,.0f}
+
+{updated}"""
+    }
+}
+
+# Строки элементов списков; язык может переопределить их ключом '<экран>_item' в VIEW_TEMPLATES
+ITEM_TEMPLATES = {
+    'top_coins': """
+<b>{rank}. {name} ({symbol})</b>
+💰 ${price:,.2f} {change_emoji} {change_sign}{price_change_24h:.2f}%
+📈 Cap: ${market_cap:,.0f}
+
+""",
+    'binance_pairs': """
+<b>{index}. {symbol}</b>
+💰 ${price:,.4f} {change_emoji} {change_sign}{price_change_24h:.2f}%
+💹 24h Vol: ${volume_24h:,.0f}
+
+""",
+    'trends': '<b>{index}. {name} ({symbol})</b> - Rank: {rank_text}\n'
+}
+
+# Поля, которые вычисляет ViewTemplates (передаются именованными аргументами); остальные берутся из данных
+DERIVED_FIELDS = (
+    'change_emoji', 'change_sign', 'index', 'rank_text', 'btc_dominance', 'eth_dominance', 'items', 'timestamp'
+)
+
+def _fields(template: str) -> set:
+    """Имена полей шаблона"""
+    return {name for _, name, _, _ in Formatter().parse(template) if name}
+
+def _compile(template: str) -> Callable[..., str]:
+    """Превращает шаблон str.format в функцию с одной f-строкой (разбор шаблона - один раз, при старте)"""
+    parts = []
+    for literal, name, spec, conversion in Formatter().parse(template):
+        if literal:
+            parts.append(repr(literal))
+        if name is not None:
+            if not name.isidentifier():
+                raise ValueError(f"Unsupported template field: {name!r}")
+            value = name if name in DERIVED_FIELDS else f'd["{name}"]'
+            conversion = f'!{conversion}' if conversion else ''
+            spec = f':{spec}' if spec else ''
+            parts.append(f"f'{{{value}{conversion}{spec}}}'")
+    # Соседние литералы склеиваются компилятором в одну f-строку
+    params = ''.join(f', {name}=None' for name in DERIVED_FIELDS)
+    code = f"lambda d{params}: f'' {' '.join(parts)}"
+    return eval(compile(code, '<template>', 'eval'), {})
+
+def _trend(change: float) -> Tuple[str, str]:
+    """Эмодзи и знак изменения цены"""
+    return ('🟢', '+') if change > 0 else ('🔴', '')
+
+class ViewTemplates:
+    """Шаблоны экранов, один раз разобранные и проверенные для каждого языка"""
+
+    def __init__(self, templates: Dict[str, Dict[str, str]] = VIEW_TEMPLATES,
+                 items: Dict[str, str] = ITEM_TEMPLATES):
+        # {(экран, язык): скомпилированный шаблон}
+        self._views: Dict[Tuple[str, str], Callable[..., str]] = {}
+        self._items: Dict[Tuple[str, str], Callable[..., str]] = {}
+        self._timestamp_second = None
+        self._timestamp_text = ''
+        self._compile(templates, items)
+
+    def _compile(self, templates: Dict[str, Dict[str, str]], items: Dict[str, str]):
+        """Подставляет общие части и проверяет, что у всех языков одинаковый набор экранов и полей"""
+        reference = None
+        for language in LANGUAGES:
+            views = templates[language]
+            compiled = {
+                view: template.replace('{updated}', views['updated'])
+                for view, template in views.items() if view != 'updated' and not view.endswith('_item')
+            }
+            for view in items:
+                compiled[f'{view}_item'] = views.get(f'{view}_item', items[view])
+            fields = {view: _fields(template) for view, template in compiled.items()}
+            if reference is None:
+                reference = fields
+            elif fields != reference:
+                raise ValueError(f"Templates for language '{language}' do not match the other languages")
+            for view, template in compiled.items():
+                if view.endswith('_item'):
+                    self._items[(view[:-len('_item')], language)] = _compile(template)
+                else:
+                    self._views[(view, language)] = _compile(template)
+
+    def timestamp(self) -> str:
+        """Время для подписи "Обновлено" (strftime - не чаще раза в секунду)"""
+        second = int(time.time())
+        if second != self._timestamp_second:
+            self._timestamp_text = datetime.fromtimestamp(second).strftime(TIMESTAMP_FORMAT)
+            self._timestamp_second = second
+        return self._timestamp_text
+
+    def global_metrics(self, data: Dict, language: str) -> str:
+        """Глобальная метрика рынка"""
+        change_emoji, change_sign = _trend(data['market_cap_change_24h'])
+        return self._views[('global_metrics', language)](
+            data, change_emoji=change_emoji, change_sign=change_sign,
+            btc_dominance=data['market_cap_percentage'].get('btc', 0),
+            eth_dominance=data['market_cap_percentage'].get('eth', 0),
+            timestamp=self.timestamp()
+        )
+
+    def top_coins(self, coins, language: str) -> str:
+        """Топ монет по капитализации"""
+        item = self._items[('top_coins', language)]
+        rows = []
+        for coin in coins:
+            change_emoji, change_sign = _trend(coin['price_change_24h'])
+            rows.append(item(coin, change_emoji=change_emoji, change_sign=change_sign))
+        return self._views[('top_coins', language)](None, items=''.join(rows), timestamp=self.timestamp())
+
+    def binance_pairs(self, pairs, language: str) -> str:
+        """Топ пар Binance"""
+        item = self._items[('binance_pairs', language)]
+        rows = []
+        for index, pair in enumerate(pairs, 1):
+            change_emoji, change_sign = _trend(pair['price_change_24h'])
+            rows.append(item(pair, change_emoji=change_emoji, change_sign=change_sign, index=index))
+        return self._views[('binance_pairs', language)](None, items=''.join(rows), timestamp=self.timestamp())
+
+    def fear_greed(self, data: Dict, language: str) -> str:
+        """Индекс страха и жадности"""
+        return self._views[('fear_greed', language)](data, timestamp=self.timestamp())
+
+    def trends(self, trends, language: str) -> str:
+        """Трендовые монеты"""
+        item = self._items[('trends', language)]
+        rows = [
+            item(coin, index=index, rank_text=f"#{coin['market_cap_rank']}" if coin['market_cap_rank'] else "N/A")
+            for index, coin in enumerate(trends, 1)
+        ]
+        return self._views[('trends', language)](None, items=''.join(rows), timestamp=self.timestamp())
+
+    def defi_metrics(self, data: Dict, language: str) -> str:
+        """DeFi метрики"""
+        return self._views[('defi_metrics', language)](data, timestamp=self.timestamp())
+
+    def coin(self, coin_data: Dict, language: str) -> str:
+        """Сообщение о монете (уведомления)"""
+        change_emoji, change_sign = _trend(coin_data['price_change_24h'])
+        return self._views[('coin', language)](
+            coin_data, change_emoji=change_emoji, change_sign=change_sign, timestamp=self.timestamp()
+        )
+
+# Создаем глобальный набор шаблонов
+view_templates = ViewTemplates()
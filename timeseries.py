@@ -0,0 +1,209 @@
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+from config import PRICE_HISTORY_PATH, PRICE_HISTORY_MAX_COINS, PRICE_HISTORY_TIERS
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CVPH'
+FORMAT_VERSION = 1
+# Идентификаторы CoinGecko длиннее этого в историю не попадают
+ID_SIZE = 64
+# Значения точки: цена, объем за 24ч, капитализация (float32)
+FIELDS = ('price', 'volume', 'market_cap')
+WIDTH = len(FIELDS)
+
+PRICE_HISTORY_POINTS = registry.counter(
+    'cryptobot_price_history_points_total', 'Price points recorded into the local history', ['result'])
+
+# (время, цена, объем, капитализация)
+Point = Tuple[int, float, float, float]
+
+class PriceHistory:
+    """История цен в файле, отображенном в память: по кольцевому буферу на монету для каждого уровня (1m/1h/1d)"""
+
+    def __init__(self, path: str = PRICE_HISTORY_PATH, max_coins: int = PRICE_HISTORY_MAX_COINS,
+                 tiers: Dict[str, Tuple[int, int]] = PRICE_HISTORY_TIERS):
+        self.path = path
+        self.max_coins = max_coins
+        self.tiers = dict(tiers)  # {уровень: (шаг в секундах, число точек)}
+        self._header = struct.Struct('<4sIII' + 'II' * len(self.tiers))
+        self._header_values = (MAGIC, FORMAT_VERSION, max_coins, ID_SIZE) + tuple(
+            value for step_size in self.tiers.values() for value in step_size)
+        self._layout()
+        self._open()
+        self._slots: Dict[str, int] = {}  # {coin_id: номер буфера}
+        self._latest: Dict[str, Point] = {}  # последняя точка монеты (после перезапуска ищется в буферах)
+        for slot in range(max_coins):
+            raw = self._mmap[self._ids_offset + slot * ID_SIZE:self._ids_offset + (slot + 1) * ID_SIZE]
+            if raw[0]:
+                self._slots[raw.rstrip(b'\0').decode()] = slot
+
+    def _layout(self):
+        """Смещения областей файла: заголовок, таблица монет, затем времена и значения каждого уровня"""
+        offset = 64
+        self._ids_offset = offset
+        offset += self.max_coins * ID_SIZE
+        self._offsets = {}
+        for tier, (_, size) in self.tiers.items():
+            times_offset = offset
+            offset += self.max_coins * size * 4
+            values_offset = offset
+            offset += self.max_coins * size * WIDTH * 4
+            self._offsets[tier] = (times_offset, values_offset, offset)
+        self.file_size = offset
+
+    def _open(self):
+        """Открывает файл истории; файл другого формата или размера создается заново"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            header = os.pread(fd, self._header.size, 0)
+            valid = (os.fstat(fd).st_size == self.file_size and len(header) == self._header.size
+                     and self._header.unpack(header) == self._header_values)
+            if not valid:
+                if header:
+                    logger.warning(f"Price history {self.path} has another layout, starting a new one")
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.file_size)
+                os.pwrite(fd, self._header.pack(*self._header_values), 0)
+            self._mmap = mmap.mmap(fd, self.file_size)
+        finally:
+            os.close(fd)
+        view = memoryview(self._mmap)
+        self._times = {}
+        self._values = {}
+        for tier, (times_offset, values_offset, end) in self._offsets.items():
+            self._times[tier] = view[times_offset:values_offset].cast('I')
+            self._values[tier] = view[values_offset:end].cast('f')
+        self._view = view
+
+    def _slot(self, coin_id: str, create: bool = False) -> Optional[int]:
+        """Номер буфера монеты; новая монета занимает свободный буфер, если он есть"""
+        slot = self._slots.get(coin_id)
+        if slot is not None or not create:
+            return slot
+        raw = coin_id.encode()
+        if len(self._slots) >= self.max_coins or not raw or len(raw) > ID_SIZE:
+            return None
+        slot = len(self._slots)
+        start = self._ids_offset + slot * ID_SIZE
+        self._mmap[start:start + len(raw)] = raw
+        self._slots[coin_id] = slot
+        return slot
+
+    def record(self, coin_id: str, price: float, volume: float = 0.0, market_cap: float = 0.0,
+               timestamp: Optional[float] = None):
+        """Записывает точку во все уровни; точка в уже занятом интервале заменяет предыдущую (цена закрытия)"""
+        slot = self._slot(coin_id, create=True)
+        if slot is None or not price:
+            PRICE_HISTORY_POINTS.inc('dropped')
+            return
+        now = int(time.time() if timestamp is None else timestamp)
+        for tier, (step, size) in self.tiers.items():
+            index = slot * size + (now // step) % size
+            self._times[tier][index] = now
+            values = self._values[tier]
+            base = index * WIDTH
+            values[base] = price
+            values[base + 1] = volume or 0.0
+            values[base + 2] = market_cap or 0.0
+        self._latest[coin_id] = (now, price, volume or 0.0, market_cap or 0.0)
+        PRICE_HISTORY_POINTS.inc('recorded')
+
+    def record_many(self, prices: Dict[str, Tuple[float, float, float]], timestamp: Optional[float] = None):
+        """Записывает снимок нескольких монет {coin_id: (цена, объем, капитализация)}"""
+        now = time.time() if timestamp is None else timestamp
+        for coin_id, (price, volume, market_cap) in prices.items():
+            self.record(coin_id, price, volume, market_cap, now)
+
+    def _point(self, tier: str, slot: int, bucket: int) -> Optional[Point]:
+        step, size = self.tiers[tier]
+        index = slot * size + bucket % size
+        stored = self._times[tier][index]
+        if not stored or stored // step != bucket:
+            return None
+        base = index * WIDTH
+        values = self._values[tier]
+        return stored, values[base], values[base + 1], values[base + 2]
+
+    def point_at(self, coin_id: str, timestamp: float, now: Optional[float] = None) -> Optional[Point]:
+        """Точка не дальше одного интервала от timestamp на самом подробном уровне, который ее помнит"""
+        slot = self._slots.get(coin_id)
+        if slot is None:
+            return None
+        age = (time.time() if now is None else now) - timestamp
+        for tier, (step, size) in self.tiers.items():
+            if age >= step * (size - 1):
+                continue
+            bucket = int(timestamp) // step
+            for candidate in (bucket, bucket + 1, bucket - 1):
+                point = self._point(tier, slot, candidate)
+                if point is not None and abs(point[0] - timestamp) <= step:
+                    return point
+        return None
+
+    def latest(self, coin_id: str, now: Optional[float] = None) -> Optional[Point]:
+        """Последняя записанная точка монеты"""
+        point = self._latest.get(coin_id)
+        slot = self._slots.get(coin_id)
+        if point is not None or slot is None:
+            return point
+        now = int(time.time() if now is None else now)
+        for tier, (step, size) in self.tiers.items():
+            for bucket in range(now // step, now // step - size, -1):
+                point = self._point(tier, slot, bucket)
+                if point is not None:
+                    self._latest[coin_id] = point
+                    return point
+        return None
+
+    def price_at(self, coin_id: str, timestamp: float, now: Optional[float] = None) -> Optional[float]:
+        """Цена монеты на момент timestamp; None, если в истории нет точки рядом с этим моментом"""
+        point = self.point_at(coin_id, timestamp, now)
+        return point[1] if point is not None else None
+
+    def change(self, coin_id: str, seconds: float, now: Optional[float] = None) -> Optional[float]:
+        """Изменение цены за последние seconds секунд в процентах (без запросов к API)"""
+        now = time.time() if now is None else now
+        current = self.latest(coin_id, now)
+        old = self.price_at(coin_id, now - seconds, now)
+        if current is None or not old:
+            return None
+        return (current[1] - old) / old * 100
+
+    def series(self, coin_id: str, tier: str, points: int, now: Optional[float] = None) -> List[Point]:
+        """Последние points интервалов уровня в хронологическом порядке (пустые интервалы пропускаются)"""
+        slot = self._slots.get(coin_id)
+        if slot is None:
+            return []
+        step, size = self.tiers[tier]
+        last = int(time.time() if now is None else now) // step
+        result = []
+        for bucket in range(last - min(points, size) + 1, last + 1):
+            point = self._point(tier, slot, bucket)
+            if point is not None:
+                result.append(point)
+        return result
+
+    def flush(self):
+        """Сбрасывает измененные страницы на диск"""
+        self._mmap.flush()
+
+    def close(self):
+        """Сбрасывает историю на диск и закрывает файл"""
+        if self._mmap.closed:
+            return
+        self.flush()
+        for views in (self._times, self._values):
+            for view in views.values():
+                view.release()
+        self._view.release()
+        self._mmap.close()
+
+    def get_stats(self) -> Dict:
+        """Возвращает число монет в истории и размер файла"""
+        return {'coins': len(self._slots), 'max_coins': self.max_coins, 'file_size': self.file_size}
@@ -0,0 +1,177 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Tuple
+from config import LANGUAGES, TIME_INTERVALS
+
+# Языки хранятся отсортированными блоками примерно такого размера: вставка сдвигает только свой блок
+CHUNK_SIZE = 4096
+
+class Interner:
+    """Таблица строк <-> маленьких целых кодов"""
+
+    def __init__(self, values=()):
+        self._values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: str) -> int:
+        """Возвращает код строки, добавляя ее при первом обращении"""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def find(self, value: str) -> int:
+        """Возвращает код строки или -1, если ее нет в таблице"""
+        return self._codes.get(value, -1)
+
+    def value(self, code: int) -> str:
+        """Возвращает строку по коду"""
+        return self._values[code]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+class CompactUserState:
+    """Компактное состояние пользователей: целочисленные id и коды вместо строк и словарей"""
+
+    def __init__(self, default_language: str = 'ru'):
+        self.languages = Interner(LANGUAGES)
+        self.intervals = Interner(TIME_INTERVALS)
+        self.coins = Interner()
+        self.default_language = default_language
+        # Языки: отсортированные блоки параллельных массивов id -> код языка и наибольший id каждого блока
+        self._id_chunks: List[array] = []
+        self._lang_chunks: List[array] = []
+        self._maxes: List[int] = []
+        self._language_count = 0
+        # Подписки: {user_id: array('I') из упакованных (код монеты << 8 | код интервала)}
+        self._subscriptions: Dict[int, array] = {}
+        self.subscription_count = 0
+
+    def _find(self, user_id: int) -> Tuple[int, int]:
+        """Блок и позиция пользователя или (-1, -1)"""
+        chunk = bisect_left(self._maxes, user_id)
+        if chunk < len(self._maxes):
+            ids = self._id_chunks[chunk]
+            index = bisect_left(ids, user_id)
+            if ids[index] == user_id:
+                return chunk, index
+        return -1, -1
+
+    def has_language(self, user_id: int) -> bool:
+        """Выбирал ли пользователь язык"""
+        return self._find(user_id)[0] >= 0
+
+    def get_language(self, user_id: int) -> str:
+        """Получает язык пользователя (по умолчанию - default_language)"""
+        chunk, index = self._find(user_id)
+        if chunk < 0:
+            return self.default_language
+        return self.languages.value(self._lang_chunks[chunk][index])
+
+    def set_language(self, user_id: int, language: str):
+        """Устанавливает язык пользователя; новый id вставляется в свой блок (не больше 2 * CHUNK_SIZE записей)"""
+        code = self.languages.code(language)
+        if not self._maxes:
+            self._id_chunks.append(array('q', [user_id]))
+            self._lang_chunks.append(array('B', [code]))
+            self._maxes.append(user_id)
+            self._language_count += 1
+            return
+        chunk = bisect_left(self._maxes, user_id)
+        if chunk == len(self._maxes):
+            # Новый наибольший id - в конец последнего блока
+            chunk -= 1
+            self._maxes[chunk] = user_id
+        ids = self._id_chunks[chunk]
+        index = bisect_left(ids, user_id)
+        if index < len(ids) and ids[index] == user_id:
+            self._lang_chunks[chunk][index] = code
+            return
+        ids.insert(index, user_id)
+        self._lang_chunks[chunk].insert(index, code)
+        self._language_count += 1
+        if len(ids) > 2 * CHUNK_SIZE:
+            self._split(chunk)
+
+    def _split(self, chunk: int):
+        """Делит переполненный блок пополам"""
+        ids, langs = self._id_chunks[chunk], self._lang_chunks[chunk]
+        half = len(ids) // 2
+        self._id_chunks[chunk:chunk + 1] = [ids[:half], ids[half:]]
+        self._lang_chunks[chunk:chunk + 1] = [langs[:half], langs[half:]]
+        self._maxes[chunk:chunk + 1] = [ids[half - 1], ids[-1]]
+
+    def load_languages(self, languages: Dict[int, str]):
+        """Массовая загрузка языков (при старте): блоки собираются заново одной сортировкой"""
+        merged = {
+            user_id: code
+            for ids, langs in zip(self._id_chunks, self._lang_chunks)
+            for user_id, code in zip(ids, langs)
+        }
+        for user_id, language in languages.items():
+            merged[user_id] = self.languages.code(language)
+        ordered = sorted(merged)
+        self._id_chunks = [array('q', ordered[start:start + CHUNK_SIZE])
+                           for start in range(0, len(ordered), CHUNK_SIZE)]
+        self._lang_chunks = [array('B', (merged[user_id] for user_id in ids)) for ids in self._id_chunks]
+        self._maxes = [ids[-1] for ids in self._id_chunks]
+        self._language_count = len(ordered)
+
+    def language_count(self) -> int:
+        """Число пользователей с выбранным языком"""
+        return self._language_count
+
+    def _pack(self, coin_id: str, interval: str) -> int:
+        return self.coins.code(coin_id) << 8 | self.intervals.code(interval)
+
+    def _unpack(self, packed: int) -> Tuple[str, str]:
+        return self.coins.value(packed >> 8), self.intervals.value(packed & 0xFF)
+
+    def get_notifications(self, user_id: int) -> Dict[str, str]:
+        """Получает подписки пользователя как {coin_id: interval}"""
+        return dict(self._unpack(packed) for packed in self._subscriptions.get(user_id, ()))
+
+    def has_notification(self, user_id: int, coin_id: str) -> bool:
+        """Есть ли у пользователя подписка на монету"""
+        return coin_id in self.get_notifications(user_id)
+
+    def set_notification(self, user_id: int, coin_id: str, interval: str):
+        """Добавляет или заменяет подписку на монету"""
+        self.remove_notification(user_id, coin_id)
+        records = self._subscriptions.get(user_id)
+        if records is None:
+            records = self._subscriptions[user_id] = array('I')
+        records.append(self._pack(coin_id, interval))
+        self.subscription_count += 1
+
+    def remove_notification(self, user_id: int, coin_id: str) -> bool:
+        """Удаляет подписку на монету"""
+        records = self._subscriptions.get(user_id)
+        if not records:
+            return False
+        coin_code = self.coins.find(coin_id)
+        for index, packed in enumerate(records):
+            if packed >> 8 == coin_code:
+                del records[index]
+                self.subscription_count -= 1
+                if not records:
+                    del self._subscriptions[user_id]
+                return True
+        return False
+
+    def load_notifications(self, notifications: Dict[int, Dict[str, str]]):
+        """Массовая загрузка подписок (при старте)"""
+        for user_id, coins in notifications.items():
+            for coin_id, interval in coins.items():
+                self.set_notification(user_id, coin_id, interval)
+
+    def iter_notifications(self) -> Iterator[Tuple[int, str, str]]:
+        """Перебирает все подписки как (user_id, coin_id, interval)"""
+        for user_id, records in self._subscriptions.items():
+            for packed in records:
+                coin_id, interval = self._unpack(packed)
+                yield user_id, coin_id, interval
@@ -0,0 +1,32 @@
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+class RenderedViewCache:
+    """Кэш готовых HTML-экранов: один рендер на (экран, язык, версия снимка данных)"""
+
+    def __init__(self):
+        # {(view, language): (version, text)} - при новой версии снимка запись просто перезаписывается
+        self._entries: Dict[Tuple[str, str], Tuple[Hashable, str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, view: str, language: str, version: Hashable) -> Optional[str]:
+        """Возвращает готовый текст, если он отрендерен для этой версии снимка"""
+        entry = self._entries.get((view, language))
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        return None
+
+    def get_or_render(self, view: str, language: str, version: Hashable,
+                      render: Callable[[], str]) -> str:
+        """Возвращает текст из кэша или рендерит его один раз для новой версии"""
+        text = self.get(view, language, version)
+        if text is None:
+            self.misses += 1
+            text = render()
+            self._entries[(view, language)] = (version, text)
+        return text
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику попаданий"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
@@ -0,0 +1,68 @@
+import hmac
+import logging
+from typing import Optional
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+from config import WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class WebhookServer:
+    """Встроенный aiohttp-сервер: принимает обновления от Telegram и отдает health-check"""
+
+    def __init__(self, application: Application, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                 path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.received = 0
+        self.rejected = 0
+        self._runner: Optional[web.AppRunner] = None
+
+        self.web_app = web.Application()
+        self.web_app.router.add_post(path, self.handle_update)
+        self.web_app.router.add_get('/health', self.handle_health)
+
+    async def start(self):
+        """Запускает HTTP-сервер"""
+        self._runner = web.AppRunner(self.web_app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Останавливает HTTP-сервер"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Проверяет секрет и передает обновление в очередь приложения"""
+        token = request.headers.get(SECRET_HEADER, '')
+        # Байты, а не str: compare_digest не принимает строки с не-ASCII символами
+        if not hmac.compare_digest(token.encode('utf-8', 'surrogateescape'), self.secret.encode()):
+            self.rejected += 1
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            logger.warning(f"Invalid webhook payload: {e}")
+            return web.Response(status=400)
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Health-check для балансировщика"""
+        status = 200 if self.application.running else 503
+        return web.json_response({
+            'status': 'ok' if status == 200 else 'stopped',
+            'update_queue': self.application.update_queue.qsize(),
+            'received': self.received,
+            'rejected': self.rejected
+        }, status=status)
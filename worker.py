@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from telegram import Bot
+from telegram.request import HTTPXRequest
+from config import (
+    BOT_TOKEN, NOTIFICATION_WORKERS, TELEGRAM_GLOBAL_RATE, METRICS_PORT, TELEGRAM_API_URL,
+    TELEGRAM_SEND_WORKERS, UPSTREAM_QUOTA_WORKER_SHARE
+)
+from crypto_api import crypto_api
+from sender import outbound_queue
+from notifications import NotificationManager, LEGACY_DATA_FILE
+from storage import UserStore
+from sharding import ShardLeaseManager
+from metrics import registry, MetricsServer
+
+logging.basicConfig(
+    format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+async def run_worker(workers: int, index: int = 0):
+    """Один воркер: рассылает уведомления только по арендованным шардам"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    # Глобальный лимит Telegram общий для всех процессов
+    outbound_queue.set_global_rate(TELEGRAM_GLOBAL_RATE / workers)
+    # Как и бюджет запросов к API, отданный воркерам
+    crypto_api.set_quota_share(UPSTREAM_QUOTA_WORKER_SHARE / workers)
+    
+    # Каждый воркер отдает метрики на своем порту: METRICS_PORT + 1 + номер воркера
+    metrics_server = MetricsServer(registry, port=METRICS_PORT + 1 + index) if METRICS_PORT else None
+    
+    # По умолчанию у Bot одно соединение: отправители очереди выстроились бы в очередь к нему
+    request = HTTPXRequest(connection_pool_size=TELEGRAM_SEND_WORKERS)
+    async with Bot(BOT_TOKEN, base_url=TELEGRAM_API_URL, request=request) as bot:
+        await crypto_api.start()
+        await outbound_queue.start()
+        if metrics_server:
+            await metrics_server.start()
+        manager = NotificationManager(bot, shards=ShardLeaseManager())
+        owned = await loop.run_in_executor(None, manager.shards.heartbeat)
+        logger.info(f"Worker {manager.shards.worker_id} started with shards {sorted(owned)}")
+        manager.start_scheduler()
+        try:
+            await stop_event.wait()
+        finally:
+            manager.stop_scheduler()
+            manager.close()
+            if metrics_server:
+                await metrics_server.stop()
+            await outbound_queue.stop()
+            await crypto_api.close()
+
+def worker_process(workers: int, index: int):
+    """Точка входа дочернего процесса"""
+    asyncio.run(run_worker(workers, index))
+
+def main():
+    """Запускает N процессов-воркеров и перезапускает упавшие"""
+    parser = argparse.ArgumentParser(description='Sharded notification workers')
+    parser.add_argument('--workers', type=int, default=max(NOTIFICATION_WORKERS, 1))
+    args = parser.parse_args()
+    
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN not found in environment variables!")
+        return
+    
+    # Старый user_data.json переносится один раз здесь, а не в каждом воркере наперегонки
+    try:
+        UserStore().migrate_from_json(LEGACY_DATA_FILE)
+    except Exception as e:
+        logger.error(f"Error migrating {LEGACY_DATA_FILE}: {e}")
+    
+    def spawn(index):
+        process = multiprocessing.Process(target=worker_process, args=(args.workers, index),
+                                          name=f"notify-worker-{index}")
+        process.start()
+        return process
+    
+    processes = [spawn(index) for index in range(args.workers)]
+    try:
+        while True:
+            time.sleep(5)
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    # Шарды умершего воркера заберут остальные по истечении аренды; новый процесс получит свою долю
+                    logger.warning(f"{process.name} exited with code {process.exitcode}, restarting")
+                    processes[index] = spawn(index)
+    except KeyboardInterrupt:
+        logger.info("Stopping workers")
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+if __name__ == '__main__':
+    main()